@@ -0,0 +1,63 @@
+"""Benchmark of the start-up time of `import myprover` with and without the prover.
+
+Usage:
+    python benchmark/bench_import.py [repeat]
+
+Each statement runs in a fresh interpreter under `python -X importtime`, and the
+cumulative time of the top-level modules is summed from its report. "decorators" is the
+import of production code, which only needs the contracts and the markers; "prover"
+also loads the prover, as every `import myprover` did before it was loaded lazily.
+"""
+
+import os
+import subprocess
+import sys
+
+SRC = os.path.abspath(os.path.join(os.path.dirname(__file__), "../src"))
+
+STATEMENTS = {
+    "decorators": "from myprover import invariant, postcondition, precondition",
+    "prover": "from myprover import invariant, postcondition, precondition, prove",
+}
+
+
+def import_time(statement):
+    """Runs a statement in a fresh interpreter.
+
+    Returns:
+        tuple: The total import time in microseconds, the number of modules imported,
+            and whether `z3` was imported.
+    """
+    code = f"import sys; {statement}; print('z3' in sys.modules)"
+    env = dict(os.environ, PYTHONPATH=SRC)
+    done = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    total = 0
+    num_modules = 0
+    for line in done.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:") :].split("|")
+        num_modules += 1
+        # the nested imports are indented and already counted by their importer
+        if not name.startswith("  "):
+            total += int(cumulative)
+    return total, num_modules, done.stdout.strip() == "True"
+
+
+def main(repeat):
+    print(f"{'import':>12} {'time':>10} {'modules':>8} {'z3':>6}")
+    for label, statement in STATEMENTS.items():
+        results = [import_time(statement) for _ in range(repeat)]
+        best = min(total for total, _, _ in results)
+        _, num_modules, z3_imported = results[0]
+        print(f"{label:>12} {best / 1000:>8.1f}ms {num_modules:>8} {str(z3_imported):>6}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5)
@@ -0,0 +1,36 @@
+"""Benchmark of checking VCs sequentially versus in a pool of worker processes.
+
+Usage:
+    python benchmark/bench_parallel.py [num_branches]
+
+The generated function is the one of `bench_vc_split.py`, whose postcondition is split
+into many independent nonlinear goals.
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../src")))
+
+import myprover as mp
+from bench_vc_split import branches
+
+
+def main(n):
+    code, precond, postcond, var2types = branches(n)
+    print(f"cpus: {os.cpu_count()}")
+    print(f"{'workers':>8} {'obligations':>12} {'time':>8}")
+    for workers in sorted({1, 2, 4, os.cpu_count()}):
+        prover = mp.MyProver()
+        prover.register("f", var2types)
+        start = time.perf_counter()
+        prover.verify(code, "f", precond, postcond, workers=workers)
+        elapsed = time.perf_counter() - start
+        print(
+            f"{workers:>8} {prover.stats['num_unique_obligations']:>12} {elapsed:>7.2f}s"
+        )
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 12)
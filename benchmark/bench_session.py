@@ -0,0 +1,60 @@
+"""Benchmark of checking the conditions in one incremental session versus one by one.
+
+Usage:
+    python benchmark/bench_session.py [num_loops]
+
+The generated function runs one loop per argument, and its precondition relates the
+arguments by nonlinear facts that are needed by every obligation. In the incremental
+session, these facts are asserted once instead of once per condition.
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../src")))
+
+import myprover as mp
+
+
+def loops(n):
+    lines = [f"def f({', '.join(f'a{i}' for i in range(n))}):"]
+    for i in range(n):
+        lines += [
+            f"    r{i} = 0",
+            f"    while r{i} < a{i}:",
+            f'        invariant("r{i} >= 0 and r{i} <= a{i}")',
+            f"        r{i} = r{i} + 1",
+        ]
+    facts = [f"a{i} > 0 and a{i} * a{i} >= a{i} * a{(i + 1) % n}" for i in range(n)]
+    precond = " and ".join(facts)
+    postcond = " and ".join(f"r{i} * r{i} >= 0" for i in range(n))
+    var2types = {f"{v}{i}": int for i in range(n) for v in "ar"}
+    return "\n".join(lines), precond, postcond, var2types
+
+
+def main(n):
+    code, precond, postcond, var2types = loops(n)
+    print(f"{'engine':>8} {'incremental':>12} {'obligations':>12} {'time':>8}")
+    for engine in mp.prover.VC_GENERATORS:
+        for incremental in [False, True]:
+            prover = mp.MyProver()
+            prover.register("f", var2types)
+            start = time.perf_counter()
+            prover.verify(
+                code,
+                "f",
+                precond,
+                postcond,
+                engine=engine,
+                incremental=incremental,
+            )
+            elapsed = time.perf_counter() - start
+            print(
+                f"{engine:>8} {str(incremental):>12} "
+                f"{prover.stats['num_unique_obligations']:>12} {elapsed:>7.2f}s"
+            )
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20)
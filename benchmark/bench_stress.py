@@ -0,0 +1,92 @@
+"""Stress benchmark of straight-line functions with thousands of statements.
+
+Usage:
+    python benchmark/bench_stress.py [num_statements]
+
+Two generated functions are verified without raising the recursion limit:
+"independent" assigns many locals of which only every 100th one flows into the
+postcondition, and "chain" makes every statement depend on the previous one,
+so that the VC itself is as deep as the function is long. The time spent in
+each stage of the pipeline is reported per engine. The "wp" engine has to
+rebuild the whole chain for every assignment, hence it is only run on chains
+of at most MAX_WP_CHAIN statements.
+"""
+
+import ast
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../src")))
+
+import z3
+
+import myprover as mp
+from myprover.claim import BinOpExpr, Op, UnOpExpr, collect_all_varnames
+
+MAX_WP_CHAIN = 1000
+
+
+def independent(n):
+    lines = ["def f(x):", "    s = 0"]
+    for i in range(1, n):
+        lines.append(f"    t{i} = x + {i}" if i % 100 else f"    s = s + t{i - 1}")
+    return "\n".join(lines), "x >= 0", "s >= 0"
+
+
+def chain(n):
+    lines = ["def f(x):", "    y0 = x"]
+    lines += [f"    y{i} = y{i - 1} + 1" for i in range(1, n)]
+    return "\n".join(lines), "x >= 0", f"y{n - 1} >= {n - 1}"
+
+
+def run(code, precond, postcond, engine):
+    timings = {}
+    start = time.perf_counter()
+    claim_ast = mp.PyToClaim().visit(ast.parse(code))
+    timings["parse"] = time.perf_counter() - start
+
+    var2types = {"x": int}
+    start = time.perf_counter()
+    mp.resolve_stmt_type(var2types, claim_ast)
+    timings["type"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    wp, ac = mp.prover.VC_GENERATORS[engine](
+        claim_ast, mp.ClaimParser(postcond).parse_expr(), var2types
+    )
+    vc = BinOpExpr(mp.ClaimParser(precond).parse_expr(), Op.Implies, wp)
+    timings["vcgen"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    names = {
+        n: mp.prover.make_z3_variable(n, mp.prover.lookup_varname_type(n, var2types))
+        for n in collect_all_varnames([vc])
+    }
+    z3_vc = mp.ClaimToZ3(names).visit(UnOpExpr(Op.Not, vc))
+    timings["to_z3"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    solver = z3.Solver()
+    solver.add(z3_vc)
+    assert solver.check() == z3.unsat
+    timings["solve"] = time.perf_counter() - start
+    return timings
+
+
+def main(n):
+    print(f"recursion limit: {sys.getrecursionlimit()}")
+    stages = ["parse", "type", "vcgen", "to_z3", "solve"]
+    print(f"{'shape':>12} {'stmts':>6} {'engine':>8} " + " ".join(f"{s:>9}" for s in stages))
+    for shape, make_program in [("independent", independent), ("chain", chain)]:
+        for engine in mp.prover.VC_GENERATORS:
+            size = n if shape != "chain" or engine != "wp" else min(n, MAX_WP_CHAIN)
+            timings = run(*make_program(size), engine)
+            print(
+                f"{shape:>12} {size:>6} {engine:>8} "
+                + " ".join(f"{timings[s]:>8.2f}s" for s in stages)
+            )
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10000)
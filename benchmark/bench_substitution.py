@@ -0,0 +1,109 @@
+"""Compare one-pass `substitute` against repeated `assign_variable` on the DP `smartsum`.
+
+Usage:
+    python benchmark/bench_substitution.py [repeat]
+
+`PyToDPClaim` forks every expression into a `#1` and a `#2` copy. The
+sequential variant calls `assign_variable` once per forked variable, as the
+converter used to do, while the current one applies a single mapping with
+`substitute`. The time of the whole `MyProver.verify` is reported as well.
+"""
+
+import ast
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../src")))
+
+import myprover as mp
+from myprover.claim import VarExpr
+
+SMARTSUM = """
+def smartsum(db, q, out):
+    net = 0
+    n = 0
+    c = 0
+    i = 0
+    while i < 10:
+        invariant("db#1 ~ db#2")
+        invariant("out#1 == out#2")
+        invariant("net#1 == net#2")
+        invariant("n#1 == n#2")
+        invariant("||(c#1 - c#2) <= 1")
+        invariant("db#1 != db#2 ==> (v_eps# == 0)")
+        invariant("c#1 != c#2 ==> (db#1 == db#2 and v_eps# <= eps#)")
+        invariant("db#1 == db#2 ==> (v_eps# <= 2 * eps#)")
+        if 10 % q == 0:
+            x = laplace(c + db[i])
+            n = x + n
+            net = n
+            c = 0
+            out[i] = net
+        else:
+            x = laplace(db[i])
+            net = net + x
+            c = c + db[i]
+            out[i] = net
+        i = i + 1
+    return out
+"""
+
+VAR2TYPES = {
+    "net": int,
+    "n": int,
+    "c": int,
+    "i": int,
+    "q": int,
+    "x": int,
+    "out": list[int],
+    "db": list[int],
+    "length_l": int,
+    "v_eps#": int,
+    "eps#": int,
+}
+
+
+class SequentialPyToDPClaim(mp.visitor.PyToDPClaim):
+    def fork(self, e):
+        e_1, e_2 = e.clone(), e.clone()
+        for vn in self.forked_varnames:
+            e_1 = e_1.assign_variable(VarExpr(vn), VarExpr(vn + "#1"))
+            e_2 = e_2.assign_variable(VarExpr(vn), VarExpr(vn + "#2"))
+        return e_1, e_2
+
+
+def bench(converter_cls, py_ast, forked_varnames, repeat):
+    converter_cls(forked_varnames).visit(py_ast)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        converter_cls(forked_varnames).visit(py_ast)
+    return (time.perf_counter() - start) * 1000 / repeat
+
+
+def main(repeat):
+    py_ast = ast.parse(SMARTSUM.lstrip())
+    forked_varnames = mp.PyToClaim().visit(py_ast).collect_assigned_varnames()
+    sequential = bench(SequentialPyToDPClaim, py_ast, forked_varnames, repeat)
+    one_pass = bench(mp.visitor.PyToDPClaim, py_ast, forked_varnames, repeat)
+    print(f"forked variables       : {len(forked_varnames)}")
+    print(f"assign_variable [ms]   : {sequential:.3f}")
+    print(f"substitute [ms]        : {one_pass:.3f}")
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        prover = mp.MyProver(dp_mode=True)
+        prover.register("smartsum", dict(VAR2TYPES))
+        prover.verify(
+            SMARTSUM.lstrip(),
+            "smartsum",
+            "db#1 ~ db#2 and eps# >= 0",
+            "v_eps# <= 2 * eps#",
+            False,
+            {"db": 10},
+        )
+    print(f"verify [ms]            : {(time.perf_counter() - start) * 1000 / repeat:.3f}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 500)
@@ -0,0 +1,88 @@
+"""Compare the "wp" and "passive" VC generators on deep if-chains.
+
+Usage:
+    python benchmark/bench_vc_engines.py [max_depth]
+
+Two shapes are measured: if-statements nested into each other, and a chain of
+sequential if-statements whose branches both update `r`. For each depth, the
+size of the generated VC (distinct DAG nodes and nodes of the unshared tree)
+and the time of `MyProver.verify` are reported per engine. Once the unshared
+VC of an engine exceeds MAX_TREE_SIZE nodes, its verification is skipped and
+larger depths of the same shape are not generated for it anymore. Python
+limits the nesting depth to 99.
+"""
+
+import ast
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../src")))
+
+import myprover as mp
+from myprover.claim import count_nodes, tree_size
+
+PRECOND = "r == 0"
+MAX_TREE_SIZE = 10**6
+
+
+def nested_ifs(depth):
+    lines = []
+    for i in range(depth):
+        indent = "    " * i
+        lines += [
+            f"{indent}if x > {i}:",
+            f"{indent}    r = r + 1",
+            f"{indent}    y = y + r",
+        ]
+    lines.append("    " * depth + "r = r + 1")
+    for i in reversed(range(depth)):
+        indent = "    " * i
+        lines += [f"{indent}else:", f"{indent}    r = r - 1"]
+    return "\n".join(lines), "r >= 0 - 1"
+
+
+def chained_ifs(depth):
+    lines = []
+    for i in range(depth):
+        lines += [f"if x > {i}:", "    r = r + 1", "else:", "    r = r - 1"]
+    return "\n".join(lines), f"r >= 0 - {depth}"
+
+
+def main(max_depth):
+    print(
+        f"{'shape':>7} {'depth':>5} {'engine':>8} {'dag nodes':>10} "
+        f"{'tree nodes':>24} {'vcgen [ms]':>11} {'verify [ms]':>12}"
+    )
+    for shape, make_program in [("nested", nested_ifs), ("chained", chained_ifs)]:
+        depth, exhausted = 2, set()
+        while depth <= max_depth:
+            code, postcond = make_program(depth)
+            for engine, derive_vc in mp.prover.VC_GENERATORS.items():
+                if engine in exhausted:
+                    print(f"{shape:>7} {depth:>5} {engine:>8} {'-':>10}")
+                    continue
+                stmt = mp.PyToClaim().visit(ast.parse(code))
+                post = mp.ClaimParser(postcond).parse_expr()
+                start = time.perf_counter()
+                vc, _ = derive_vc(stmt, post, {})
+                vcgen = (time.perf_counter() - start) * 1000
+
+                verify = "-"
+                if tree_size(vc) > MAX_TREE_SIZE:
+                    exhausted.add(engine)
+                else:
+                    prover = mp.MyProver()
+                    prover.register("f", {"x": int, "y": int, "r": int})
+                    start = time.perf_counter()
+                    assert prover.verify(code, "f", PRECOND, postcond, engine=engine)
+                    verify = f"{(time.perf_counter() - start) * 1000:.2f}"
+                print(
+                    f"{shape:>7} {depth:>5} {engine:>8} {count_nodes(vc):>10} "
+                    f"{tree_size(vc):>24} {vcgen:>11.2f} {verify:>12}"
+                )
+            depth *= 2
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 64)
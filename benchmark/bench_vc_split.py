@@ -0,0 +1,46 @@
+"""Benchmark of checking VCs as a whole versus split into goals.
+
+Usage:
+    python benchmark/bench_vc_split.py [num_branches]
+
+The generated function branches on the sign of each of its arguments, and its
+postcondition is a conjunction of nonlinear facts, one per branch.
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../src")))
+
+import myprover as mp
+
+
+def branches(n):
+    lines = [f"def f({', '.join(f'x{i}' for i in range(n))}):"]
+    for i in range(n):
+        lines += [
+            f"    if x{i} > 0:",
+            f"        r{i} = x{i} * x{i} * x{i}",
+            "    else:",
+            f"        r{i} = x{i} * x{i}",
+        ]
+    post = " and ".join(f"r{i} >= 0" for i in range(n))
+    var2types = {f"{v}{i}": int for i in range(n) for v in "xr"}
+    return "\n".join(lines), "True", post, var2types
+
+
+def main(n):
+    code, precond, postcond, var2types = branches(n)
+    print(f"{'engine':>8} {'split':>6} {'time':>8}")
+    for engine in mp.prover.VC_GENERATORS:
+        for split in [False, True]:
+            prover = mp.MyProver()
+            prover.register("f", var2types)
+            start = time.perf_counter()
+            prover.verify(code, "f", precond, postcond, engine=engine, split=split)
+            print(f"{engine:>8} {str(split):>6} {time.perf_counter() - start:>7.2f}s")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 6)
@@ -0,0 +1,40 @@
+"""Node-count benchmark of the weakest precondition of sequential if-statements.
+
+Usage:
+    python benchmark/bench_wp_size.py [max_k]
+
+The verification condition of `k` sequential if-statements is exponential in
+`k` as a tree, while the hash-consed DAG built by `derive_weakest_precondition`
+grows linearly.
+"""
+
+import ast
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../src")))
+
+import myprover as mp
+from myprover.claim import count_nodes, tree_size
+
+
+def sequential_ifs(k):
+    return "\n".join(f"if x > {i}:\n    r = 0" for i in range(k))
+
+
+def main(max_k):
+    print(f"{'k':>4} {'dag nodes':>10} {'tree nodes':>24} {'time [ms]':>10}")
+    k = 1
+    while k <= max_k:
+        stmt = mp.PyToClaim().visit(ast.parse(sequential_ifs(k)))
+        post = mp.ClaimParser("r >= 0").parse_expr()
+        start = time.perf_counter()
+        wp, _ = mp.derive_weakest_precondition(stmt, post, {"x": int, "r": int})
+        elapsed = (time.perf_counter() - start) * 1000
+        print(f"{k:>4} {count_nodes(wp):>10} {tree_size(wp):>24} {elapsed:>10.2f}")
+        k *= 2
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 128)
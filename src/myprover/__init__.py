@@ -1,7 +1,92 @@
-from .claim import ClaimParser, Op  # noqa: F401
-from .decorator import postcondition, precondition  # noqa: F401
-from .exception import InvalidInvariantError, VerificationFailureError  # noqa: F401
-from .hoare import assume, derive_weakest_precondition, invariant  # noqa: F401
-from .prover import MyProver, prove  # noqa: F401
-from .type import resolve_expr_type, resolve_stmt_type  # noqa: F401
-from .visitor import ClaimToZ3, PyToClaim  # noqa: F401
+"""A Hoare-logic prover for Python functions.
+
+Only the decorators, the markers and the exceptions are imported with the package. The
+other names, including the submodules, are loaded on first use, so code that merely
+carries contracts does not import Z3.
+"""
+
+import importlib
+
+from .decorator import assume, invariant, postcondition, precondition  # noqa: F401
+from .exception import (  # noqa: F401
+    ContractViolationError,
+    InvalidInvariantError,
+    VerificationFailureError,
+    VerificationUnknownError,
+)
+
+# the names loaded on first use, and the submodules that define them
+LAZY_NAMES = {
+    "SmtLibBackend": "backend",
+    "SolverBackend": "backend",
+    "Z3Backend": "backend",
+    "verify_module": "batch",
+    "verify_package": "batch",
+    "ProofCache": "cache",
+    "ResultCache": "cache",
+    "ClaimParser": "claim",
+    "Op": "claim",
+    "Obligation": "hoare",
+    "derive_frame": "hoare",
+    "derive_obligations": "hoare",
+    "derive_passive_weakest_precondition": "hoare",
+    "derive_weakest_precondition": "hoare",
+    "guard_conjuncts": "hoare",
+    "split_vc": "hoare",
+    "unroll_loops": "hoare",
+    "to_passive_form": "hoare",
+    "MyProver": "prover",
+    "prove": "prover",
+    "prove_async": "prover",
+    "checked": "runtime",
+    "slice_stmt": "slicing",
+    "annotate_quantifier_types": "type",
+    "annotate_stmt_quantifier_types": "type",
+    "resolve_expr_type": "type",
+    "resolve_stmt_type": "type",
+    "ClaimToZ3": "visitor",
+    "PyToClaim": "visitor",
+}
+
+__all__ = [
+    "assume",
+    "invariant",
+    "postcondition",
+    "precondition",
+    "ContractViolationError",
+    "InvalidInvariantError",
+    "VerificationFailureError",
+    "VerificationUnknownError",
+    *LAZY_NAMES,
+]
+
+SUBMODULES = (
+    "backend",
+    "batch",
+    "cache",
+    "claim",
+    "cli",
+    "hoare",
+    "parallel",
+    "prover",
+    "runtime",
+    "server",
+    "slicing",
+    "type",
+    "visitor",
+)
+
+
+def __getattr__(name):
+    if name in LAZY_NAMES:
+        value = getattr(importlib.import_module(f".{LAZY_NAMES[name]}", __name__), name)
+        # later lookups find the name without calling this function
+        globals()[name] = value
+        return value
+    elif name in SUBMODULES:
+        return importlib.import_module(f".{name}", __name__)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(set(globals()) | set(LAZY_NAMES) | set(SUBMODULES))
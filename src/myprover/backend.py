@@ -0,0 +1,484 @@
+import ctypes
+import os
+import re
+import select
+import signal
+import subprocess
+import time
+
+import z3
+
+from .parallel import AUXILIARY_PREFIXES, model_items
+from .visitor import ClaimToSmt2, ClaimToZ3, make_z3_variable, smt2_symbol
+
+
+# the length of the conditions in the messages, when the printer of z3py cannot render them
+MAX_RENDERED_CHARS = 2000
+
+
+class SolverBackend:
+    """The interface of the solvers behind `MyProver.verify`.
+
+    A verification opens a session with the facts that hold for all of its conditions,
+    checks the conditions one after another, and closes the session. The conditions
+    are independent: what is asserted to check one of them never affects the others.
+    """
+
+    def open_session(self, background, resolve, array_length_dict=dict(), timeout=None):
+        """Starts the checks of one verification.
+
+        Args:
+            background (Expr): The facts asserted for every condition.
+            resolve (callable): A function mapping a variable name to the name and the
+                type of the constant it denotes, or None (see `resolve_variable`).
+            array_length_dict (dict): A dictionary mapping array names to their lengths.
+            timeout (float, optional): The time limit of each check in seconds.
+        """
+        raise NotImplementedError
+
+    def check(self, cond, assumptions=()):
+        """Checks the satisfiability of a condition together with the background.
+
+        Args:
+            cond (Expr): The condition, such as the negation of one to be proved.
+            assumptions (tuple): The names of boolean variables assumed to hold.
+
+        Returns:
+            tuple: The result ("sat", "unsat" or "unknown") and the model as in
+                `model_items` if the result is "sat", the reason if it is "unknown",
+                otherwise None.
+        """
+        raise NotImplementedError
+
+    def unsat_core(self):
+        """Returns the assumptions in the unsat core of the last check if it was "unsat".
+
+        Returns:
+            list: The names of the assumptions the proof needed.
+        """
+        raise NotImplementedError
+
+    def render(self, cond):
+        """Returns the text of a condition in the messages of the errors."""
+        raise NotImplementedError
+
+    def interrupt(self):
+        """Aborts the running check, if any, and the checks after it.
+
+        It may be called from another thread while a check runs. The interrupted and
+        the later checks of the session report "unknown", and the next session is not
+        affected.
+        """
+        self.interrupted = True
+
+    def close_session(self):
+        """Ends the checks of one verification.
+
+        Returns:
+            dict: The statistics of the session, which are recorded in `MyProver.stats`.
+        """
+        return {}
+
+    def close(self):
+        """Releases the resources of the backend."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class Z3Backend(SolverBackend):
+    """Checks the conditions in a solver of the Z3 Python bindings in this process.
+
+    Args:
+        incremental (bool): If true, each condition is enabled by its own activation
+            literal in one solver session (see `MyProver.verify`). Otherwise, each
+            condition is checked between a push and a pop.
+        ctx (z3.Context, optional): The context of the solver and the Z3 expressions.
+            A verification running alongside others in another thread needs its own
+            context. Defaults to the main context.
+    """
+
+    def __init__(self, incremental: bool = True, ctx: z3.Context = None):
+        self.incremental = incremental
+        self.ctx = ctx
+        self.converter = None
+        self.solver = None
+        self.interrupted = False
+
+    def open_session(self, background, resolve, array_length_dict=dict(), timeout=None):
+        def declare(varname):
+            found = resolve(varname)
+            return None if found is None else make_z3_variable(*found, self.ctx)
+
+        self.converter = ClaimToZ3(
+            {}, array_length_dict, declare, memoize=True, ctx=self.ctx
+        )
+        self.solver = z3.Solver(ctx=self.ctx)
+        # the unsat cores are only computed for the checks with assumptions
+        self.solver.set("core.minimize", True)
+        if timeout is not None:
+            self.solver.set("timeout", max(1, int(timeout * 1000)))
+        self.solver.add(self.to_z3(background))
+        self.num_checks = 0
+
+    def to_z3(self, expr):
+        """Converts a Claim expression with the memo of the session."""
+        return self.converter.visit(expr)
+
+    def check(self, cond, assumptions=()):
+        if self.interrupted:
+            return "unknown", "interrupted"
+        z3_cond = self.to_z3(cond)
+        z3_assumptions = [z3.Bool(name, self.ctx) for name in assumptions]
+        if self.incremental:
+            # the condition stays in the solver, but only holds while its activation
+            # literal is assumed
+            activation = z3.Bool(f"@activate{self.num_checks}", self.ctx)
+            self.num_checks += 1
+            self.solver.add(z3.Implies(activation, z3_cond))
+            result = self.solver.check(activation, *z3_assumptions)
+        else:
+            self.solver.push()
+            self.solver.add(z3_cond)
+            result = self.solver.check(*z3_assumptions)
+        self.core = []
+        if result == z3.unsat and assumptions:
+            names = set(assumptions)
+            self.core = [
+                str(a) for a in self.solver.unsat_core() if str(a) in names
+            ]
+        detail = None
+        if result == z3.sat:
+            detail = model_items(self.solver.model())
+        elif result == z3.unknown:
+            detail = self.solver.reason_unknown()
+        if self.incremental:
+            self.solver.add(z3.Not(activation))
+        else:
+            self.solver.pop()
+        return str(result), detail
+
+    def unsat_core(self):
+        return self.core
+
+    def interrupt(self):
+        self.interrupted = True
+        # the context stops the check running in it, which then answers unknown
+        (self.ctx or z3.main_ctx()).interrupt()
+
+    def render(self, cond):
+        z3_cond = self.to_z3(cond)
+        try:
+            return str(z3_cond)
+        except (RecursionError, ctypes.ArgumentError):
+            # the printer of z3py recurses over the depth of the term, which a long
+            # straight-line function exceeds; the S-expression is printed by Z3 itself
+            text = z3_cond.sexpr()
+            if len(text) > MAX_RENDERED_CHARS:
+                text = text[:MAX_RENDERED_CHARS] + " ..."
+            return text
+
+    def close_session(self):
+        converter, self.converter, self.solver = self.converter, None, None
+        self.interrupted = False
+        return {
+            "z3_cache_hits": converter.hits,
+            "z3_cache_misses": converter.misses,
+            "z3_cache_hit_rate": converter.hits
+            / max(converter.hits + converter.misses, 1),
+            "num_z3_constants": len(converter.name_dict),
+        }
+
+
+def parse_sexpr(text: str):
+    """Parses an S-expression of the output of an SMT-LIB2 solver.
+
+    Args:
+        text (str): The S-expression.
+
+    Returns:
+        The atom as a string, with the bars of quoted symbols removed, or the list of
+        the parsed elements.
+    """
+    tokens = re.findall(r'\(|\)|\|[^|]*\||"(?:[^"]|"")*"|[^\s()|"]+', text)
+    stack = [[]]
+    for token in tokens:
+        if token == "(":
+            stack.append([])
+        elif token == ")":
+            done = stack.pop()
+            stack[-1].append(done)
+        elif token.startswith("|"):
+            stack[-1].append(token[1:-1])
+        else:
+            stack[-1].append(token)
+    return stack[0][0]
+
+
+def format_sexpr(sexpr):
+    """Formats a parsed S-expression of a value, writing `(- n)` as `-n` like Z3."""
+    if isinstance(sexpr, str):
+        return sexpr
+    if len(sexpr) == 2 and sexpr[0] == "-" and isinstance(sexpr[1], str):
+        return f"-{sexpr[1]}"
+    return "(" + " ".join(format_sexpr(e) for e in sexpr) + ")"
+
+
+class SmtLibBackend(SolverBackend):
+    """Checks the conditions in an SMT-LIB2 solver running in a long-lived subprocess.
+
+    The conditions are rendered by `ClaimToSmt2` and written to the standard input of
+    the solver, which answers on its standard output, so no Z3 object is created in
+    this process. Each session is scoped by `push` and `pop`. Each condition is enabled
+    by its own activation literal and checked by `check-sat-assuming` if `incremental`,
+    or checked between a push and a pop otherwise. The solver is restarted between
+    sessions once its memory exceeds `max_memory`, and whenever it does not answer
+    within the timeout of a check plus `grace` seconds.
+
+    Args:
+        command (tuple): The command of the solver, which reads SMT-LIB2 from stdin.
+        incremental (bool): Whether the conditions are enabled by activation literals.
+        max_memory (float, optional): The memory in megabytes, as reported by the
+            `:memory` statistic of Z3, above which the solver is restarted.
+        grace (float): The extra time in seconds the solver is given to answer.
+
+    Attributes:
+        restarts (int): The number of restarts of the solver.
+        num_chars (int): The number of characters written to the solver.
+    """
+
+    def __init__(
+        self,
+        command=("z3", "-in"),
+        incremental: bool = True,
+        max_memory: float = None,
+        grace: float = 5.0,
+    ):
+        self.command = list(command)
+        self.incremental = incremental
+        self.max_memory = max_memory
+        self.grace = grace
+        self.process = None
+        self.buffer = b""
+        self.interrupted = False
+        self.checking = False
+        self.restarts = 0
+        self.num_chars = 0
+        self.renderer = None
+        self.preamble = []
+
+    def start(self):
+        """Starts the solver if it is not running."""
+        if self.process is not None:
+            return
+        self.process = subprocess.Popen(
+            self.command,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+        )
+        self.buffer = b""
+        self.send(
+            "(set-option :print-success false)",
+            "(set-option :produce-models true)",
+            "(set-option :produce-unsat-cores true)",
+            "(set-option :smt.core.minimize true)",
+        )
+
+    def _stop(self, graceful: bool):
+        try:
+            if graceful:
+                self.send("(exit)")
+                self.process.wait(timeout=1)
+        except (OSError, subprocess.TimeoutExpired):
+            pass
+        finally:
+            if self.process.poll() is None:
+                self.process.kill()
+                self.process.wait()
+            self.process.stdin.close()
+            self.process.stdout.close()
+            self.process = None
+
+    def close(self):
+        if self.process is not None:
+            self._stop(graceful=True)
+
+    def restart(self):
+        """Restarts the solver, replaying the declarations and assertions of the session."""
+        if self.process is not None:
+            self._stop(graceful=False)
+        self.restarts += 1
+        self.start()
+        if self.renderer is not None:
+            self.send(*self.preamble)
+
+    def send(self, *commands):
+        text = "\n".join(commands) + "\n"
+        self.num_chars += len(text)
+        self.process.stdin.write(text.encode())
+        self.process.stdin.flush()
+
+    def _complete(self):
+        # the end of the first complete S-expression or line in the buffer, or None
+        text = self.buffer.lstrip()
+        offset = len(self.buffer) - len(text)
+        if not text:
+            return None
+        if not text.startswith(b"("):
+            end = text.find(b"\n")
+            return None if end < 0 else offset + end + 1
+        depth, quoted = 0, None
+        for i, c in enumerate(text):
+            if quoted is not None:
+                if c == quoted:
+                    quoted = None
+            elif c in b'"|':
+                quoted = c
+            elif c == ord("("):
+                depth += 1
+            elif c == ord(")"):
+                depth -= 1
+                if depth == 0:
+                    return offset + i + 1
+        return None
+
+    def receive(self, timeout: float = None):
+        """Reads the next answer of the solver.
+
+        Args:
+            timeout (float, optional): The time limit in seconds.
+
+        Returns:
+            str: The answer, or None if the solver does not answer in time.
+
+        Raises:
+            RuntimeError: If the solver exits or reports an error.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        fd = self.process.stdout.fileno()
+        while (end := self._complete()) is None:
+            remaining = None
+            if deadline is not None:
+                remaining = max(0, deadline - time.monotonic())
+            if not select.select([fd], [], [], remaining)[0]:
+                return None
+            chunk = os.read(fd, 65536)
+            if not chunk:
+                self.restart()
+                raise RuntimeError(f"The solver `{' '.join(self.command)}` exited")
+            self.buffer += chunk
+        answer, self.buffer = self.buffer[:end].decode().strip(), self.buffer[end:]
+        if answer.startswith("(error"):
+            # the answers after an error cannot be matched to the commands anymore
+            self.restart()
+            raise RuntimeError(f"The solver reported {answer}")
+        return answer
+
+    def memory(self):
+        """Returns the memory of the solver in megabytes, or None if it is not reported."""
+        self.send("(get-info :all-statistics)")
+        statistics = parse_sexpr(self.receive(self.grace) or "()")
+        for key, value in zip(statistics, statistics[1:]):
+            if key == ":memory":
+                return float(value)
+        return None
+
+    def open_session(self, background, resolve, array_length_dict=dict(), timeout=None):
+        self.start()
+        if self.max_memory is not None and (self.memory() or 0) > self.max_memory:
+            self.restart()
+        self.renderer = ClaimToSmt2(resolve, array_length_dict)
+        self.timeout = timeout
+        self.num_checks = 0
+        # the largest value, which is the default of Z3
+        milliseconds = 4294967295 if timeout is None else max(1, int(timeout * 1000))
+        term = self.renderer.render(background)
+        # the declarations and assertions of the session are replayed after a restart
+        self.preamble = [
+            "(push 1)",
+            f"(set-option :timeout {milliseconds})",
+            *self.renderer.take_declarations(),
+            f"(assert {term})",
+        ]
+        self.send(*self.preamble)
+
+    def check(self, cond, assumptions=()):
+        if self.interrupted:
+            return "unknown", "interrupted"
+        term = self.renderer.render(cond)
+        literals = [self.renderer.declare(name, "Bool") for name in assumptions]
+        declarations = self.renderer.take_declarations()
+        self.preamble.extend(declarations)
+        if self.incremental:
+            activation = smt2_symbol(f"@activate{self.num_checks}")
+            literals.insert(0, activation)
+            self.send(
+                *declarations,
+                f"(declare-const {activation} Bool)",
+                f"(assert (=> {activation} {term}))",
+            )
+        else:
+            self.send(*declarations, "(push 1)", f"(assert {term})")
+        self.send(f"(check-sat-assuming ({' '.join(literals)}))")
+        self.num_checks += 1
+        self.core = []
+        self.checking = True
+        try:
+            result = self.receive(
+                None if self.timeout is None else self.timeout + self.grace
+            )
+        finally:
+            self.checking = False
+        if result is None:
+            self.restart()
+            return "unknown", "timeout"
+        detail = None
+        if result == "unsat" and assumptions:
+            self.send("(get-unsat-core)")
+            names = set(assumptions)
+            self.core = [name for name in parse_sexpr(self.receive()) if name in names]
+        elif result == "sat":
+            detail = []
+            names = [
+                name
+                for name in self.renderer.declared
+                if not name.startswith(AUXILIARY_PREFIXES)
+            ]
+            if names:
+                self.send(f"(get-value ({' '.join(smt2_symbol(n) for n in names)}))")
+                detail = [
+                    (name, format_sexpr(value))
+                    for name, value in parse_sexpr(self.receive())
+                ]
+        elif result == "unknown":
+            self.send("(get-info :reason-unknown)")
+            detail = format_sexpr(parse_sexpr(self.receive())[1]).strip('"')
+        if self.incremental:
+            self.send(f"(assert (not {activation}))")
+        else:
+            self.send("(pop 1)")
+        return result, detail
+
+    def unsat_core(self):
+        return self.core
+
+    def interrupt(self):
+        self.interrupted = True
+        # Z3 answers unknown to a SIGINT during a check, but exits on one while idle
+        if self.checking:
+            self.process.send_signal(signal.SIGINT)
+
+    def render(self, cond):
+        renderer = ClaimToSmt2(self.renderer.resolve, self.renderer.array_length_dict)
+        return renderer.render(cond)
+
+    def close_session(self):
+        self.send("(pop 1)")
+        self.renderer = None
+        self.preamble = []
+        self.interrupted = False
+        return {"solver_restarts": self.restarts, "num_smt2_chars": self.num_chars}
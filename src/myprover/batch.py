@@ -0,0 +1,490 @@
+import ast
+import os
+import threading
+import time
+import types
+from concurrent.futures import Executor, ProcessPoolExecutor
+
+from .backend import Z3Backend
+from .cache import ProofCache, function_key
+from .prover import PROOF_ERRORS, MyProver
+
+CONTRACT_DECORATORS = ("precondition", "postcondition")
+
+ANNOTATION_TYPES = {
+    "int": int,
+    "bool": bool,
+    "list[int]": list[int],
+    "List[int]": list[int],
+}
+
+
+class FunctionTarget:
+    """A function to verify, found by `collect_functions` without importing its module.
+
+    Args:
+        name (str): The qualified name of the function, such as `f` or `C.f`.
+        filename (str): The path of the source file.
+        node (ast.FunctionDef): The definition of the function in the AST of the file.
+        precondition (str): The precondition of the function.
+        postcondition (str): The postcondition of the function.
+        varname2types (dict): The types of the variables.
+        source (str): The source code of the function, including its decorators.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        filename: str,
+        node: ast.FunctionDef,
+        precondition: str,
+        postcondition: str,
+        varname2types: dict,
+        source: str,
+    ):
+        self.name = name
+        self.filename = filename
+        self.node = node
+        self.precondition = precondition
+        self.postcondition = postcondition
+        self.varname2types = varname2types
+        self.source = source
+
+    def __repr__(self):
+        return f"(FunctionTarget {self.filename}:{self.node.lineno} {self.name})"
+
+
+class FunctionResult:
+    """The outcome of verifying a `FunctionTarget`.
+
+    Args:
+        name (str): The qualified name of the function.
+        filename (str): The path of the source file.
+        lineno (int): The line number of the definition of the function.
+        status (str): "verified", or the name of the exception raised, such as
+            "VerificationFailureError".
+        message (str, optional): The message of the exception.
+        time (float): The time spent on the function in seconds.
+        stats (dict): The `stats` of the prover.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        filename: str,
+        lineno: int,
+        status: str,
+        message: str = None,
+        time: float = 0.0,
+        stats: dict = None,
+    ):
+        self.name = name
+        self.filename = filename
+        self.lineno = lineno
+        self.status = status
+        self.message = message
+        self.time = time
+        self.stats = stats if stats is not None else {}
+
+    def __repr__(self):
+        return f"(FunctionResult {self.name} {self.status})"
+
+    @property
+    def verified(self):
+        return self.status == "verified"
+
+    @classmethod
+    def from_dict(cls, d: dict):
+        return cls(
+            d["name"],
+            d["filename"],
+            d["lineno"],
+            d["status"],
+            d["message"],
+            d["time"],
+            d["stats"],
+        )
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "filename": self.filename,
+            "lineno": self.lineno,
+            "status": self.status,
+            "message": self.message,
+            "time": self.time,
+            "stats": self.stats,
+        }
+
+
+class VerificationReport:
+    """The outcomes of verifying many functions, in the order they were found.
+
+    Args:
+        results (list): The `FunctionResult` of each function.
+        time (float): The wall-clock time of the whole verification in seconds.
+    """
+
+    def __init__(self, results: list, time: float = 0.0):
+        self.results = results
+        self.time = time
+
+    def __repr__(self):
+        return f"(VerificationReport {len(self.failures)}/{len(self.results)} failed)"
+
+    def __iter__(self):
+        return iter(self.results)
+
+    def __len__(self):
+        return len(self.results)
+
+    def __getitem__(self, name: str):
+        for result in self.results:
+            if result.name == name:
+                return result
+        raise KeyError(name)
+
+    @property
+    def verified(self):
+        return all(result.verified for result in self.results)
+
+    @property
+    def failures(self):
+        return [result for result in self.results if not result.verified]
+
+    @classmethod
+    def from_dict(cls, d: dict):
+        return cls([FunctionResult.from_dict(r) for r in d["results"]], d["time"])
+
+    def to_dict(self):
+        return {
+            "verified": self.verified,
+            "time": self.time,
+            "results": [result.to_dict() for result in self.results],
+        }
+
+
+def _decorator_name(node: ast.expr):
+    # `precondition(...)` or `mp.precondition(...)`
+    if not isinstance(node, ast.Call):
+        return None
+    if isinstance(node.func, ast.Name):
+        return node.func.id
+    elif isinstance(node.func, ast.Attribute):
+        return node.func.attr
+    return None
+
+
+def annotation_types(node: ast.FunctionDef):
+    """Reads the types of the parameters from their annotations.
+
+    Only the annotations in `ANNOTATION_TYPES` are understood, and the other parameters
+    are left out.
+
+    Args:
+        node (ast.FunctionDef): The definition of the function.
+
+    Returns:
+        dict: A dictionary mapping the names of the parameters to their types.
+    """
+    varname2types = {}
+    for arg in node.args.posonlyargs + node.args.args + node.args.kwonlyargs:
+        if arg.annotation is None:
+            continue
+        t = ANNOTATION_TYPES.get(ast.unparse(arg.annotation))
+        if t is not None:
+            varname2types[arg.arg] = t
+    return varname2types
+
+
+def parse_types(table: dict):
+    """Reads a side table of types written with the names of `ANNOTATION_TYPES`.
+
+    Args:
+        table (dict): A dictionary mapping the qualified names of the functions to
+            dictionaries mapping variable names to type names, such as `"int"`, as
+            found in JSON.
+
+    Returns:
+        dict: The side table with types, as `collect_functions` takes it.
+
+    Raises:
+        ValueError: If a type name is unknown.
+    """
+    types = {}
+    for qualname, varname2names in table.items():
+        types[qualname] = {}
+        for varname, name in varname2names.items():
+            if name not in ANNOTATION_TYPES:
+                raise ValueError(f"Unknown type `{name}` of `{varname}` in `{qualname}`")
+            types[qualname][varname] = ANNOTATION_TYPES[name]
+    return types
+
+
+def collect_functions(source: str, filename: str = "<unknown>", types: dict = None):
+    """Finds the functions decorated with `precondition` or `postcondition` in a source.
+
+    The source is parsed once, and the functions are never executed. The types of the
+    variables of each function are taken from the annotations of its parameters (see
+    `annotation_types`), updated by the entry of `types` for the function.
+
+    Args:
+        source (str): The source code of a module.
+        filename (str): The path of the source, used in the results.
+        types (dict, optional): A dictionary mapping the qualified names of the
+            functions, such as `f` or `C.f`, to their variable types.
+
+    Returns:
+        list: The `FunctionTarget` of each function, in the order of the source.
+    """
+    types = types or {}
+    lines = source.splitlines(keepends=True)
+    tree = ast.parse(source, filename)
+    targets = []
+    stack = [(tree, "")]
+    while stack:
+        parent, prefix = stack.pop()
+        found = []
+        for node in ast.iter_child_nodes(parent):
+            if isinstance(node, ast.ClassDef):
+                found.append((node, prefix + node.name + "."))
+            elif isinstance(node, ast.FunctionDef):
+                found.append((node, prefix + node.name + "."))
+                contracts = {}
+                for decorator in node.decorator_list:
+                    name = _decorator_name(decorator)
+                    if (
+                        name in CONTRACT_DECORATORS
+                        and decorator.args
+                        and isinstance(decorator.args[0], ast.Constant)
+                    ):
+                        contracts[name] = decorator.args[0].value
+                if not contracts:
+                    continue
+                qualname = prefix + node.name
+                varname2types = annotation_types(node)
+                varname2types.update(types.get(qualname, {}))
+                first = min([node.lineno] + [d.lineno for d in node.decorator_list])
+                targets.append(
+                    FunctionTarget(
+                        qualname,
+                        filename,
+                        node,
+                        contracts.get("precondition", "True"),
+                        contracts.get("postcondition", "True"),
+                        varname2types,
+                        "".join(lines[first - 1 : node.end_lineno]),
+                    )
+                )
+        stack.extend(reversed(found))
+    targets.sort(key=lambda t: t.node.lineno)
+    return targets
+
+
+def verify_target(target: FunctionTarget, options: dict = None):
+    """Verifies a `FunctionTarget` and catches the outcome.
+
+    Args:
+        target (FunctionTarget): The function.
+        options (dict, optional): The keyword arguments of `MyProver.verify`, `skip_inv`
+            as in `prove`, and `function_timeout`, the time limit of the function in
+            seconds. Once it is exceeded, the check running in the backend and the checks
+            after it are interrupted, and the outcome is "TimeoutError". Only the solver
+            is interrupted: the parsing and the generation of the conditions run to the
+            end, so a function may exceed the limit by the time they take.
+
+    Returns:
+        FunctionResult: The outcome.
+    """
+    options = dict(options or {})
+    skip_inv = options.pop("skip_inv", False)
+    function_timeout = options.pop("function_timeout", None)
+    timer = None
+    if function_timeout is not None:
+        if options.get("backend") is None:
+            options["backend"] = Z3Backend(options.get("incremental", True))
+        timer = threading.Timer(function_timeout, options["backend"].interrupt)
+    prover = MyProver()
+    # the type inference extends the type map
+    prover.register(target.name, dict(target.varname2types))
+    start = time.perf_counter()
+    if timer is not None:
+        timer.start()
+    try:
+        prover.verify(
+            target.node,
+            target.name,
+            target.precondition,
+            target.postcondition,
+            skip_inv,
+            **options,
+        )
+        status, message = "verified", None
+    except Exception as e:
+        status, message = type(e).__name__, str(e)
+        if timer is not None and timer.finished.is_set():
+            status = "TimeoutError"
+            message = f"The verification exceeded {function_timeout} seconds"
+    finally:
+        if timer is not None:
+            timer.cancel()
+    return FunctionResult(
+        target.name,
+        target.filename,
+        target.node.lineno,
+        status,
+        message,
+        time.perf_counter() - start,
+        prover.stats,
+    )
+
+
+def verify_targets(
+    targets: list,
+    workers: int = None,
+    proof_cache: ProofCache = None,
+    executor: Executor = None,
+    **options,
+):
+    """Verifies many functions, sharing one pool of worker processes among them.
+
+    Args:
+        targets (list): The `FunctionTarget` of each function.
+        workers (int, optional): If more than one, the functions are verified in a pool of
+            this many processes. Otherwise, they are verified one after another.
+        executor (concurrent.futures.Executor, optional): A pool of processes kept by
+            the caller, such as the one of a `VerificationServer`, in which the
+            functions are verified instead. `workers` is ignored then.
+        proof_cache (ProofCache, optional): A cache of the outcomes as in `prove`. Only
+            "verified", "InvalidInvariantError" and "VerificationFailureError" are stored.
+        **options: The options of `verify_target`.
+
+    Returns:
+        VerificationReport: The outcomes, in the order of `targets`.
+    """
+    start = time.perf_counter()
+    results = [None] * len(targets)
+    keys = [None] * len(targets)
+    pending = []
+    for i, target in enumerate(targets):
+        if proof_cache is not None:
+            keys[i] = function_key(
+                target.source,
+                target.precondition,
+                target.postcondition,
+                target.varname2types,
+                options.get("skip_inv", False),
+                options.get("engine", "wp"),
+                None
+                if options.get("unroll") is None
+                else (options["unroll"], options.get("unwinding_assertion", True)),
+            )
+            outcome = proof_cache.lookup(keys[i])
+            if outcome is not None:
+                results[i] = FunctionResult(
+                    target.name,
+                    target.filename,
+                    target.node.lineno,
+                    *outcome,
+                    stats={"proof_cache_hit": True},
+                )
+                continue
+        pending.append(i)
+
+    if executor is not None:
+        futures = {i: executor.submit(verify_target, targets[i], options) for i in pending}
+        for i, future in futures.items():
+            results[i] = future.result()
+    elif workers is not None and workers > 1 and len(pending) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {
+                i: executor.submit(verify_target, targets[i], options) for i in pending
+            }
+            for i, future in futures.items():
+                results[i] = future.result()
+    else:
+        for i in pending:
+            results[i] = verify_target(targets[i], options)
+
+    if proof_cache is not None:
+        for i in pending:
+            if results[i].verified or results[i].status in PROOF_ERRORS:
+                proof_cache.store(keys[i], results[i].status, results[i].message)
+    return VerificationReport(results, time.perf_counter() - start)
+
+
+def _module_path(module):
+    if isinstance(module, types.ModuleType):
+        return module.__file__
+    return os.fspath(module)
+
+
+def collect_files(paths: list):
+    """Lists the Python files of files and directories, walking directories recursively.
+
+    Args:
+        paths (list): The paths of the files and the directories.
+
+    Returns:
+        list: The paths of the Python files, in sorted order within each directory.
+    """
+    files = []
+    for path in paths:
+        path = os.fspath(path)
+        if not os.path.isdir(path):
+            files.append(path)
+            continue
+        for root, dirs, names in os.walk(path):
+            dirs[:] = sorted(d for d in dirs if not d.startswith((".", "__pycache__")))
+            files.extend(os.path.join(root, n) for n in sorted(names) if n.endswith(".py"))
+    return files
+
+
+def verify_files(paths: list, types: dict = None, **kwargs):
+    """Verifies every decorated function in the Python files of files and directories.
+
+    Args:
+        paths (list): The paths of the files and the directories (see `collect_files`).
+        types (dict, optional): The side table of types as in `collect_functions`.
+        **kwargs: The arguments of `verify_targets`.
+
+    Returns:
+        VerificationReport: The outcomes.
+    """
+    targets = []
+    for filename in collect_files(paths):
+        with open(filename, encoding="utf-8") as f:
+            targets.extend(collect_functions(f.read(), filename, types))
+    return verify_targets(targets, **kwargs)
+
+
+def verify_module(module, types: dict = None, **kwargs):
+    """Verifies every decorated function in a module.
+
+    Args:
+        module (module or str): The module, or the path of its source file.
+        types (dict, optional): The side table of types as in `collect_functions`.
+        **kwargs: The arguments of `verify_targets`.
+
+    Returns:
+        VerificationReport: The outcomes.
+    """
+    return verify_files([_module_path(module)], types, **kwargs)
+
+
+def verify_package(package, types: dict = None, **kwargs):
+    """Verifies every decorated function in the modules of a package and its subpackages.
+
+    Args:
+        package (module or str): The package, or the path of its directory.
+        types (dict, optional): The side table of types as in `collect_functions`. The
+            names of functions are qualified within their modules only.
+        **kwargs: The arguments of `verify_targets`.
+
+    Returns:
+        VerificationReport: The outcomes.
+    """
+    path = _module_path(package)
+    if os.path.basename(path) == "__init__.py":
+        path = os.path.dirname(path)
+    return verify_files([path], types, **kwargs)
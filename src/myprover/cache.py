@@ -0,0 +1,373 @@
+import collections
+import functools
+import hashlib
+import importlib.metadata
+import json
+import os
+import sqlite3
+import threading
+import time
+
+import z3
+
+
+class CacheKey:
+    """The key of a satisfiability problem in a `ResultCache`.
+
+    Args:
+        digest (str): The digest of the canonical form of the problem.
+        names (list): The names of the free constants of the problem in canonical order.
+    """
+
+    def __init__(self, digest: str, names: list):
+        self.digest = digest
+        self.names = names
+
+    def __repr__(self):
+        return f"(CacheKey {self.digest})"
+
+
+def canonicalize(formula, config: str = ""):
+    """Computes the alpha-normalized key of a Z3 formula.
+
+    The formula is hashed bottom-up like a Merkle tree, visiting every shared node once.
+    Free constants are numbered in the order they are first reached, so formulas that
+    only differ in the names of their variables, such as versions `x!1`, havoc names
+    `x@0` or fork names `x#1`, have the same key as long as the sorts agree. Bound
+    variables are de Bruijn indices in Z3 and hence never part of the key, which
+    normalizes the names `x$$0` of the bound variables of the claims.
+
+    Args:
+        formula (z3.BoolRef): The formula.
+        config (str): The configuration of the solver, which is part of the key.
+
+    Returns:
+        CacheKey: The key of the formula.
+    """
+    digests, names, stack = {}, [], [formula]
+    while stack:
+        e = stack[-1]
+        if e.get_id() in digests:
+            stack.pop()
+            continue
+        if z3.is_quantifier(e):
+            children = [e.body()]
+        elif z3.is_app(e):
+            children = e.children()
+        else:
+            children = []
+        pending = [c for c in children if c.get_id() not in digests]
+        if pending:
+            stack.extend(reversed(pending))
+            continue
+        stack.pop()
+        if z3.is_var(e):
+            node = f"var {z3.get_var_index(e)} {e.sort().sexpr()}"
+        elif z3.is_quantifier(e):
+            binder = "forall" if e.is_forall() else "exists" if e.is_exists() else "lambda"
+            sorts = " ".join(e.var_sort(i).sexpr() for i in range(e.num_vars()))
+            node = f"{binder} ({sorts})"
+        elif z3.is_const(e) and e.decl().kind() == z3.Z3_OP_UNINTERPRETED:
+            node = f"const {len(names)} {e.sort().sexpr()}"
+            names.append(e.decl().name())
+        elif z3.is_const(e):
+            node = f"value {e.sexpr()}"
+        else:
+            node = f"app {e.decl().kind()} {e.decl().name()}"
+        digests[e.get_id()] = hashlib.sha256(
+            " ".join([node] + [digests[c.get_id()] for c in children]).encode()
+        ).hexdigest()
+    digest = hashlib.sha256(
+        f"{config}\n{digests[formula.get_id()]}".encode()
+    ).hexdigest()
+    return CacheKey(digest, names)
+
+
+def default_cache_directory():
+    """Returns the directory of the cache, `$MYPROVER_CACHE_DIR` or `~/.cache/myprover`."""
+    return os.environ.get(
+        "MYPROVER_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "myprover")
+    )
+
+
+class ResultCache:
+    """A persistent cache of the results of satisfiability problems in SQLite.
+
+    Only definitive results ("sat" and "unsat") are stored, together with the values of
+    the counterexample for "sat", which are renamed to the names of the problem looked
+    up. When the cache holds more than `max_entries` results, the least recently used
+    ones are evicted in one batch, down to 90% of `max_entries`, so that the stores
+    after an eviction do not evict again.
+
+    Args:
+        directory (str, optional): The directory of the database file. Defaults to
+            `default_cache_directory()`.
+        max_entries (int): The maximum number of results kept.
+        config (str, optional): The configuration of the solver, which is part of every
+            key. Defaults to the version of Z3.
+
+    Attributes:
+        hits (int): The number of successful lookups.
+        misses (int): The number of failed lookups.
+    """
+
+    def __init__(self, directory: str = None, max_entries: int = 100000, config=None):
+        self.directory = directory if directory is not None else default_cache_directory()
+        self.max_entries = max_entries
+        self.config = config if config is not None else f"z3 {z3.get_version_string()}"
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(self.directory, exist_ok=True)
+        self.path = os.path.join(self.directory, "results.sqlite")
+        # the cache may be shared by the verifications running in the threads of an
+        # executor (see `MyProver.verify_async`), which take turns by the lock
+        self.lock = threading.RLock()
+        self.connection = sqlite3.connect(
+            self.path, timeout=30, check_same_thread=False
+        )
+        with self.connection:
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS results ("
+                "key TEXT PRIMARY KEY, result TEXT NOT NULL, model TEXT, used REAL NOT NULL)"
+            )
+            self.connection.execute(
+                "CREATE INDEX IF NOT EXISTS results_used ON results (used)"
+            )
+
+    def __len__(self):
+        with self.lock:
+            return self.connection.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+
+    def key(self, formula):
+        """Computes the key of a formula with the configuration of this cache.
+
+        Args:
+            formula (z3.BoolRef): The formula.
+
+        Returns:
+            CacheKey: The key of the formula.
+        """
+        return canonicalize(formula, self.config)
+
+    def lookup(self, key: CacheKey):
+        """Looks up the result of a problem.
+
+        Args:
+            key (CacheKey): The key of the problem.
+
+        Returns:
+            tuple: The result and the counterexample as a list of (name, value) pairs if
+                the result is "sat", otherwise None, or None if the key is not cached.
+        """
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT result, model FROM results WHERE key = ?", (key.digest,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            with self.connection:
+                self.connection.execute(
+                    "UPDATE results SET used = ? WHERE key = ?",
+                    (time.time(), key.digest),
+                )
+            result, model = row
+            if model is None:
+                return result, None
+            return result, [(key.names[i], value) for i, value in json.loads(model)]
+
+    def store(self, key: CacheKey, result: str, model: list = None):
+        """Stores the result of a problem, unless it is "unknown".
+
+        Args:
+            key (CacheKey): The key of the problem.
+            result (str): The result, "sat", "unsat" or "unknown".
+            model (list, optional): The counterexample as (name, value) pairs. Values of
+                names that are not free constants of the problem are left out.
+        """
+        if result not in ("sat", "unsat"):
+            return
+        if model is not None:
+            indices = {name: i for i, name in enumerate(key.names)}
+            model = json.dumps(
+                [[indices[name], value] for name, value in model if name in indices]
+            )
+        with self.lock:
+            with self.connection:
+                self.connection.execute(
+                    "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?)",
+                    (key.digest, result, model, time.time()),
+                )
+                count = self.connection.execute(
+                    "SELECT COUNT(*) FROM results"
+                ).fetchone()[0]
+                if count > self.max_entries:
+                    # rounded up, so that a small cache keeps `max_entries` results
+                    keep = -(-self.max_entries * 9 // 10)
+                    self.connection.execute(
+                        "DELETE FROM results WHERE key IN (SELECT key FROM results "
+                        "ORDER BY used, rowid LIMIT ?)",
+                        (count - keep,),
+                    )
+
+    def clear(self):
+        """Removes all results from the cache."""
+        with self.lock:
+            with self.connection:
+                self.connection.execute("DELETE FROM results")
+
+    def close(self):
+        self.connection.close()
+
+
+def library_version():
+    """Returns the installed version of myprover, or "unknown" in a source tree."""
+    try:
+        return importlib.metadata.version("myprover")
+    except importlib.metadata.PackageNotFoundError:
+        return "unknown"
+
+
+@functools.lru_cache(maxsize=None)
+def source_digest():
+    """Returns the digest of the source files of myprover.
+
+    The version of a source tree is "unknown" and that of an editable install does not
+    change with its files, so the outcomes in a `ProofCache` are tied to the code that
+    produced them by this digest instead. It is computed once per process.
+    """
+    package = os.path.dirname(os.path.abspath(__file__))
+    digest = hashlib.sha256()
+    for root, dirs, names in os.walk(package):
+        dirs[:] = sorted(d for d in dirs if d != "__pycache__")
+        for name in sorted(n for n in names if n.endswith(".py")):
+            path = os.path.join(root, name)
+            digest.update(os.path.relpath(path, package).encode() + b"\0")
+            with open(path, "rb") as f:
+                digest.update(hashlib.sha256(f.read()).digest())
+    return digest.hexdigest()
+
+
+def function_key(
+    source: str,
+    precondition: str,
+    postcondition: str,
+    varname2types: dict,
+    skip_inv: bool,
+    engine: str = "wp",
+    bound: tuple = None,
+):
+    """Computes the key of the verification of a function in a `ProofCache`.
+
+    Args:
+        source (str): The source code of the function, including its decorators.
+        precondition (str): The precondition of the function.
+        postcondition (str): The postcondition of the function.
+        varname2types (dict): The types of the variables given by the user.
+        skip_inv (bool): The flag whether failing invariants are reported as such.
+        engine (str): The VC generator.
+        bound (tuple, optional): The depth of the unrolling and whether the unwinding
+            assertions are checked, if the function is bounded model checked.
+
+    Returns:
+        str: The key, which also depends on `library_version()` and `source_digest()`.
+    """
+    types = sorted((name, repr(t)) for name, t in (varname2types or {}).items())
+    fields = [source, precondition, postcondition, types, skip_inv, engine]
+    if bound is not None:
+        # a bounded result is not a proof, so it never answers an unbounded lookup
+        fields.append(list(bound))
+    payload = json.dumps(fields + [library_version(), source_digest()])
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class ProofCache:
+    """A cache of the outcomes of verifying whole functions.
+
+    The outcomes are kept in an in-memory LRU of `maxsize` entries, and also in SQLite if
+    `directory` is given, so they survive the process. An outcome is the status, either
+    "verified" or the name of the exception raised, and the message of the exception.
+
+    Args:
+        maxsize (int): The maximum number of outcomes kept in memory.
+        directory (str, optional): The directory of the database file, or None to keep
+            the outcomes in memory only.
+
+    Attributes:
+        hits (int): The number of successful lookups.
+        misses (int): The number of failed lookups.
+    """
+
+    def __init__(self, maxsize: int = 1024, directory: str = None):
+        self.maxsize = maxsize
+        self.entries = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.connection = None
+        self.lock = threading.RLock()
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+            self.connection = sqlite3.connect(
+                os.path.join(directory, "proofs.sqlite"),
+                timeout=30,
+                check_same_thread=False,
+            )
+            with self.connection:
+                self.connection.execute(
+                    "CREATE TABLE IF NOT EXISTS proofs ("
+                    "key TEXT PRIMARY KEY, status TEXT NOT NULL, message TEXT)"
+                )
+
+    def _remember(self, key, entry):
+        self.entries[key] = entry
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+    def lookup(self, key: str):
+        """Looks up the outcome of a function.
+
+        Args:
+            key (str): The key of `function_key`.
+
+        Returns:
+            tuple: The status and the message, or None if the key is not cached.
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None and self.connection is not None:
+                entry = self.connection.execute(
+                    "SELECT status, message FROM proofs WHERE key = ?", (key,)
+                ).fetchone()
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._remember(key, tuple(entry))
+            return tuple(entry)
+
+    def store(self, key: str, status: str, message: str = None):
+        """Stores the outcome of a function.
+
+        Args:
+            key (str): The key of `function_key`.
+            status (str): "verified" or the name of the exception raised.
+            message (str, optional): The message of the exception.
+        """
+        with self.lock:
+            self._remember(key, (status, message))
+            if self.connection is not None:
+                with self.connection:
+                    self.connection.execute(
+                        "INSERT OR REPLACE INTO proofs VALUES (?, ?, ?)",
+                        (key, status, message),
+                    )
+
+    def clear(self):
+        """Removes all outcomes from the cache."""
+        with self.lock:
+            self.entries.clear()
+            if self.connection is not None:
+                with self.connection:
+                    self.connection.execute("DELETE FROM proofs")
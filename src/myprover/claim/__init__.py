@@ -5,12 +5,18 @@ from .expr import (  # noqa : F401
     Op,
     QuantificationExpr,
     SliceExpr,
+    StoreExpr,
     SubscriptExpr,
     UnOpExpr,
     VarExpr,
+    collect_all_varnames,
+    count_nodes,
+    pretty_expr,
+    tree_size,
 )
 from .op import Op  # noqa : F401
 from .parser import ClaimParser  # noqa : F401
+from .simplify import simplify  # noqa : F401
 from .stmt import (  # noqa : F401
     AssertStmt,
     AssignStmt,
@@ -22,6 +28,8 @@ from .stmt import (  # noqa : F401
     Stmt,
     WhileStmt,
     DPAssignStmt,
+    flatten_seq,
+    map_seq,
     pretty_repr,
 )
 from .value import BoolValue, IntValue  # noqa : F401
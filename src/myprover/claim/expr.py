@@ -1,18 +1,133 @@
+import threading
+import weakref
 from abc import ABCMeta, abstractmethod
 
 from .op import Op
 from .value import GeneralValue, IntValue
 
+_hashcons_table = weakref.WeakValueDictionary()
+_hashcons_lock = threading.RLock()
 
-class Expr(metaclass=ABCMeta):
+
+class HashConsMeta(ABCMeta):
+    """Metaclass implementing the hash-consing factory for expressions.
+
+    Calling an expression class whose `_hashcons_key` returns a key looks the
+    key up in a global weak table first, so structurally identical nodes are
+    one shared object and the Claim AST becomes a DAG. Children are already
+    shared, hence the key only needs the identities of the child nodes. The lookup
+    and the insertion are atomic, so verifications running in several threads share
+    the same nodes too.
+    """
+
+    def __call__(cls, *args, **kwargs):
+        key = cls._hashcons_key(*args, **kwargs)
+        if key is None:
+            return super().__call__(*args, **kwargs)
+        key = (cls, key)
+        with _hashcons_lock:
+            node = _hashcons_table.get(key)
+            if node is None:
+                node = super().__call__(*args, **kwargs)
+                _hashcons_table[key] = node
+        return node
+
+
+def hashcons_table_size():
+    """Return the number of live hash-consed expression nodes.
+
+    Returns:
+        int: The number of entries in the hash-consing table.
+    """
+    return len(_hashcons_table)
+
+
+def _value_key(v):
+    if isinstance(v, GeneralValue):
+        return (type(v), v.v)
+    return (type(v), v)
+
+
+def _structural_hash(node):
+    """Compute and cache the structural hashes of a node and its descendants.
+
+    Nodes are expressions or statements implementing `_hash_fields` and `children`.
+    The tree is walked with an explicit stack, and every node is hashed only once.
+    """
+    stack = [node]
+    while stack:
+        n = stack[-1]
+        if n._hash is not None:
+            stack.pop()
+            continue
+        children = n.children()
+        pending = [c for c in children if c is not None and c._hash is None]
+        if pending:
+            stack.extend(pending)
+            continue
+        stack.pop()
+        n._hash = hash(
+            (
+                type(n),
+                n._hash_fields(),
+                tuple(None if c is None else c._hash for c in children),
+            )
+        )
+    return node._hash
+
+
+def _structural_eq(node, other):
+    """Compare two nodes structurally without recursion.
+
+    Pairs of shared nodes are compared only once, and the cached hashes rule out most
+    unequal pairs without visiting their children.
+    """
+    stack, seen = [(node, other)], set()
+    while stack:
+        a, b = stack.pop()
+        if a is b:
+            continue
+        if (
+            a is None
+            or b is None
+            or type(a) is not type(b)
+            or hash(a) != hash(b)
+            or a._fields() != b._fields()
+        ):
+            return False
+        if (id(a), id(b)) in seen:
+            continue
+        seen.add((id(a), id(b)))
+        children_a, children_b = a.children(), b.children()
+        if len(children_a) != len(children_b):
+            return False
+        stack.extend(zip(children_a, children_b))
+    return True
+
+
+class Expr(metaclass=HashConsMeta):
     """Abstract base class for all expression types.
 
     This class provides the interface for all expressions with methods for
     collecting variable names and assigning new variables.
+
+    Expressions are compared and hashed structurally. The hash is computed once per
+    node and cached, so expressions can be used as keys of caches and memo tables.
     """
 
-    def __init__(self) -> None:
-        self._is_expr_to_verify_invriant = False
+    _hash = None
+
+    def __hash__(self):
+        if self._hash is None:
+            return _structural_hash(self)
+        return self._hash
+
+    def __eq__(self, other):
+        if self is other:
+            return True
+        if not isinstance(other, Expr):
+            return NotImplemented
+        return _structural_eq(self, other)
 
     @abstractmethod
     def collect_varnames(self):
@@ -24,22 +139,92 @@ class Expr(metaclass=ABCMeta):
         pass
 
     @abstractmethod
-    def assign_variable(self, old_var, new_var):
+    def assign_variable(self, old_var, new_var, memo=None):
         """Assign a new variable in place of an old variable in the expression.
 
+        Subterms that do not change are returned as is, and `memo` maps the id
+        of every visited node to its result, so shared subterms are rewritten
+        only once and the result keeps the sharing of the input.
+
         Args:
             old_var (VarExpr): The variable to be replaced.
             new_var (VarExpr): The variable to replace with.
+            memo (dict, optional): Results of already visited nodes.
 
         Returns:
             Expr: The updated expression.
         """
         pass
 
+    def substitute(self, mapping, memo=None):
+        """Simultaneously replace variables according to a mapping in one traversal.
+
+        This is equivalent to calling `assign_variable` once for every item of
+        the mapping, but visits every node of the expression only once. The
+        expression is walked with an explicit stack, so its depth is not
+        limited by the recursion limit.
+
+        Args:
+            mapping (dict): A dictionary mapping the variables to be replaced (VarExpr)
+                to the expressions to replace them with.
+            memo (dict, optional): Results of already visited nodes.
+
+        Returns:
+            Expr: The updated expression.
+        """
+        if memo is None:
+            memo = {}
+        stack = [self]
+        while stack:
+            e = stack[-1]
+            if id(e) in memo:
+                stack.pop()
+                continue
+            operands = e._operands()
+            pending = [c for c in operands if id(c) not in memo]
+            if pending:
+                stack.extend(pending)
+                continue
+            stack.pop()
+            new_operands = [memo[id(c)] for c in operands]
+            if isinstance(e, VarExpr):
+                memo[id(e)] = mapping.get(e, e)
+            elif all(n is o for n, o in zip(new_operands, operands)):
+                memo[id(e)] = e
+            else:
+                memo[id(e)] = e._rebuild(new_operands)
+        return memo[id(self)]
+
     @abstractmethod
     def clone(self):
         pass
 
+    @staticmethod
+    def _hashcons_key(*args, **kwargs):
+        return None
+
+    def children(self):
+        """Return the direct sub-expressions of the expression.
+
+        Returns:
+            tuple: The child expressions.
+        """
+        return ()
+
+    def _operands(self):
+        # the sub-expressions rewritten by `substitute`
+        return self.children()
+
+    def _fields(self):
+        # the attributes other than the children that make up the structure of the node
+        return ()
+
+    def _hash_fields(self):
+        return self._fields()
+
+    def _rebuild(self, operands):
+        return self
+
 
 class VarExpr(Expr):
     """Represents a variable expression.
@@ -52,6 +237,13 @@ class VarExpr(Expr):
         super().__init__()
         self.name = name
 
+    @staticmethod
+    def _hashcons_key(name):
+        return name
+
+    def _fields(self):
+        return (self.name,)
+
     def __repr__(self):
         return f"(Var {self.name})"
 
@@ -63,21 +255,27 @@ class VarExpr(Expr):
         """
         return {self.name}
 
-    def assign_variable(self, old_var, new_var):
+    def assign_variable(self, old_var, new_var, memo=None):
         """Assign a new variable in place of an old variable in the variable expression.
 
+        If `old_var` is an element of this array, the array is replaced with the array
+        updated at that index.
+
         Args:
-            old_var (Expr): The variable to be replaced.
+            old_var (Expr): The variable or the array element to be replaced.
             new_var (Expr): The variable to replace with.
+            memo (dict, optional): Results of already visited nodes.
 
         Returns:
-            VarExpr: The updated variable expression.
+            Expr: The updated variable expression.
         """
         if isinstance(old_var, VarExpr):
             if self.name == old_var.name:
                 return new_var
             else:
                 return self
+        elif isinstance(old_var, SubscriptExpr) and self.name == old_var.var.name:
+            return StoreExpr(self, old_var.subscript, new_var)
         else:
             return self
 
@@ -98,9 +296,19 @@ class SliceExpr(Expr):
         self.lower = lower if lower is not None else LiteralExpr(IntValue(0))
         self.upper = upper
 
+    @staticmethod
+    def _hashcons_key(lower, upper):
+        return (lower if lower is not None else LiteralExpr(IntValue(0)), upper)
+
     def __repr__(self):
         return f"(Slice {self.lower} -> {self.upper})"
 
+    def children(self):
+        return tuple(e for e in (self.lower, self.upper) if e is not None)
+
+    def _operands(self):
+        return ()
+
     def collect_varnames(self):
         """Collect variable names in the slice expression.
 
@@ -109,12 +317,13 @@ class SliceExpr(Expr):
         """
         return set()
 
-    def assign_variable(self, old_var, new_var):
+    def assign_variable(self, old_var, new_var, memo=None):
         """Assign a new variable in place of an old variable in the slice expression.
 
         Args:
             old_var (VarExpr): The variable to be replaced.
             new_var (VarExpr): The variable to replace with.
+            memo (dict, optional): Results of already visited nodes.
 
         Returns:
             SliceExpr: The unchanged slice expression.
@@ -137,13 +346,19 @@ class SubscriptExpr(Expr):
         super().__init__()
         self.var = var
         self.subscript = subscript
-        self.assign={} # dict[SliceExpr, Expr]
+
+    @staticmethod
+    def _hashcons_key(var, subscript):
+        return (var, subscript)
+
+    def children(self):
+        return (self.var, self.subscript)
+
+    def _rebuild(self, operands):
+        return SubscriptExpr(*operands)
 
     def __repr__(self):
-        if len(self.assign) == 0:
-            return f"(Subscript {self.var} {self.subscript})"
-        else:
-            return f"(Subscript {self.var} {self.subscript} [{self.assign}])"
+        return f"(Subscript {self.var} {self.subscript})"
 
     def collect_varnames(self):
         """Collect variable names in the subscript expression.
@@ -153,25 +368,101 @@ class SubscriptExpr(Expr):
         """
         return self.var.collect_varnames().union(self.subscript.collect_varnames())
 
-    def assign_variable(self, old_var, new_var):
+    def assign_variable(self, old_var, new_var, memo=None):
         """Assign a new variable in place of an old variable in the subscript expression.
 
+        Args:
+            old_var (Expr): The variable or the array element to be replaced.
+            new_var (Expr): The variable to replace with.
+            memo (dict, optional): Results of already visited nodes.
+
+        Returns:
+            SubscriptExpr: The updated subscript expression.
+        """
+        if memo is None:
+            memo = {}
+        if id(self) in memo:
+            return memo[id(self)]
+        var = self.var.assign_variable(old_var, new_var, memo)
+        subscript = self.subscript.assign_variable(old_var, new_var, memo)
+        if var is self.var and subscript is self.subscript:
+            result = self
+        else:
+            result = SubscriptExpr(var, subscript)
+        memo[id(self)] = result
+        return result
+
+    def clone(self):
+        return SubscriptExpr(self.var.clone(), self.subscript.clone())
+
+
+class StoreExpr(Expr):
+    """Represents an array that equals another array except at one index.
+
+    Args:
+        var (Expr): The original array.
+        index (Expr): The updated index.
+        value (Expr): The value stored at the index.
+    """
+
+    def __init__(self, var: Expr, index: Expr, value: Expr):
+        super().__init__()
+        self.var = var
+        self.index = index
+        self.value = value
+
+    @staticmethod
+    def _hashcons_key(var, index, value):
+        return (var, index, value)
+
+    def __repr__(self):
+        return f"(Store {self.var} {self.index} {self.value})"
+
+    def children(self):
+        return (self.var, self.index, self.value)
+
+    def _rebuild(self, operands):
+        return StoreExpr(*operands)
+
+    def collect_varnames(self):
+        """Collect variable names in the store expression.
+
+        Returns:
+            set: A set of variable names in the array, index and value expressions.
+        """
+        return {
+            *self.var.collect_varnames(),
+            *self.index.collect_varnames(),
+            *self.value.collect_varnames(),
+        }
+
+    def assign_variable(self, old_var, new_var, memo=None):
+        """Assign a new variable in place of an old variable in the store expression.
+
         Args:
             old_var (VarExpr): The variable to be replaced.
             new_var (VarExpr): The variable to replace with.
+            memo (dict, optional): Results of already visited nodes.
 
         Returns:
-            SubscriptExpr: The unchanged subscript expression.
+            StoreExpr: The updated store expression.
         """
-        if isinstance(old_var, SubscriptExpr) and self.var.name == old_var.var.name:
-            self.assign[str(old_var.subscript)] = new_var
+        if memo is None:
+            memo = {}
+        if id(self) in memo:
+            return memo[id(self)]
+        var = self.var.assign_variable(old_var, new_var, memo)
+        index = self.index.assign_variable(old_var, new_var, memo)
+        value = self.value.assign_variable(old_var, new_var, memo)
+        if var is self.var and index is self.index and value is self.value:
+            result = self
         else:
-            for k, v in self.assign.items():
-                self.assign[k] = v.assign_variable(old_var, new_var)
-        return self
+            result = StoreExpr(var, index, value)
+        memo[id(self)] = result
+        return result
 
     def clone(self):
-        return SubscriptExpr(self.var.clone(), self.subscript.clone())
+        return StoreExpr(self.var.clone(), self.index.clone(), self.value.clone())
 
 
 class LiteralExpr(Expr):
@@ -185,6 +476,13 @@ class LiteralExpr(Expr):
         super().__init__()
         self.value = v
 
+    @staticmethod
+    def _hashcons_key(v):
+        return _value_key(v)
+
+    def _fields(self):
+        return (_value_key(self.value),)
+
     def __repr__(self):
         return f"(Literal {self.value})"
 
@@ -196,12 +494,13 @@ class LiteralExpr(Expr):
         """
         return set()
 
-    def assign_variable(self, old_var, new_var):
+    def assign_variable(self, old_var, new_var, memo=None):
         """Assign a new variable in place of an old variable in the literal expression.
 
         Args:
             old_var (VarExpr): The variable to be replaced.
             new_var (VarExpr): The variable to replace with.
+            memo (dict, optional): Results of already visited nodes.
 
         Returns:
             LiteralExpr: The unchanged literal expression.
@@ -225,6 +524,19 @@ class UnOpExpr(Expr):
         self.op = op
         self.e = expr
 
+    @staticmethod
+    def _hashcons_key(op, expr):
+        return (op, expr)
+
+    def _fields(self):
+        return (self.op,)
+
+    def children(self):
+        return (self.e,)
+
+    def _rebuild(self, operands):
+        return UnOpExpr(self.op, operands[0])
+
     def __repr__(self):
         return f"(UnOp {self.op} {self.e})"
 
@@ -236,17 +548,25 @@ class UnOpExpr(Expr):
         """
         return {*self.e.collect_varnames()}
 
-    def assign_variable(self, old_var, new_var):
+    def assign_variable(self, old_var, new_var, memo=None):
         """Assign a new variable in place of an old variable in the unary operation expression.
 
         Args:
             old_var (VarExpr): The variable to be replaced.
             new_var (VarExpr): The variable to replace with.
+            memo (dict, optional): Results of already visited nodes.
 
         Returns:
             UnOpExpr: The updated unary operation expression.
         """
-        return UnOpExpr(self.op, self.e.assign_variable(old_var, new_var))
+        if memo is None:
+            memo = {}
+        if id(self) in memo:
+            return memo[id(self)]
+        e = self.e.assign_variable(old_var, new_var, memo)
+        result = self if e is self.e else UnOpExpr(self.op, e)
+        memo[id(self)] = result
+        return result
 
     def clone(self):
         return UnOpExpr(self.op, self.e.clone())
@@ -267,6 +587,19 @@ class BinOpExpr(Expr):
         self.e2 = r
         self.op = op
 
+    @staticmethod
+    def _hashcons_key(l, op, r):
+        return (l, op, r)
+
+    def _fields(self):
+        return (self.op,)
+
+    def children(self):
+        return (self.e1, self.e2)
+
+    def _rebuild(self, operands):
+        return BinOpExpr(operands[0], self.op, operands[1])
+
     def __repr__(self):
         return f"(BinOp {self.e1} {self.op} {self.e2})"
 
@@ -278,21 +611,29 @@ class BinOpExpr(Expr):
         """
         return {*self.e1.collect_varnames(), *self.e2.collect_varnames()}
 
-    def assign_variable(self, old_var, new_var):
+    def assign_variable(self, old_var, new_var, memo=None):
         """Assign a new variable in place of an old variable in the binary operation expression.
 
         Args:
             old_var (VarExpr): The variable to be replaced.
             new_var (VarExpr): The variable to replace with.
+            memo (dict, optional): Results of already visited nodes.
 
         Returns:
             BinOpExpr: The updated binary operation expression.
         """
-        return BinOpExpr(
-            self.e1.assign_variable(old_var, new_var),
-            self.op,
-            self.e2.assign_variable(old_var, new_var),
-        )
+        if memo is None:
+            memo = {}
+        if id(self) in memo:
+            return memo[id(self)]
+        e1 = self.e1.assign_variable(old_var, new_var, memo)
+        e2 = self.e2.assign_variable(old_var, new_var, memo)
+        if e1 is self.e1 and e2 is self.e2:
+            result = self
+        else:
+            result = BinOpExpr(e1, self.op, e2)
+        memo[id(self)] = result
+        return result
 
     def clone(self):
         return BinOpExpr(self.e1.clone(), self.op, self.e2.clone())
@@ -317,6 +658,24 @@ class QuantificationExpr(Expr):
         self.expr = expr
         self.bounded = bounded
 
+    @staticmethod
+    def _hashcons_key(quantifier, var, expr, var_type=None, bounded=False):
+        return (quantifier, var, expr, var_type, bounded)
+
+    def children(self):
+        return (self.var, self.expr)
+
+    def _operands(self):
+        return (self.expr,)
+
+    def _fields(self):
+        return (self.quantifier, self.var_type, self.bounded)
+
+    def _rebuild(self, operands):
+        return QuantificationExpr(
+            self.quantifier, self.var, operands[0], self.var_type, self.bounded
+        )
+
     def sanitize(self):
         """Sanitize the quantification expression by renaming variables.
 
@@ -353,24 +712,30 @@ class QuantificationExpr(Expr):
 
         return set()
 
-    def assign_variable(self, old_var, new_var):
+    def assign_variable(self, old_var, new_var, memo=None):
         """Assign a new variable in place of an old variable in the quantification expression.
 
         Args:
             old_var (VarExpr): The variable to be replaced.
             new_var (VarExpr): The variable to replace with.
+            memo (dict, optional): Results of already visited nodes.
 
         Returns:
             QuantificationExpr: The updated quantification expression.
         """
-
-        return QuantificationExpr(
-            self.quantifier,
-            self.var,
-            self.expr.assign_variable(old_var, new_var),
-            self.var_type,
-            self.bounded,
-        )
+        if memo is None:
+            memo = {}
+        if id(self) in memo:
+            return memo[id(self)]
+        e = self.expr.assign_variable(old_var, new_var, memo)
+        if e is self.expr:
+            result = self
+        else:
+            result = QuantificationExpr(
+                self.quantifier, self.var, e, self.var_type, self.bounded
+            )
+        memo[id(self)] = result
+        return result
 
     def clone(self):
         return QuantificationExpr(
@@ -380,3 +745,110 @@ class QuantificationExpr(Expr):
             self.var_type,
             self.bounded,
         )
+
+
+def count_nodes(expr):
+    """Count the distinct nodes of an expression DAG.
+
+    Args:
+        expr (Expr): The root expression.
+
+    Returns:
+        int: The number of distinct node objects reachable from `expr`.
+    """
+    seen = set()
+    stack = [expr]
+    while stack:
+        e = stack.pop()
+        if id(e) in seen:
+            continue
+        seen.add(id(e))
+        stack.extend(e.children())
+    return len(seen)
+
+
+def collect_all_varnames(exprs):
+    """Collect the names of all variables occurring in the expressions.
+
+    Unlike `Expr.collect_varnames`, this also descends into quantifiers.
+
+    Args:
+        exprs (list): The expressions to traverse.
+
+    Returns:
+        set: A set of variable names.
+    """
+    varnames, seen = set(), set()
+    stack = list(exprs)
+    while stack:
+        e = stack.pop()
+        if id(e) in seen:
+            continue
+        seen.add(id(e))
+        if isinstance(e, VarExpr):
+            varnames.add(e.name)
+        stack.extend(e.children())
+    return varnames
+
+
+def tree_size(expr):
+    """Count the nodes of an expression as if it were unfolded into a tree.
+
+    Args:
+        expr (Expr): The root expression.
+
+    Returns:
+        int: The number of nodes of the unshared tree.
+    """
+    sizes = {}
+    stack = [(expr, False)]
+    while stack:
+        e, expanded = stack.pop()
+        if id(e) in sizes:
+            continue
+        if expanded:
+            sizes[id(e)] = 1 + sum(sizes[id(c)] for c in e.children())
+        else:
+            stack.append((e, True))
+            stack.extend((c, False) for c in e.children())
+    return sizes[id(expr)]
+
+
+def pretty_expr(expr):
+    """Print an expression in the syntax of `ClaimParser`.
+
+    Args:
+        expr (Expr): The expression to print.
+
+    Returns:
+        str: The expression in infix notation, e.g. `x + 1 > y`.
+    """
+
+    def operand(e):
+        if isinstance(e, BinOpExpr) or isinstance(e, QuantificationExpr):
+            return f"({pretty_expr(e)})"
+        return pretty_expr(e)
+
+    if isinstance(expr, VarExpr):
+        return expr.name
+    elif isinstance(expr, LiteralExpr):
+        return str(getattr(expr.value, "v", expr.value))
+    elif isinstance(expr, SubscriptExpr):
+        return f"{operand(expr.var)}[{pretty_expr(expr.subscript)}]"
+    elif isinstance(expr, SliceExpr):
+        upper = "" if expr.upper is None else pretty_expr(expr.upper)
+        return f"{pretty_expr(expr.lower)}:{upper}"
+    elif isinstance(expr, StoreExpr):
+        args = ", ".join(pretty_expr(e) for e in (expr.var, expr.index, expr.value))
+        return f"Store({args})"
+    elif isinstance(expr, UnOpExpr):
+        if expr.op == Op.Not:
+            return f"not {operand(expr.e)}"
+        return f"{expr.op.value.name}{operand(expr.e)}"
+    elif isinstance(expr, BinOpExpr):
+        symbol = ">=" if expr.op == Op.Ge else expr.op.value.name
+        return f"{operand(expr.e1)} {symbol} {operand(expr.e2)}"
+    elif isinstance(expr, QuantificationExpr):
+        var, body = pretty_expr(expr.var), pretty_expr(expr.expr)
+        return f"{expr.quantifier.lower()} {var} :: {body}"
+    return str(expr)
@@ -0,0 +1,176 @@
+from .expr import (
+    BinOpExpr,
+    Expr,
+    LiteralExpr,
+    QuantificationExpr,
+    UnOpExpr,
+)
+from .op import Op
+from .value import BoolValue, GeneralValue, IntValue
+
+
+def _literal(e: Expr):
+    """Return the Python value of a literal expression, or None."""
+    if not isinstance(e, LiteralExpr):
+        return None
+    return e.value.v if isinstance(e.value, GeneralValue) else e.value
+
+
+def _is_bool(e: Expr, v: bool):
+    return _literal(e) is v
+
+
+def _is_int(e: Expr, v: int):
+    value = _literal(e)
+    return type(value) is int and value == v
+
+
+def _bool(v: bool):
+    return LiteralExpr(BoolValue(v))
+
+
+def _int(v: int):
+    return LiteralExpr(IntValue(v))
+
+
+def _simplify_unop(e: UnOpExpr):
+    v = _literal(e.e)
+    if e.op == Op.Not:
+        if isinstance(v, bool):
+            return _bool(not v)
+        if isinstance(e.e, UnOpExpr) and e.e.op == Op.Not:
+            return e.e.e
+    elif e.op == Op.Minus:
+        if type(v) is int:
+            return _int(-v)
+        if isinstance(e.e, UnOpExpr) and e.e.op == Op.Minus:
+            return e.e.e
+    elif e.op == Op.Abs and type(v) is int:
+        return _int(abs(v))
+    return e
+
+
+def _simplify_binop(e: BinOpExpr):
+    e1, e2, op = e.e1, e.e2, e.op
+    v1, v2 = _literal(e1), _literal(e2)
+    if op == Op.And:
+        if _is_bool(e1, True) or _is_bool(e2, False) or e1 is e2:
+            return e2
+        if _is_bool(e2, True) or _is_bool(e1, False):
+            return e1
+    elif op == Op.Or:
+        if _is_bool(e1, False) or _is_bool(e2, True) or e1 is e2:
+            return e2
+        if _is_bool(e2, False) or _is_bool(e1, True):
+            return e1
+    elif op == Op.Implies:
+        if _is_bool(e1, True):
+            return e2
+        if _is_bool(e1, False) or _is_bool(e2, True) or e1 is e2:
+            return _bool(True)
+        if _is_bool(e2, False):
+            return _simplify_unop(UnOpExpr(Op.Not, e1))
+    elif op == Op.Iff:
+        if _is_bool(e1, True):
+            return e2
+        if _is_bool(e2, True):
+            return e1
+        if e1 is e2:
+            return _bool(True)
+    elif op.value.isComp and op != Op.Adj:
+        if e1 is e2:
+            return _bool(op in (Op.Eq, Op.Le, Op.Ge))
+        if type(v1) is int and type(v2) is int:
+            return _bool(
+                {
+                    Op.Eq: v1 == v2,
+                    Op.NEq: v1 != v2,
+                    Op.Lt: v1 < v2,
+                    Op.Le: v1 <= v2,
+                    Op.Gt: v1 > v2,
+                    Op.Ge: v1 >= v2,
+                }[op]
+            )
+        if isinstance(v1, bool) and isinstance(v2, bool) and op in (Op.Eq, Op.NEq):
+            return _bool((v1 == v2) == (op == Op.Eq))
+    elif type(v1) is int and type(v2) is int:
+        if op == Op.Add:
+            return _int(v1 + v2)
+        elif op == Op.Minus:
+            return _int(v1 - v2)
+        elif op == Op.Mult:
+            return _int(v1 * v2)
+        # the integer division of SMT-LIB rounds towards the floor only for
+        # non-negative dividends, so other cases are left to the solver
+        elif op == Op.Div and v1 >= 0 and v2 > 0:
+            return _int(v1 // v2)
+        elif op == Op.Mod and v1 >= 0 and v2 > 0:
+            return _int(v1 % v2)
+    elif op == Op.Add:
+        if _is_int(e1, 0):
+            return e2
+        if _is_int(e2, 0):
+            return e1
+    elif op == Op.Minus:
+        if _is_int(e2, 0):
+            return e1
+    elif op == Op.Mult:
+        if _is_int(e1, 1):
+            return e2
+        if _is_int(e2, 1):
+            return e1
+        if _is_int(e1, 0) or _is_int(e2, 0):
+            return _int(0)
+    elif op == Op.Div:
+        if _is_int(e2, 1):
+            return e1
+    return e
+
+
+def _simplify_node(e: Expr):
+    if isinstance(e, UnOpExpr):
+        return _simplify_unop(e)
+    elif isinstance(e, BinOpExpr):
+        return _simplify_binop(e)
+    elif isinstance(e, QuantificationExpr) and isinstance(_literal(e.expr), bool):
+        return e.expr
+    return e
+
+
+def simplify(expr: Expr, memo=None):
+    """Simplify an expression by rewriting it bottom-up.
+
+    The rewriting covers boolean identities such as `True ==> X`, `X and True` and
+    `False ==> X`, folding of arithmetic and comparisons over integer literals, neutral
+    and absorbing elements such as `X + 0` and `X * 0`, and double negation. Since
+    expressions are hash-consed, identical operands are detected by identity, e.g.
+    `X and X` or `X == X`. Like `Expr.substitute`, the expression is walked with an
+    explicit stack, and shared nodes are simplified only once.
+
+    Args:
+        expr (Expr): The expression to simplify.
+        memo (dict, optional): Results of already simplified nodes, keyed by their id.
+
+    Returns:
+        Expr: An equivalent expression that is not larger than `expr`.
+    """
+    if memo is None:
+        memo = {}
+    stack = [expr]
+    while stack:
+        e = stack[-1]
+        if id(e) in memo:
+            stack.pop()
+            continue
+        operands = e._operands()
+        pending = [c for c in operands if id(c) not in memo]
+        if pending:
+            stack.extend(pending)
+            continue
+        stack.pop()
+        new_operands = [memo[id(c)] for c in operands]
+        if all(n is o for n, o in zip(new_operands, operands)):
+            memo[id(e)] = _simplify_node(e)
+        else:
+            memo[id(e)] = _simplify_node(e._rebuild(new_operands))
+    return memo[id(expr)]
@@ -1,6 +1,6 @@
 from abc import ABCMeta, abstractmethod
 
-from .expr import Expr
+from .expr import Expr, VarExpr, _structural_eq, _structural_hash
 
 
 class Stmt(metaclass=ABCMeta):
@@ -8,8 +8,39 @@ class Stmt(metaclass=ABCMeta):
 
     This class provides the interface for all statements with a method for
     collecting variable names.
+
+    Like expressions, statements are compared and hashed structurally, ignoring their
+    line numbers, and the hash is cached on every node.
     """
 
+    _hash = None
+
+    def __hash__(self):
+        if self._hash is None:
+            return _structural_hash(self)
+        return self._hash
+
+    def __eq__(self, other):
+        if self is other:
+            return True
+        if not isinstance(other, Stmt):
+            return NotImplemented
+        return _structural_eq(self, other)
+
+    def children(self):
+        """Return the direct sub-statements and sub-expressions of the statement.
+
+        Returns:
+            tuple: The child statements and expressions.
+        """
+        return ()
+
+    def _fields(self):
+        return ()
+
+    def _hash_fields(self):
+        return self._fields()
+
     @abstractmethod
     def collect_assigned_varnames(self):
         """Collect the variable names in the statement.
@@ -29,18 +60,33 @@ class Stmt(metaclass=ABCMeta):
         pass
 
     @abstractmethod
-    def assign_variable(self, old_var, new_var):
+    def assign_variable(self, old_var, new_var, memo=None):
         """Assign a new variable in place of an old variable in the statament.
 
         Args:
             old_var (VarExpr): The variable to be replaced.
             new_var (VarExpr): The variable to replace with.
+            memo (dict, optional): Results of already visited expression nodes.
 
         Returns:
             Expr: The updated expression.
         """
         pass
 
+    @abstractmethod
+    def substitute(self, mapping, memo=None):
+        """Simultaneously replace variables according to a mapping in one traversal.
+
+        Args:
+            mapping (dict): A dictionary mapping the variables to be replaced (VarExpr)
+                to the expressions to replace them with.
+            memo (dict, optional): Results of already visited expression nodes.
+
+        Returns:
+            Stmt: The updated statement.
+        """
+        pass
+
     @abstractmethod
     def clone(self):
         pass
@@ -63,18 +109,22 @@ class SkipStmt(Stmt):
     def collect_havoced_varnames(self):
         return set()
 
-    def assign_variable(self, old_var, new_var):
+    def assign_variable(self, old_var, new_var, memo=None):
         """Assign a new variable in place of an old variable in the statament.
 
         Args:
             old_var (VarExpr): The variable to be replaced.
             new_var (VarExpr): The variable to replace with.
+            memo (dict, optional): Results of already visited expression nodes.
 
         Returns:
             Expr: The updated expression.
         """
         pass
 
+    def substitute(self, mapping, memo=None):
+        return self
+
     def clone(self):
         return SkipStmt()
 
@@ -94,6 +144,9 @@ class AssignStmt(Stmt):
     def __repr__(self):
         return f"(Assign {self.var} {self.expr})"
 
+    def children(self):
+        return (self.var, self.expr)
+
     def collect_assigned_varnames(self):
         """Collect variable names in the assignment statement.
 
@@ -105,19 +158,27 @@ class AssignStmt(Stmt):
     def collect_havoced_varnames(self):
         return set()
 
-    def assign_variable(self, old_var, new_var):
+    def assign_variable(self, old_var, new_var, memo=None):
         """Assign a new variable in place of an old variable in the statament.
 
         Args:
             old_var (VarExpr): The variable to be replaced.
             new_var (VarExpr): The variable to replace with.
+            memo (dict, optional): Results of already visited expression nodes.
 
         Returns:
             Expr: The updated expression.
         """
         return AssignStmt(
-            self.var.assign_variable(old_var, new_var),
-            self.expr.assign_variable(old_var, new_var),
+            self.var.assign_variable(old_var, new_var, memo),
+            self.expr.assign_variable(old_var, new_var, memo),
+        )
+
+    def substitute(self, mapping, memo=None):
+        if memo is None:
+            memo = {}
+        return type(self)(
+            self.var.substitute(mapping, memo), self.expr.substitute(mapping, memo)
         )
 
     def clone(self):
@@ -135,16 +196,23 @@ class IfElseStmt(Stmt):
         cond_expr (Expr): The condition expression.
         then_stmt (Stmt): The statement to execute if the condition is true.
         else_stmt (Stmt): The statement to execute if the condition is false.
+        lineno (int, optional): The line number of the if statement in the source code.
     """
 
-    def __init__(self, cond_expr: Expr, then_stmt: Stmt, else_stmt: Stmt):
+    def __init__(
+        self, cond_expr: Expr, then_stmt: Stmt, else_stmt: Stmt, lineno: int = None
+    ):
         self.cond = cond_expr
         self.then_branch = then_stmt if then_stmt is not None else SkipStmt()
         self.else_branch = else_stmt if else_stmt is not None else SkipStmt()
+        self.lineno = lineno
 
     def __repr__(self):
         return f"(If {self.cond} {self.then_branch} {self.else_branch})"
 
+    def children(self):
+        return (self.cond, self.then_branch, self.else_branch)
+
     def collect_assigned_varnames(self):
         """Collect variable names in the if statement.
 
@@ -159,25 +227,42 @@ class IfElseStmt(Stmt):
     def collect_havoced_varnames(self):
         return set()
 
-    def assign_variable(self, old_var, new_var):
+    def assign_variable(self, old_var, new_var, memo=None):
         """Assign a new variable in place of an old variable in the statament.
 
         Args:
             old_var (VarExpr): The variable to be replaced.
             new_var (VarExpr): The variable to replace with.
+            memo (dict, optional): Results of already visited expression nodes.
 
         Returns:
             Expr: The updated expression.
         """
+        if memo is None:
+            memo = {}
         return IfElseStmt(
-            self.cond.assign_variable(old_var, new_var),
-            self.then_branch.assign_variable(old_var, new_var),
-            self.else_branch.assign_variable(old_var, new_var),
+            self.cond.assign_variable(old_var, new_var, memo),
+            self.then_branch.assign_variable(old_var, new_var, memo),
+            self.else_branch.assign_variable(old_var, new_var, memo),
+            self.lineno,
+        )
+
+    def substitute(self, mapping, memo=None):
+        if memo is None:
+            memo = {}
+        return IfElseStmt(
+            self.cond.substitute(mapping, memo),
+            self.then_branch.substitute(mapping, memo),
+            self.else_branch.substitute(mapping, memo),
+            self.lineno,
         )
 
     def clone(self):
         return IfElseStmt(
-            self.cond.clone(), self.then_branch.clone(), self.else_branch.clone()
+            self.cond.clone(),
+            self.then_branch.clone(),
+            self.else_branch.clone(),
+            self.lineno,
         )
 
 
@@ -193,8 +278,21 @@ class CompoundStmt(Stmt):
         self.s1 = s1 if s1 is not None else SkipStmt()
         self.s2 = s2 if s2 is not None else SkipStmt()
 
+    def children(self):
+        return (self.s1, self.s2)
+
     def __repr__(self):
-        return f"(Seq {self.s1} {self.s2})"
+        # (Seq s1 s2) without recursing down long chains of statements
+        pieces = []
+        stack = [self]
+        while stack:
+            s = stack.pop()
+            if isinstance(s, CompoundStmt):
+                stack += [")", s.s2, " ", s.s1]
+                pieces.append("(Seq ")
+            else:
+                pieces.append(s if isinstance(s, str) else repr(s))
+        return "".join(pieces)
 
     def collect_assigned_varnames(self):
         """Collect variable names in the sequence of statements.
@@ -203,33 +301,40 @@ class CompoundStmt(Stmt):
             set: A set of variable names in the sequence of statements.
         """
         return {
-            *self.s1.collect_assigned_varnames(),
-            *self.s2.collect_assigned_varnames(),
+            varname
+            for s in flatten_seq(self)
+            for varname in s.collect_assigned_varnames()
         }
 
     def collect_havoced_varnames(self):
         return {
-            *self.s1.collect_havoced_varnames(),
-            *self.s2.collect_havoced_varnames(),
+            varname
+            for s in flatten_seq(self)
+            for varname in s.collect_havoced_varnames()
         }
 
-    def assign_variable(self, old_var, new_var):
+    def assign_variable(self, old_var, new_var, memo=None):
         """Assign a new variable in place of an old variable in the statament.
 
         Args:
             old_var (VarExpr): The variable to be replaced.
             new_var (VarExpr): The variable to replace with.
+            memo (dict, optional): Results of already visited expression nodes.
 
         Returns:
             Expr: The updated expression.
         """
-        return CompoundStmt(
-            self.s1.assign_variable(old_var, new_var),
-            self.s2.assign_variable(old_var, new_var),
-        )
+        if memo is None:
+            memo = {}
+        return map_seq(self, lambda s: s.assign_variable(old_var, new_var, memo))
+
+    def substitute(self, mapping, memo=None):
+        if memo is None:
+            memo = {}
+        return map_seq(self, lambda s: s.substitute(mapping, memo))
 
     def clone(self):
-        return CompoundStmt(self.s1.clone(), self.s2.clone())
+        return map_seq(self, lambda s: s.clone())
 
 
 class AssumeStmt(Stmt):
@@ -245,6 +350,9 @@ class AssumeStmt(Stmt):
     def __repr__(self):
         return f"(Assume {self.e})"
 
+    def children(self):
+        return (self.e,)
+
     def collect_assigned_varnames(self):
         """Collect variable names in the assume statement.
 
@@ -256,17 +364,21 @@ class AssumeStmt(Stmt):
     def collect_havoced_varnames(self):
         return set()
 
-    def assign_variable(self, old_var, new_var):
+    def assign_variable(self, old_var, new_var, memo=None):
         """Assign a new variable in place of an old variable in the statament.
 
         Args:
             old_var (VarExpr): The variable to be replaced.
             new_var (VarExpr): The variable to replace with.
+            memo (dict, optional): Results of already visited expression nodes.
 
         Returns:
             Expr: The updated expression.
         """
-        return AssumeStmt(self.e.assign_variable(old_var, new_var))
+        return AssumeStmt(self.e.assign_variable(old_var, new_var, memo))
+
+    def substitute(self, mapping, memo=None):
+        return AssumeStmt(self.e.substitute(mapping, memo))
 
     def clone(self):
         return AssumeStmt(self.e.clone())
@@ -285,6 +397,9 @@ class AssertStmt(Stmt):
     def __repr__(self):
         return f"(Assert {self.e})"
 
+    def children(self):
+        return (self.e,)
+
     def collect_assigned_varnames(self):
         """Collect variable names in the assert statement.
 
@@ -296,17 +411,21 @@ class AssertStmt(Stmt):
     def collect_havoced_varnames(self):
         return set()
 
-    def assign_variable(self, old_var, new_var):
+    def assign_variable(self, old_var, new_var, memo=None):
         """Assign a new variable in place of an old variable in the statament.
 
         Args:
             old_var (VarExpr): The variable to be replaced.
             new_var (VarExpr): The variable to replace with.
+            memo (dict, optional): Results of already visited expression nodes.
 
         Returns:
             Expr: The updated expression.
         """
-        return AssertStmt(self.e.assign_variable(old_var, new_var))
+        return AssertStmt(self.e.assign_variable(old_var, new_var, memo))
+
+    def substitute(self, mapping, memo=None):
+        return AssertStmt(self.e.substitute(mapping, memo))
 
     def clone(self):
         return AssertStmt(self.e.clone())
@@ -319,16 +438,21 @@ class WhileStmt(Stmt):
         invariant (Expr): The invariant expression.
         cond (Expr): The condition expression.
         body (Stmt): The body statement to execute while the condition is true.
+        lineno (int, optional): The line number of the loop in the source code.
     """
 
-    def __init__(self, invariant: Expr, cond: Expr, body: Stmt):
+    def __init__(self, invariant: Expr, cond: Expr, body: Stmt, lineno: int = None):
         self.invariant = invariant
         self.cond = cond
         self.body = body if body is not None else SkipStmt()
+        self.lineno = lineno
 
     def __repr__(self):
         return f"(While {self.cond} {self.body})"
 
+    def children(self):
+        return (self.invariant, self.cond, self.body)
+
     def collect_assigned_varnames(self):
         """Collect variable names in the while statement.
 
@@ -340,24 +464,40 @@ class WhileStmt(Stmt):
     def collect_havoced_varnames(self):
         return set()
 
-    def assign_variable(self, old_var, new_var):
+    def assign_variable(self, old_var, new_var, memo=None):
         """Assign a new variable in place of an old variable in the statament.
 
         Args:
             old_var (VarExpr): The variable to be replaced.
             new_var (VarExpr): The variable to replace with.
+            memo (dict, optional): Results of already visited expression nodes.
 
         Returns:
             Expr: The updated expression.
         """
+        if memo is None:
+            memo = {}
+        return WhileStmt(
+            self.invariant.assign_variable(old_var, new_var, memo),
+            self.cond.assign_variable(old_var, new_var, memo),
+            self.body.assign_variable(old_var, new_var, memo),
+            self.lineno,
+        )
+
+    def substitute(self, mapping, memo=None):
+        if memo is None:
+            memo = {}
         return WhileStmt(
-            self.invariant.assign_variable(old_var, new_var),
-            self.cond.assign_variable(old_var, new_var),
-            self.body.assign_variable(old_var, new_var),
+            self.invariant.substitute(mapping, memo),
+            self.cond.substitute(mapping, memo),
+            self.body.substitute(mapping, memo),
+            self.lineno,
         )
 
     def clone(self):
-        return WhileStmt(self.invariant.clone(), self.cond.clone(), self.body.clone())
+        return WhileStmt(
+            self.invariant.clone(), self.cond.clone(), self.body.clone(), self.lineno
+        )
 
 
 class HavocStmt(Stmt):
@@ -375,6 +515,9 @@ class HavocStmt(Stmt):
     def __repr__(self):
         return f"(Havoc {self.var_name})"
 
+    def _fields(self):
+        return (self.var_name, self.num_havoced)
+
     def collect_assigned_varnames(self):
         """Collect variable names in the havoc statement.
 
@@ -386,13 +529,71 @@ class HavocStmt(Stmt):
     def collect_havoced_varnames(self):
         return {self.var_name}
 
-    def assign_variable(self, old_var, new_var):
+    def assign_variable(self, old_var, new_var, memo=None):
         pass
 
+    def substitute(self, mapping, memo=None):
+        new_var = mapping.get(VarExpr(self.var_name))
+        if isinstance(new_var, VarExpr):
+            return HavocStmt(new_var.name, self.num_havoced)
+        return self
+
     def clone(self):
         return HavocStmt(self.var_name)
 
 
+def flatten_seq(stmt: Stmt):
+    """Flatten nested sequences into the list of statements in execution order.
+
+    The chains of `CompoundStmt` built by `PyToClaim.walk_seq` are as long as the
+    function, so they are walked with an explicit stack instead of recursion.
+
+    Args:
+        stmt (Stmt): The statement to flatten.
+
+    Returns:
+        list: The statements that are not `CompoundStmt`, in execution order.
+    """
+    stmts = []
+    stack = [stmt]
+    while stack:
+        s = stack.pop()
+        if isinstance(s, CompoundStmt):
+            stack.append(s.s2)
+            stack.append(s.s1)
+        else:
+            stmts.append(s)
+    return stmts
+
+
+def map_seq(stmt: Stmt, fn):
+    """Rebuild nested sequences with `fn` applied to every other statement.
+
+    The shape of the `CompoundStmt` tree is kept, and `fn` is applied in execution
+    order, so it may carry state from one statement to the next.
+
+    Args:
+        stmt (Stmt): The statement to rebuild.
+        fn (callable): The function applied to every statement that is not a `CompoundStmt`.
+
+    Returns:
+        Stmt: The rebuilt statement.
+    """
+    results = []
+    stack = [(stmt, False)]
+    while stack:
+        s, expanded = stack.pop()
+        if not isinstance(s, CompoundStmt):
+            results.append(fn(s))
+        elif expanded:
+            s2 = results.pop()
+            s1 = results.pop()
+            results.append(CompoundStmt(s1, s2))
+        else:
+            stack += [(s, True), (s.s2, False), (s.s1, False)]
+    return results.pop()
+
+
 def pretty_repr(stmt, level=0):
     if isinstance(stmt, IfElseStmt):
         return (
@@ -416,6 +617,6 @@ def pretty_repr(stmt, level=0):
             + pretty_repr(stmt.body, level + 1)
         )
     elif isinstance(stmt, CompoundStmt):
-        return pretty_repr(stmt.s1, level) + ";\n" + pretty_repr(stmt.s2, level)
+        return ";\n".join(pretty_repr(s, level) for s in flatten_seq(stmt))
     else:
         return "\t" * level + str(stmt)
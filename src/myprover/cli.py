@@ -0,0 +1,231 @@
+import argparse
+import json
+import sys
+
+from .batch import collect_files, collect_functions, parse_types, verify_targets
+from .cache import ProofCache
+from .server import VerificationClient, default_socket_path, serve
+
+
+def load_types(path: str):
+    """Reads a sidecar JSON file of types (see `parse_types`), or none if path is None."""
+    if path is None:
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def print_report(report, file=None):
+    """Prints a line for each function that failed and a summary line."""
+    file = file if file is not None else sys.stdout
+    for result in report.failures:
+        message = (result.message or "").splitlines()
+        detail = f": {message[0]}" if message else ""
+        print(
+            f"{result.filename}:{result.lineno}: {result.name}: {result.status}{detail}",
+            file=file,
+        )
+    print(
+        f"{len(report) - len(report.failures)} verified, {len(report.failures)} failed"
+        f" in {report.time:.2f}s",
+        file=file,
+    )
+
+
+def write_report(report, path: str):
+    if path is None:
+        return
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report.to_dict(), f, indent=2)
+
+
+def add_socket_argument(parser):
+    parser.add_argument(
+        "--socket",
+        default=None,
+        help=f"the path of the socket of the daemon (default: {default_socket_path()})",
+    )
+
+
+def add_verification_arguments(parser):
+    parser.add_argument("paths", nargs="+", help="Python files or directories")
+    parser.add_argument(
+        "--types",
+        default=None,
+        help="a JSON file mapping the qualified names of the functions to the types "
+        'of their variables, such as {"f": {"x": "int"}}, which override the '
+        "annotations",
+    )
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        default=None,
+        help="the time limit of the solver checks of each function in seconds; the "
+        "generation of the conditions is not interrupted",
+    )
+    parser.add_argument(
+        "--report", default=None, help="the path of the JSON report to write"
+    )
+
+
+def verification_options(args):
+    options = {}
+    if args.timeout is not None:
+        options["function_timeout"] = args.timeout
+    if args.engine is not None:
+        options["engine"] = args.engine
+    return options
+
+
+def read_types(path: str):
+    """Reads and checks a sidecar file of types, printing the error if it is invalid.
+
+    Returns:
+        dict: The side table with type names, or None if the file is invalid.
+    """
+    try:
+        table = load_types(path)
+        parse_types(table)
+    except (OSError, ValueError) as e:
+        print(f"myprover: {path}: {e}", file=sys.stderr)
+        return None
+    return table
+
+
+def read_targets(paths: list, types: dict):
+    """Collects the functions of files and directories, printing the files that are invalid.
+
+    Returns:
+        list: The `FunctionTarget` of each function, or None if a file cannot be read or
+            parsed.
+    """
+    targets = []
+    valid = True
+    for filename in collect_files(paths):
+        try:
+            with open(filename, encoding="utf-8") as f:
+                targets.extend(collect_functions(f.read(), filename, types))
+        except (OSError, SyntaxError, UnicodeDecodeError) as e:
+            print(f"myprover: {filename}: {e}", file=sys.stderr)
+            valid = False
+    return targets if valid else None
+
+
+def main_verify(args):
+    table = read_types(args.types)
+    if table is None:
+        return 2
+    targets = read_targets(args.paths, parse_types(table))
+    if targets is None:
+        return 2
+    proof_cache = None
+    if args.cache_dir is not None:
+        proof_cache = ProofCache(directory=args.cache_dir)
+    report = verify_targets(
+        targets,
+        workers=args.jobs,
+        proof_cache=proof_cache,
+        **verification_options(args),
+    )
+    print_report(report)
+    write_report(report, args.report)
+    return 0 if report.verified else 1
+
+
+def main_serve(args):
+    serve(args.socket, args.jobs, args.cache_dir)
+    return 0
+
+
+def main_submit(args):
+    # the types are sent as names
+    types = read_types(args.types)
+    if types is None:
+        return 2
+    with VerificationClient(args.socket) as client:
+        report = client.verify_files(args.paths, types, **verification_options(args))
+    print_report(report)
+    write_report(report, args.report)
+    return 0 if report.verified else 1
+
+
+def main_stop(args):
+    with VerificationClient(args.socket) as client:
+        client.shutdown()
+    return 0
+
+
+def make_parser():
+    parser = argparse.ArgumentParser(
+        prog="myprover", description="Verifies Python functions against their contracts."
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    verify_parser = commands.add_parser(
+        "verify",
+        help="verify the decorated functions of files and directories (the default)",
+    )
+    add_verification_arguments(verify_parser)
+    verify_parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=None,
+        help="the number of processes that verify the functions in parallel",
+    )
+    verify_parser.add_argument(
+        "--engine", choices=("wp", "passive"), default=None, help="the VC generator"
+    )
+    verify_parser.add_argument(
+        "--cache-dir", default=None, help="the directory of a persistent proof cache"
+    )
+    verify_parser.set_defaults(main=main_verify)
+
+    serve_parser = commands.add_parser(
+        "serve", help="run a daemon that verifies the jobs sent to a Unix socket"
+    )
+    add_socket_argument(serve_parser)
+    serve_parser.add_argument(
+        "-j", "--jobs", type=int, default=None, help="the number of worker processes"
+    )
+    serve_parser.add_argument(
+        "--cache-dir", default=None, help="the directory of a persistent proof cache"
+    )
+    serve_parser.set_defaults(main=main_serve)
+
+    submit_parser = commands.add_parser(
+        "submit", help="send files and directories to a running daemon"
+    )
+    add_socket_argument(submit_parser)
+    add_verification_arguments(submit_parser)
+    submit_parser.add_argument(
+        "--engine", choices=("wp", "passive"), default=None, help="the VC generator"
+    )
+    submit_parser.set_defaults(main=main_submit)
+
+    stop_parser = commands.add_parser("stop", help="shut a running daemon down")
+    add_socket_argument(stop_parser)
+    stop_parser.set_defaults(main=main_stop)
+    return parser
+
+
+COMMANDS = ("verify", "serve", "submit", "stop")
+
+
+def main(argv=None):
+    """Runs the `myprover` command.
+
+    `myprover PATH ...` is short for `myprover verify PATH ...`.
+
+    Args:
+        argv (list, optional): The arguments. Defaults to `sys.argv[1:]`.
+
+    Returns:
+        int: The exit status, which is 1 if a function failed, and 2 if the arguments
+            are invalid, or a file cannot be read or parsed.
+    """
+    argv = list(sys.argv[1:] if argv is None else argv)
+    if argv and argv[0] not in COMMANDS and argv[0] not in ("-h", "--help"):
+        argv.insert(0, "verify")
+    args = make_parser().parse_args(argv)
+    return args.main(args)
@@ -1,3 +1,14 @@
+"""The contracts and the markers that verified code uses at run time.
+
+This module imports nothing, so that `import myprover` in production code, which only
+applies the decorators and calls the markers, does not load Z3 or the prover.
+"""
+
+# the function that checks the invariants at run time, installed by `myprover.runtime`
+# once a function is decorated with `checked`
+_invariant_hook = None
+
+
 def precondition(precond):
     def decorator(func):
         func._precondition = precond
@@ -12,3 +23,16 @@ def postcondition(postcond):
         return func
 
     return decorator
+
+
+def assume(cond):
+    pass
+
+
+def invariant(cond):
+    if _invariant_hook is not None:
+        _invariant_hook(cond)
+
+
+def laplace(mu):
+    pass
@@ -6,3 +6,13 @@ class InvalidInvariantError(RuntimeError):
 class VerificationFailureError(RuntimeError):
     def __init__(self, message):
         super().__init__(message)
+
+
+class VerificationUnknownError(RuntimeError):
+    def __init__(self, message):
+        super().__init__(message)
+
+
+class ContractViolationError(RuntimeError):
+    def __init__(self, message):
+        super().__init__(message)
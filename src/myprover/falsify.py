@@ -0,0 +1,209 @@
+import itertools
+
+import numpy as np
+
+from .claim import BinOpExpr, LiteralExpr, Op, UnOpExpr, VarExpr
+
+# the values tried first for every integer variable
+BOUNDARY_VALUES = (0, 1, -1, 2, -2, 3, -3, 10, -10, 100, -100)
+
+# the magnitudes of the random integers
+RANDOM_SCALES = (10, 1000, 10**6)
+
+NUMPY_OPS = {
+    Op.Add: "({} + {})",
+    Op.Minus: "({} - {})",
+    Op.Mult: "({} * {})",
+    Op.Div: "_div({}, {})",
+    Op.Mod: "_mod({}, {})",
+    Op.Eq: "np.equal({}, {})",
+    Op.NEq: "np.not_equal({}, {})",
+    Op.Lt: "np.less({}, {})",
+    Op.Le: "np.less_equal({}, {})",
+    Op.Gt: "np.greater({}, {})",
+    Op.Ge: "np.greater_equal({}, {})",
+    Op.And: "np.logical_and({}, {})",
+    Op.Or: "np.logical_or({}, {})",
+    Op.Implies: "np.logical_or(np.logical_not({}), {})",
+    Op.Iff: "np.equal(np.asarray({}, dtype=bool), np.asarray({}, dtype=bool))",
+}
+
+NUMPY_UNARY_OPS = {
+    Op.Minus: "np.negative({})",
+    Op.Not: "np.logical_not({})",
+    Op.Abs: "np.abs({})",
+}
+
+
+def _divisor(b, zero):
+    # a zero divisor makes the value of Z3 unknown, so the row cannot be a counterexample
+    zero.append(np.equal(b, 0))
+    return np.where(np.equal(b, 0), 1, b)
+
+
+def _div(a, b, zero):
+    # the integer division of SMT-LIB, whose remainder is never negative
+    b = _divisor(b, zero)
+    return np.where(np.greater(b, 0), a // b, np.negative(a // np.negative(b)))
+
+
+def _mod(a, b, zero):
+    return a - _divisor(b, []) * _div(a, b, zero)
+
+
+def compile_numpy(expr, resolve):
+    """Generates the code that evaluates a Claim expression over columns of values.
+
+    The nodes of the expression are assigned to temporaries in the order of a post-order
+    walk, so the code is as large as the DAG of the expression.
+
+    Args:
+        expr (Expr): The expression.
+        resolve (callable): A function mapping a variable name to the name and the type
+            of the constant it denotes, or None (see `resolve_variable`).
+
+    Returns:
+        tuple: The code object, which leaves the result in `_result`, and a dictionary
+            mapping the names of the constants to their identifiers in the code and
+            their types, or None if the expression has a quantifier, an array, or a
+            variable whose type is unknown.
+    """
+    names = {}
+    idents = {}
+    lines = []
+    stack = [expr]
+    while stack:
+        e = stack[-1]
+        if id(e) in idents:
+            stack.pop()
+            continue
+        if isinstance(e, VarExpr):
+            found = resolve(e.name)
+            if found is None or found[1] not in (int, bool):
+                return None
+            name, t = found
+            if name not in names:
+                names[name] = (f"_v{len(names)}", t)
+            idents[id(e)] = names[name][0]
+            stack.pop()
+            continue
+        elif isinstance(e, LiteralExpr):
+            idents[id(e)] = repr(e.value.v)
+            stack.pop()
+            continue
+        elif isinstance(e, BinOpExpr) and e.op in NUMPY_OPS:
+            operands = (e.e1, e.e2)
+            template = NUMPY_OPS[e.op]
+        elif isinstance(e, UnOpExpr) and e.op in NUMPY_UNARY_OPS:
+            operands = (e.e,)
+            template = NUMPY_UNARY_OPS[e.op]
+        else:
+            return None
+        pending = [c for c in operands if id(c) not in idents]
+        if pending:
+            stack.extend(pending)
+            continue
+        stack.pop()
+        ident = f"_t{len(lines)}"
+        term = template.format(*(idents[id(c)] for c in operands))
+        if e.op in (Op.Div, Op.Mod):
+            term = term[:-1] + ", _zero)"
+        lines.append(f"{ident} = {term}")
+        idents[id(e)] = ident
+    lines.append(f"_result = {idents[id(expr)]}")
+    return compile("\n".join(lines), "<falsifier>", "exec"), names
+
+
+def evaluate(code, columns: dict, size: int):
+    """Runs the code of `compile_numpy` over columns of values.
+
+    Returns:
+        numpy.ndarray: The boolean mask of the rows where the expression holds and no
+            divisor is zero.
+    """
+    namespace = {"np": np, "_div": _div, "_mod": _mod, "_zero": [], **columns}
+    exec(code, namespace)
+    holds = np.broadcast_to(np.asarray(namespace["_result"], dtype=bool), (size,))
+    for zero in namespace["_zero"]:
+        holds = holds & ~np.broadcast_to(np.asarray(zero, dtype=bool), (size,))
+    return holds
+
+
+class Falsifier:
+    """Looks for counterexamples of conditions by evaluating them over many assignments.
+
+    The satisfiability problem of a condition is compiled into NumPy code (see
+    `compile_numpy`) and evaluated over a batch of assignments to its free variables:
+    combinations of `BOUNDARY_VALUES` and random integers of the `RANDOM_SCALES`. A row
+    that satisfies the problem is evaluated again with the exact integers of Python,
+    since the batch is computed in 64 bits, before it is returned as a model. A
+    problem without such a row is left to the solver.
+
+    Args:
+        resolve (callable): A function mapping a variable name to the name and the type
+            of the constant it denotes, or None (see `resolve_variable`).
+        samples (int): The number of assignments in a batch.
+        seed (int): The seed of the random assignments.
+    """
+
+    def __init__(self, resolve, samples: int = 4096, seed: int = 0):
+        self.resolve = resolve
+        self.samples = samples
+        self.rng = np.random.default_rng(seed)
+        self.num_searches = 0
+        self.num_found = 0
+
+    def assignments(self, types: list):
+        """Returns a batch of assignments as one column per variable."""
+        k = len(types)
+        boundary = np.array(BOUNDARY_VALUES, dtype=np.int64)
+        rows = []
+        if len(BOUNDARY_VALUES) ** k <= self.samples // 2:
+            rows.append(np.array(list(itertools.product(boundary, repeat=k))).reshape(-1, k))
+        else:
+            rows.append(self.rng.choice(boundary, size=(self.samples // 2, k)))
+        size = self.samples - len(rows[0])
+        scales = self.rng.choice(np.array(RANDOM_SCALES), size=(size, 1))
+        rows.append(self.rng.integers(-scales, scales + 1, size=(size, k)))
+        values = np.concatenate(rows)
+        return [
+            values[:, i] % 2 == 0 if t == bool else values[:, i]
+            for i, t in enumerate(types)
+        ]
+
+    def search(self, background, cond):
+        """Looks for an assignment that satisfies a condition and the background.
+
+        Args:
+            background (Expr): The facts that hold for every condition.
+            cond (Expr): The condition, such as the negation of one to be proved.
+
+        Returns:
+            list: The model as (name, value) pairs like `model_items`, or None if no
+                assignment is found or the condition cannot be evaluated.
+        """
+        self.num_searches += 1
+        compiled = compile_numpy(BinOpExpr(background, Op.And, cond), self.resolve)
+        if compiled is None:
+            return None
+        code, names = compiled
+        entries = sorted(names.items())
+        columns = self.assignments([t for _, (_, t) in entries])
+        with np.errstate(over="ignore"):
+            holds = evaluate(
+                code,
+                {ident: column for (_, (ident, _)), column in zip(entries, columns)},
+                len(columns[0]) if columns else 1,
+            )
+        for row in np.flatnonzero(holds)[:8]:
+            exact = {
+                ident: np.array([column[row].item()], dtype=object)
+                for (_, (ident, _)), column in zip(entries, columns)
+            }
+            if evaluate(code, exact, 1)[0]:
+                self.num_found += 1
+                return [
+                    (name, str(exact[ident][0]))
+                    for name, (ident, _) in entries
+                ]
+        return None
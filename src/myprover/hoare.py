@@ -12,23 +12,19 @@ from .claim import (
     Op,
     QuantificationExpr,
     SkipStmt,
+    SliceExpr,
     Stmt,
+    StoreExpr,
+    SubscriptExpr,
     UnOpExpr,
     VarExpr,
     WhileStmt,
+    collect_all_varnames,
+    flatten_seq,
+    map_seq,
+    pretty_expr,
 )
-
-
-def assume(cond):
-    pass
-
-
-def invariant(cond):
-    pass
-
-
-def laplace(mu):
-    pass
+from .decorator import assume, invariant, laplace  # noqa: F401
 
 
 def derive_weakest_precondition(
@@ -57,18 +53,22 @@ def derive_weakest_precondition(
         # wp(skip, Q <=> Q
         return post_condition, set()
     elif isinstance(command_stmt, AssignStmt):
-        # wp(x:=t, Q) = Q[t/x]
-        return (
-            post_condition.assign_variable(command_stmt.var, command_stmt.expr),
-            set(),
-        )
+        # wp(x:=t, Q) = Q[t/x], and wp(A[i]:=t, Q) = Q[Store(A, i, t)/A]
+        if isinstance(command_stmt.var, VarExpr):
+            mapping = {command_stmt.var: command_stmt.expr}
+        else:
+            array = command_stmt.var.var
+            mapping = {
+                array: StoreExpr(array, command_stmt.var.subscript, command_stmt.expr)
+            }
+        return post_condition.substitute(mapping), set()
     elif isinstance(command_stmt, CompoundStmt):
-        # wp(C1;C2, Q) <=> wp(C1, wp(C2, Q))
-        wp2, ac2 = derive_weakest_precondition(
-            command_stmt.s2, post_condition, var2type
-        )
-        wp1, ac1 = derive_weakest_precondition(command_stmt.s1, wp2, var2type)
-        return wp1, ac1.union(ac2)
+        # wp(C1;C2, Q) <=> wp(C1, wp(C2, Q)), folded over the flattened sequence
+        wp, ac = post_condition, set()
+        for stmt in reversed(flatten_seq(command_stmt)):
+            wp, ac_stmt = derive_weakest_precondition(stmt, wp, var2type)
+            ac |= ac_stmt
+        return wp, ac
     elif isinstance(command_stmt, IfElseStmt):
         # wp(if A then B else C, Q) <=> (A => wp(B, Q)) ^ (!A => wp(C, Q))
         wp1, ac1 = derive_weakest_precondition(
@@ -108,9 +108,12 @@ def derive_weakest_precondition(
             QuantificationExpr(
                 "FORALL",
                 VarExpr(command_stmt.var_name + f"@{command_stmt.num_havoced}"),
-                post_condition.assign_variable(
-                    VarExpr(command_stmt.var_name),
-                    VarExpr(command_stmt.var_name + f"@{command_stmt.num_havoced}"),
+                post_condition.substitute(
+                    {
+                        VarExpr(command_stmt.var_name): VarExpr(
+                            command_stmt.var_name + f"@{command_stmt.num_havoced}"
+                        )
+                    }
                 ),
                 var2type[command_stmt.var_name],
             ),
@@ -119,7 +122,239 @@ def derive_weakest_precondition(
     elif isinstance(command_stmt, AssumeStmt):
         return BinOpExpr(command_stmt.e, Op.Implies, post_condition), set()
     elif isinstance(command_stmt, AssertStmt):
-        return BinOpExpr(post_condition, Op.Implies, command_stmt.e), set()
+        # wp(assert e, Q) <=> e ^ Q
+        return _conj(command_stmt.e, post_condition), set()
+
+
+def _version_mapping(versions: dict[str, str], *exprs: Expr):
+    """Map the variables of the expressions to their current versions for `Expr.substitute`."""
+    return {
+        VarExpr(name): VarExpr(versions[name])
+        for name in collect_all_varnames(exprs)
+        if name in versions
+    }
+
+
+def _new_version(varname: str, versions: dict[str, str], counter: dict[str, int]):
+    counter[varname] = counter.get(varname, 0) + 1
+    versions[varname] = varname + f"!{counter[varname]}"
+    return versions[varname]
+
+
+def to_passive_form(
+    stmt: Stmt, versions: dict[str, str] = None, counter: dict[str, int] = None
+):
+    """Converts a statement into passive, dynamic single assignment form.
+
+    Every assignment `x := e` becomes `assume x!n == e` with a fresh version `x!n`, havoc
+    only introduces a fresh version, and both branches of an if-statement are joined by
+    assuming the equality of the versions they end with. Loops are cut with their
+    invariants in the same way as `encode_while_loop`. The resulting statement only
+    consists of assume, assert, skip, sequence and if-statements.
+
+    Args:
+        stmt (Stmt): The statement to convert.
+        versions (dict): Maps a variable name to the name of its current version.
+        counter (dict): Maps a variable name to the number of versions created so far.
+
+    Returns:
+        tuple: A tuple containing the passive statement and the versions after it.
+
+    Raises:
+        NotImplementedError: If the type of stmt is not supported.
+    """
+    versions = {} if versions is None else versions
+    counter = {} if counter is None else counter
+    if isinstance(stmt, SkipStmt):
+        return SkipStmt(), versions
+    elif isinstance(stmt, AssignStmt):
+        mapping = _version_mapping(versions, stmt.expr, stmt.var)
+        expr = stmt.expr.substitute(mapping)
+        if isinstance(stmt.var, VarExpr):
+            var = VarExpr(_new_version(stmt.var.name, versions, counter))
+            return AssumeStmt(BinOpExpr(var, Op.Eq, expr)), versions
+        elif isinstance(stmt.var, SubscriptExpr) and not isinstance(
+            stmt.var.subscript, SliceExpr
+        ):
+            # a[i] := e  ~>  assume a!n == store(a, i, e)
+            old_array = stmt.var.var.substitute(mapping)
+            index = stmt.var.subscript.substitute(mapping)
+            new_array = VarExpr(_new_version(stmt.var.var.name, versions, counter))
+            return (
+                AssumeStmt(
+                    BinOpExpr(new_array, Op.Eq, StoreExpr(old_array, index, expr))
+                ),
+                versions,
+            )
+        else:
+            raise NotImplementedError(f"Assignment to {stmt.var} is not supported")
+    elif isinstance(stmt, HavocStmt):
+        _new_version(stmt.var_name, versions, counter)
+        return SkipStmt(), versions
+    elif isinstance(stmt, AssumeStmt):
+        return AssumeStmt(stmt.e.substitute(_version_mapping(versions, stmt.e))), versions
+    elif isinstance(stmt, AssertStmt):
+        return AssertStmt(stmt.e.substitute(_version_mapping(versions, stmt.e))), versions
+    elif isinstance(stmt, CompoundStmt):
+
+        def convert(s):
+            nonlocal versions
+            passive_stmt, versions = to_passive_form(s, versions, counter)
+            return passive_stmt
+
+        return map_seq(stmt, convert), versions
+    elif isinstance(stmt, IfElseStmt):
+        cond = stmt.cond.substitute(_version_mapping(versions, stmt.cond))
+        st, vt = to_passive_form(stmt.then_branch, dict(versions), counter)
+        se, ve = to_passive_form(stmt.else_branch, dict(versions), counter)
+        merged = dict(vt)
+        for varname in {*vt, *ve}:
+            vt_name, ve_name = vt.get(varname, varname), ve.get(varname, varname)
+            if vt_name == ve_name:
+                continue
+            # reuse the version of the branch that changed the variable
+            if vt_name != versions.get(varname, varname):
+                merged[varname] = vt_name
+                se = CompoundStmt(
+                    se, AssumeStmt(BinOpExpr(VarExpr(vt_name), Op.Eq, VarExpr(ve_name)))
+                )
+            else:
+                merged[varname] = ve_name
+                st = CompoundStmt(
+                    st, AssumeStmt(BinOpExpr(VarExpr(ve_name), Op.Eq, VarExpr(vt_name)))
+                )
+        return IfElseStmt(cond, st, se, stmt.lineno), merged
+    elif isinstance(stmt, WhileStmt):
+        invariant = (
+            LiteralExpr(BoolValue(True)) if stmt.invariant is None else stmt.invariant
+        )
+        entry = AssertStmt(invariant.substitute(_version_mapping(versions, invariant)))
+        for varname in stmt.body.collect_assigned_varnames():
+            _new_version(varname, versions, counter)
+        body, vb = to_passive_form(stmt.body, dict(versions), counter)
+        # the versions after the havoc of the assigned variables
+        mapping = _version_mapping(versions, invariant, stmt.cond)
+        loop = IfElseStmt(
+            stmt.cond.substitute(mapping),
+            CompoundStmt(
+                CompoundStmt(
+                    body, AssertStmt(invariant.substitute(_version_mapping(vb, invariant)))
+                ),
+                AssumeStmt(LiteralExpr(BoolValue(False))),
+            ),
+            SkipStmt(),
+        )
+        return (
+            CompoundStmt(
+                CompoundStmt(entry, AssumeStmt(invariant.substitute(mapping))),
+                loop,
+            ),
+            versions,
+        )
+    else:
+        raise NotImplementedError(f"{type(stmt)} is not supported")
+
+
+def _is_true(e: Expr):
+    return (
+        isinstance(e, LiteralExpr)
+        and isinstance(e.value, BoolValue)
+        and e.value.v is True
+    )
+
+
+def _conj(e1: Expr, e2: Expr):
+    if _is_true(e1):
+        return e2
+    if _is_true(e2):
+        return e1
+    return BinOpExpr(e1, Op.And, e2)
+
+
+def _implies(e1: Expr, e2: Expr):
+    if _is_true(e1) or _is_true(e2):
+        return e2
+    return BinOpExpr(e1, Op.Implies, e2)
+
+
+def derive_normal_and_wrong_conditions(passive_stmt: Stmt):
+    """Computes the Flanagan-Saxe normal and wrong-free conditions of a passive statement.
+
+    N(S) holds for the executions of S that terminate normally, and W(S) holds if no
+    assertion of S fails:
+
+    N(assume e) = N(assert e) = e        W(assume e) = True, W(assert e) = e
+    N(S;T) = N(S) ^ N(T)                 W(S;T) = W(S) ^ (N(S) => W(T))
+    N(if c S T) = (c ^ N(S)) v (!c ^ N(T))
+    W(if c S T) = (c => W(S)) ^ (!c => W(T))
+
+    Args:
+        passive_stmt (Stmt): A statement returned by `to_passive_form`.
+
+    Returns:
+        tuple: A tuple containing N(passive_stmt) and W(passive_stmt).
+
+    Raises:
+        NotImplementedError: If passive_stmt is not in passive form.
+    """
+    true = LiteralExpr(BoolValue(True))
+    if isinstance(passive_stmt, SkipStmt):
+        return true, true
+    elif isinstance(passive_stmt, AssumeStmt):
+        return passive_stmt.e, true
+    elif isinstance(passive_stmt, AssertStmt):
+        return passive_stmt.e, passive_stmt.e
+    elif isinstance(passive_stmt, CompoundStmt):
+        # folded from the left, i.e. W(S1;...;Sk) = W(S1) ^ (N(S1) => W(S2)) ^
+        # (N(S1) ^ N(S2) => W(S3)) ^ ..., so that the prefixes of N are shared
+        # instead of nesting an implication per statement.
+        n, w = true, true
+        for s in flatten_seq(passive_stmt):
+            n1, w1 = derive_normal_and_wrong_conditions(s)
+            n, w = _conj(n, n1), _conj(w, _implies(n, w1))
+        return n, w
+    elif isinstance(passive_stmt, IfElseStmt):
+        not_cond = UnOpExpr(Op.Not, passive_stmt.cond)
+        n1, w1 = derive_normal_and_wrong_conditions(passive_stmt.then_branch)
+        n2, w2 = derive_normal_and_wrong_conditions(passive_stmt.else_branch)
+        return (
+            BinOpExpr(
+                _conj(passive_stmt.cond, n1), Op.Or, _conj(not_cond, n2)
+            ),
+            _conj(_implies(passive_stmt.cond, w1), _implies(not_cond, w2)),
+        )
+    else:
+        raise NotImplementedError(f"{type(passive_stmt)} is not a passive statement")
+
+
+def derive_passive_weakest_precondition(
+    command_stmt: Stmt, post_condition: Expr, var2type: dict[str, type]
+):
+    """Computes the weakest precondition via the passive form of the command_stmt.
+
+    This is a drop-in replacement of `derive_weakest_precondition` based on the
+    "efficient weakest precondition" of Flanagan and Saxe. The command is first converted
+    into dynamic single assignment form by `to_passive_form`, and then
+
+    wp(S, Q) = W(S) ^ (N(S) => Q')
+
+    where Q' is the post_condition over the last versions of the variables. No formula is
+    substituted or duplicated, so the size of the result is linear in the size of the
+    command even when if-statements are nested or chained. Loop obligations are part of
+    the returned expression.
+
+    Args:
+        command_stmt (Stmt): The command statement whose weakest precondition is to be calculated.
+        post_condition (Expr): The post-condition expression that should hold after the execution of the command.
+        var2type (dict): A dictionary mapping variable names to their types.
+
+    Returns:
+        tuple: A tuple containing the weakest precondition expression and an empty set of auxiliary conditions.
+    """
+    passive_stmt, versions = to_passive_form(command_stmt)
+    n, w = derive_normal_and_wrong_conditions(passive_stmt)
+    post_condition = post_condition.substitute(_version_mapping(versions, post_condition))
+    return _conj(w, _implies(n, post_condition)), set()
 
 
 def encode_while_loop(stmt: Stmt, var2numhavoc: dict[str, int]):
@@ -132,13 +367,18 @@ def encode_while_loop(stmt: Stmt, var2numhavoc: dict[str, int]):
     ):
         return stmt, set()
     elif isinstance(stmt, CompoundStmt):
-        s1, iv1 = encode_while_loop(stmt.s1.clone(), var2numhavoc)
-        s2, iv2 = encode_while_loop(stmt.s2.clone(), var2numhavoc)
-        return CompoundStmt(s1, s2), {*iv1, *iv2}
+        invariants = set()
+
+        def encode(s):
+            encoded_stmt, iv = encode_while_loop(s.clone(), var2numhavoc)
+            invariants.update(iv)
+            return encoded_stmt
+
+        return map_seq(stmt, encode), invariants
     elif isinstance(stmt, IfElseStmt):
-        st, ivt = encode_while_loop(stmt.then_stmt.clone(), var2numhavoc)
-        se, ive = encode_while_loop(stmt.else_stmt.clone(), var2numhavoc)
-        return IfElseStmt(stmt.cond_expr, st, se), {*ivt, *ive}
+        st, ivt = encode_while_loop(stmt.then_branch.clone(), var2numhavoc)
+        se, ive = encode_while_loop(stmt.else_branch.clone(), var2numhavoc)
+        return IfElseStmt(stmt.cond, st, se, stmt.lineno), {*ivt, *ive}
     elif isinstance(stmt, WhileStmt):
         # https://courses.cs.washington.edu/courses/cse507/19wi/doc/L13.pdf
         # https://ethz.ch/content/dam/ethz/special-interest/infk/chair-program-method/pm/documents/Education/Courses/SS2022/PV/slides/04-loops-procedures-solutions.pdf
@@ -176,11 +416,12 @@ def encode_while_loop(stmt: Stmt, var2numhavoc: dict[str, int]):
                 SkipStmt(),
             ),
         ]
-        for i in range(len(after_havoc_stmts)):
-            for h in havocs:
-                after_havoc_stmts[i] = after_havoc_stmts[i].assign_variable(
-                    VarExpr(h.var_name), VarExpr(h.var_name + f"@{h.num_havoced}")
-                )
+        havoc_mapping = {
+            VarExpr(h.var_name): VarExpr(h.var_name + f"@{h.num_havoced}")
+            for h in havocs
+        }
+        memo = {}
+        after_havoc_stmts = [s.substitute(havoc_mapping, memo) for s in after_havoc_stmts]
 
         encoded_loop_items = [
             AssertStmt(stmt.invariant.clone()),
@@ -190,12 +431,494 @@ def encode_while_loop(stmt: Stmt, var2numhavoc: dict[str, int]):
         for i in encoded_loop_items[2:]:
             s = CompoundStmt(s.s1, CompoundStmt(s.s2, i))
 
-        havoced_invariant = stmt.invariant.clone()
-        for h in havocs:
-            havoced_invariant = havoced_invariant.assign_variable(
-                VarExpr(h.var_name), VarExpr(h.var_name + f"@{h.num_havoced}")
-            )
+        havoced_invariant = stmt.invariant.clone().substitute(havoc_mapping, memo)
 
         return s, {havoced_invariant}
     else:
         raise NotImplementedError(f"{type(stmt)} is not supported")
+
+
+def unroll_loops(command_stmt: Stmt, depth: int, unwinding_assertion: bool = False):
+    """Unrolls every while-loop of a command `depth` times for bounded model checking.
+
+    A loop `while c: B` becomes `depth` nested copies `if c: B; if c: B; ...` that end
+    with `assume not c`, which cuts the executions that iterate more often. The body is
+    unrolled first, so a nested loop is unrolled in every copy of its enclosing one. The
+    result is loop-free and needs no invariant, which is ignored.
+
+    Checking the unrolled command with `assume not c` only covers the executions within
+    the bound. The unwinding assertions `assert not c` check that there is no other
+    execution, in which case the bounded result holds for every execution.
+
+    Args:
+        command_stmt (Stmt): The command.
+        depth (int): The number of copies of the body of each loop.
+        unwinding_assertion (bool): If true, every copy ends with `assert not c`
+            instead, and the assertions of the command are assumed, so the unwinding
+            assertions are its only goals.
+
+    Returns:
+        Stmt: The loop-free command.
+    """
+
+    def unroll(s):
+        if isinstance(s, WhileStmt):
+            last = UnOpExpr(Op.Not, s.cond)
+            unrolled = AssertStmt(last) if unwinding_assertion else AssumeStmt(last)
+            for _ in range(depth):
+                # the assertions are recreated in every copy, since a goal is
+                # identified by its statement (see `_split_goals`)
+                body = map_seq(s.body, unroll)
+                unrolled = IfElseStmt(
+                    s.cond, CompoundStmt(body, unrolled), SkipStmt(), s.lineno
+                )
+            return unrolled
+        elif isinstance(s, IfElseStmt):
+            return IfElseStmt(
+                s.cond,
+                map_seq(s.then_branch, unroll),
+                map_seq(s.else_branch, unroll),
+                s.lineno,
+            )
+        elif isinstance(s, AssertStmt):
+            return AssumeStmt(s.e) if unwinding_assertion else AssertStmt(s.e)
+        return s
+
+    return map_seq(command_stmt, unroll)
+
+
+class Obligation:
+    """Represents a verification condition that can be discharged independently.
+
+    Args:
+        kind (str): What the condition establishes. "postcondition" for the straight-line
+            code from the entry of the function, and "initiation", "preservation" or "exit"
+            for a while-loop.
+        cond (Expr): The condition to be proved valid.
+        lineno (int, optional): The line number of the while-loop the condition belongs to.
+        is_invariant (bool): Whether the condition establishes the invariant of a while-loop
+            rather than the postcondition.
+        invariant_lineno (int, optional): The line number of the while-loop whose invariant
+            is established by the condition.
+        detail (str, optional): The goal and the branches the condition is split into.
+    """
+
+    def __init__(
+        self,
+        kind: str,
+        cond: Expr,
+        lineno: int = None,
+        is_invariant: bool = False,
+        invariant_lineno: int = None,
+        detail: str = None,
+    ):
+        self.kind = kind
+        self.cond = cond
+        self.lineno = lineno
+        self.is_invariant = is_invariant
+        self.invariant_lineno = invariant_lineno
+        self.detail = detail
+
+    def __repr__(self):
+        return f"(Obligation {self.label} {self.cond})"
+
+    @property
+    def label(self):
+        label = self.kind
+        if self.lineno is not None:
+            label += f" of the loop at line {self.lineno}"
+            if self.kind == "exit" and self.invariant_lineno is not None:
+                label += f" into the loop at line {self.invariant_lineno}"
+        if self.detail is not None:
+            label += f": {self.detail}"
+        return label
+
+
+def _contains(stmt: Stmt, stmt_type: type):
+    stack = [stmt]
+    while stack:
+        s = stack.pop()
+        if isinstance(s, stmt_type):
+            return True
+        elif isinstance(s, CompoundStmt):
+            stack.extend((s.s1, s.s2))
+        elif isinstance(s, IfElseStmt):
+            stack.extend((s.then_branch, s.else_branch))
+    return False
+
+
+def _map_loop_free(stmt: Stmt, fn):
+    """Rebuilds a loop-free statement by applying `fn` to its basic statements."""
+    if isinstance(stmt, CompoundStmt):
+        return map_seq(stmt, lambda s: _map_loop_free(s, fn))
+    elif isinstance(stmt, IfElseStmt):
+        return IfElseStmt(
+            stmt.cond,
+            _map_loop_free(stmt.then_branch, fn),
+            _map_loop_free(stmt.else_branch, fn),
+            stmt.lineno,
+        )
+    return fn(stmt)
+
+
+def _cut_loops(stmt: Stmt, k: Stmt, fragments: list, goals: dict, within=None):
+    """Rewrites `stmt; k` into a loop-free statement by cutting every while-loop.
+
+    A loop is replaced by `assert invariant; assume False`, i.e. the path ends at the
+    loop head, whose assertion is recorded in `goals` as the initiation of the loop. The
+    paths starting at the loop head, namely the body followed by the invariant (preservation)
+    and the continuation `k` (exit), are appended to `fragments` as
+    (kind, loop, assumption, statement, within) tuples, where `within` is the loop whose
+    invariant ends the statement, or None if it ends with the postcondition.
+    """
+    if not _contains(stmt, WhileStmt):
+        return stmt if isinstance(k, SkipStmt) else CompoundStmt(stmt, k)
+    elif isinstance(stmt, CompoundStmt):
+        for s in reversed(flatten_seq(stmt)):
+            k = _cut_loops(s, k, fragments, goals, within)
+        return k
+    elif isinstance(stmt, IfElseStmt):
+        return IfElseStmt(
+            stmt.cond,
+            _cut_loops(stmt.then_branch, k, fragments, goals, within),
+            _cut_loops(stmt.else_branch, k, fragments, goals, within),
+            stmt.lineno,
+        )
+    else:
+        invariant = (
+            LiteralExpr(BoolValue(True)) if stmt.invariant is None else stmt.invariant
+        )
+        entry = AssertStmt(invariant)
+        goals[id(entry)] = stmt
+        preserved = AssertStmt(invariant)
+        goals[id(preserved)] = None
+        body = _cut_loops(stmt.body, preserved, fragments, goals, stmt)
+        fragments.append(
+            ("preservation", stmt, _conj(invariant, stmt.cond), body, stmt)
+        )
+        fragments.append(
+            ("exit", stmt, _conj(invariant, UnOpExpr(Op.Not, stmt.cond)), k, within)
+        )
+        return CompoundStmt(entry, AssumeStmt(LiteralExpr(BoolValue(False))))
+
+
+def _select_goal(stmt: Stmt, goal, goals: dict, found: dict):
+    """Keeps the assertions of `goal` and turns the other goals of `goals` into skips.
+
+    If `goal` is the initiation of a loop, the assertions written by the user are assumed,
+    since they are proved by the obligation of the fragment itself. The loops whose goals
+    occur in `stmt` are added to `found`, keyed by their id since structurally equal
+    loops at different places are different goals.
+    """
+
+    def select(s):
+        if isinstance(s, AssertStmt):
+            if id(s) in goals:
+                found[id(goals[id(s)])] = goals[id(s)]
+                return s if goals[id(s)] is goal else SkipStmt()
+            elif goal is not None:
+                return AssumeStmt(s.e)
+        return s
+
+    return _map_loop_free(stmt, select)
+
+
+def split_vc(expr: Expr, max_goals: int = 64):
+    """Splits a verification condition into goals that are valid iff it is valid.
+
+    Conjunctions are distributed over implications and universal quantifiers:
+
+    A ^ B           ->  A, B
+    P => (A ^ B)    ->  P => A, P => B
+    forall x. A ^ B ->  forall x. A, forall x. B
+
+    Args:
+        expr (Expr): The verification condition.
+        max_goals (int): The maximum number of goals. Once it is reached, the remaining
+            conjunctions are kept as they are.
+
+    Returns:
+        list: A list of goals in the order of the conjuncts.
+    """
+    goals = []
+    stack = [(expr, ())]
+    while stack:
+        e, context = stack.pop()
+        if (
+            isinstance(e, BinOpExpr)
+            and e.op == Op.And
+            and len(goals) + len(stack) + 2 <= max_goals
+        ):
+            stack.extend(((e.e2, context), (e.e1, context)))
+        elif isinstance(e, BinOpExpr) and e.op == Op.Implies:
+            stack.append((e.e2, context + (e,)))
+        elif isinstance(e, QuantificationExpr) and e.quantifier == "FORALL":
+            stack.append((e.expr, context + (e,)))
+        else:
+            for c in reversed(context):
+                if isinstance(c, BinOpExpr):
+                    e = _implies(c.e1, e)
+                else:
+                    e = QuantificationExpr(c.quantifier, c.var, e, c.var_type, c.bounded)
+            goals.append(e)
+    return goals
+
+
+def _split_paths(stmt: Stmt, max_paths: int):
+    """Enumerates the paths through the if-statements of a loop-free statement.
+
+    If-statements are resolved into `assume cond; then` or `assume not cond; else` in the
+    order of execution, as long as the number of paths does not exceed `max_paths`.
+
+    Returns:
+        list: A list of (branch labels, statement) tuples.
+    """
+    paths = [((), [])]
+    for s in flatten_seq(stmt):
+        if isinstance(s, IfElseStmt) and 2 * len(paths) <= max_paths:
+            where = (
+                f"the if at line {s.lineno}"
+                if s.lineno is not None
+                else f"`if {pretty_expr(s.cond)}`"
+            )
+            budget = max_paths // (2 * len(paths))
+            branches = []
+            for name, cond, branch in [
+                ("then", s.cond, s.then_branch),
+                ("else", UnOpExpr(Op.Not, s.cond), s.else_branch),
+            ]:
+                for labels, ss in _split_paths(branch, budget):
+                    branches.append(
+                        ((f"{name} branch of {where}",) + labels, [AssumeStmt(cond)] + ss)
+                    )
+            paths = [(l1 + l2, ss1 + ss2) for l1, ss1 in paths for l2, ss2 in branches]
+        else:
+            for _, ss in paths:
+                ss.append(s)
+    return paths
+
+
+def _split_goals(stmt: Stmt, goals: dict, max_paths: int):
+    """Splits a loop-free statement into statements with a single assertion each.
+
+    Every assertion is split into the goals of `split_vc`, each of which is checked with
+    the other assertions assumed, and then split along the paths of `_split_paths`.
+    Paths without the assertion are dropped.
+
+    Returns:
+        list: A list of (description, statement) tuples.
+    """
+    assertions = {}
+
+    def collect(s):
+        if isinstance(s, AssertStmt):
+            assertions.setdefault(id(s), s)
+        return s
+
+    _map_loop_free(stmt, collect)
+
+    units = []
+    for a in assertions.values():
+        for goal in split_vc(a.e):
+            split_stmt = _map_loop_free(
+                stmt,
+                lambda s: (
+                    (AssertStmt(goal) if s is a else AssumeStmt(s.e))
+                    if isinstance(s, AssertStmt)
+                    else s
+                ),
+            )
+            description = (
+                f"`{pretty_expr(goal)}`"
+                if id(a) in goals
+                else f"assertion `{pretty_expr(goal)}`"
+            )
+            for labels, ss in _split_paths(split_stmt, max_paths):
+                path_stmt = SkipStmt()
+                for s in reversed(ss):
+                    path_stmt = s if isinstance(path_stmt, SkipStmt) else CompoundStmt(s, path_stmt)
+                if _contains(path_stmt, AssertStmt):
+                    units.append((", ".join((description,) + labels), path_stmt))
+    return units
+
+
+def _conjuncts(e: Expr):
+    conjuncts, stack = [], [e]
+    while stack:
+        c = stack.pop()
+        if isinstance(c, BinOpExpr) and c.op == Op.And:
+            stack.extend((c.e2, c.e1))
+        else:
+            conjuncts.append(c)
+    return conjuncts
+
+
+def guard_conjuncts(command_stmt: Stmt, pre_condition: Expr, prefix: str = "@track"):
+    """Guards every conjunct of the precondition and of the loop invariants.
+
+    Each conjunct `c` becomes `t ==> c` for a fresh boolean variable `t` that the
+    command never assigns. Checking the negated conditions under the assumption that
+    every `t` holds is the same as checking them unguarded, and the assumptions in the
+    unsat core of a proof are the conjuncts it used as hypotheses. Where a conjunct
+    is the goal, the negated goal asserts its own `t`, so a conjunct needed only to
+    preserve itself is not in any core.
+
+    Args:
+        command_stmt (Stmt): The body of the function.
+        pre_condition (Expr): The precondition of the function.
+        prefix (str): The prefix of the names of the guards.
+
+    Returns:
+        tuple: The guarded body, the guarded precondition, and the list of the guards
+            as (name, kind, lineno, conjunct), where kind is "precondition" or
+            "invariant" and lineno is the line number of the loop of an invariant.
+    """
+    guards = []
+
+    def guard(e, kind, lineno=None):
+        guarded = LiteralExpr(BoolValue(True))
+        for c in _conjuncts(e):
+            if _is_true(c):
+                continue
+            t = VarExpr(f"{prefix}{len(guards)}")
+            guards.append((t.name, kind, lineno, c))
+            guarded = _conj(guarded, BinOpExpr(t, Op.Implies, c))
+        return guarded
+
+    def rewrite(s):
+        if isinstance(s, WhileStmt):
+            return WhileStmt(
+                guard(s.invariant, "invariant", s.lineno),
+                s.cond,
+                map_seq(s.body, rewrite),
+                s.lineno,
+            )
+        elif isinstance(s, IfElseStmt):
+            return IfElseStmt(
+                s.cond,
+                map_seq(s.then_branch, rewrite),
+                map_seq(s.else_branch, rewrite),
+                s.lineno,
+            )
+        return s
+
+    pre_condition = guard(pre_condition, "precondition")
+    return map_seq(command_stmt, rewrite), pre_condition, guards
+
+
+def derive_frame(command_stmt: Stmt, pre_condition: Expr):
+    """Derives the part of the precondition that holds throughout a command.
+
+    These are the conjuncts of the precondition over variables that the command never
+    assigns, so they hold at every loop head as well as at the entry.
+
+    Args:
+        command_stmt (Stmt): The body of the function.
+        pre_condition (Expr): The precondition of the function.
+
+    Returns:
+        Expr: The conjunction of the conjuncts, or `True` if there is none.
+    """
+    assigned = command_stmt.collect_assigned_varnames()
+    frame = LiteralExpr(BoolValue(True))
+    for c in _conjuncts(pre_condition):
+        if not c.collect_varnames() & assigned:
+            frame = _conj(frame, c)
+    return frame
+
+
+def derive_obligations(
+    command_stmt: Stmt,
+    pre_condition: Expr,
+    post_condition: Expr,
+    var2type: dict[str, type],
+    derive_vc=derive_weakest_precondition,
+    split: bool = False,
+    max_paths: int = 4,
+    assume_frame: bool = True,
+):
+    """Splits the verification of a command into obligations per while-loop.
+
+    Every while-loop is a cut point whose invariant summarizes the state at the loop head.
+    The command is thereby split into loop-free fragments, which start at the entry of the
+    function or at a loop head, and end at the postcondition or at the next loop head:
+
+    - postcondition: {pre} code from the entry {post}
+    - initiation of L: {pre, or inv' ^ ...} code reaching L {inv(L)}
+    - preservation of L: {inv(L) ^ cond(L)} body of L {inv(L)}
+    - exit of L: {inv(L) ^ !cond(L)} code after L {post, or inv of the enclosing loop}
+
+    Each obligation only contains the code between two cut points, so a function with many
+    loops is verified by many small conditions instead of one large formula. The conjuncts
+    of the precondition over variables that the command never assigns hold at every loop
+    head and are assumed there, and any other fact about the state at a loop head that is
+    needed afterwards must be stated in its invariant. These conjuncts are computed by
+    `derive_frame`.
+
+    Args:
+        command_stmt (Stmt): The body of the function.
+        pre_condition (Expr): The precondition of the function.
+        post_condition (Expr): The postcondition of the function.
+        var2type (dict): A dictionary mapping variable names to their types.
+        derive_vc (callable): The VC generator applied to each loop-free fragment,
+            such as `derive_weakest_precondition` or `derive_passive_weakest_precondition`.
+        split (bool): If true, the obligations are further split per conjunct of each
+            assertion (see `split_vc`) and per path through the if-statements.
+        max_paths (int): The maximum number of paths an assertion is split into.
+        assume_frame (bool): If false, the conjuncts of `derive_frame` are left out of all
+            the obligations, and the caller has to assume them, e.g., as background facts
+            of a solver.
+
+    Returns:
+        list: A list of `Obligation`s in the order of the loops in the source code.
+    """
+    fragments, goals = [], {}
+    post = AssertStmt(post_condition)
+    goals[id(post)] = None
+    entry = _cut_loops(command_stmt, post, fragments, goals)
+
+    frame = derive_frame(command_stmt, pre_condition)
+    if not assume_frame:
+        # the frame is assumed by the caller, and only the rest of the precondition is
+        # assumed at the entry
+        excluded = set(_conjuncts(frame))
+        entry_assumption = LiteralExpr(BoolValue(True))
+        for c in _conjuncts(pre_condition):
+            if c not in excluded:
+                entry_assumption = _conj(entry_assumption, c)
+        pre_condition, frame = entry_assumption, LiteralExpr(BoolValue(True))
+    fragments.append(("postcondition", None, pre_condition, entry, None))
+
+    obligations = []
+    true = LiteralExpr(BoolValue(True))
+    for kind, loop, assumption, fragment, within in fragments:
+        if loop is not None:
+            assumption = _conj(frame, assumption)
+        found = {}
+        units = [(kind, loop, within, _select_goal(fragment, None, goals, found))]
+        for target in sorted(
+            (g for g in found.values() if g is not None), key=lambda g: g.lineno or 0
+        ):
+            units.append(
+                (
+                    "initiation",
+                    target,
+                    target,
+                    _select_goal(fragment, target, goals, {}),
+                )
+            )
+        for k, l, w, s in units:
+            lineno = None if l is None else l.lineno
+            is_invariant, invariant_lineno = w is not None, getattr(w, "lineno", None)
+            pieces = _split_goals(s, goals, max_paths) if split else [(None, s)]
+            for detail, piece in pieces:
+                wp, ac = derive_vc(piece, true, var2type)
+                obligations += [
+                    Obligation(k, c, lineno, is_invariant, invariant_lineno, detail)
+                    for c in [_implies(assumption, wp)] + list(ac)
+                ]
+    order = {"initiation": 0, "preservation": 1, "exit": 2}
+    obligations.sort(
+        key=lambda o: (o.lineno is None, o.lineno or 0, order.get(o.kind, 3))
+    )
+    return obligations
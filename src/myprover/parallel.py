@@ -0,0 +1,278 @@
+import multiprocessing
+import multiprocessing.connection
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import z3
+
+STRATEGIES = ("default", "qfnia", "nlsat", "solve-eqs")
+
+# the prefixes of the activation literals of a session and of the guards of the conjuncts
+AUXILIARY_PREFIXES = ("@activate", "@track")
+
+
+def to_smt2(z3_cond, background=None):
+    """Serializes the satisfiability problem of a Z3 formula into SMT-LIB2.
+
+    Args:
+        z3_cond (z3.BoolRef): The formula, such as the negation of a condition to be proved.
+        background (z3.BoolRef, optional): Facts asserted together with the formula.
+
+    Returns:
+        str: An SMT-LIB2 script that declares the constants and asserts the formulas.
+    """
+    # the formula may belong to the context of a verification other than the main one
+    solver = z3.Solver(ctx=getattr(z3_cond, "ctx", None))
+    if background is not None:
+        solver.add(background)
+    solver.add(z3_cond)
+    return solver.to_smt2()
+
+
+def model_items(model):
+    """Lists the assignments of a model, leaving out the literals of `AUXILIARY_PREFIXES`.
+
+    Args:
+        model (z3.ModelRef): The model.
+
+    Returns:
+        list: The (name, value) pairs of the model as strings.
+    """
+    return [
+        (d.name(), str(model[d]))
+        for d in model.decls()
+        if not d.name().startswith(AUXILIARY_PREFIXES)
+    ]
+
+
+def format_model(items: list):
+    """Formats the (name, value) pairs of `model_items` like a Z3 model."""
+    return "[" + ",\n ".join(f"{name} = {value}" for name, value in items) + "]"
+
+
+def make_solver(strategy: str = "default"):
+    """Creates a solver that follows one of `STRATEGIES`.
+
+    - default: the incremental core used by `MyProver.verify`
+    - qfnia: the tactic for quantifier-free nonlinear integer arithmetic
+    - nlsat: the nonlinear real arithmetic procedure, which also refutes many integer goals
+    - solve-eqs: simplification and elimination of equalities before the default core
+
+    Args:
+        strategy (str): The name of the strategy.
+
+    Returns:
+        z3.Solver: A fresh solver.
+
+    Raises:
+        ValueError: If the strategy is unknown.
+    """
+    if strategy == "default":
+        solver = z3.Solver()
+        # the incremental core instead of a tactic selected by the logic, which can be
+        # much slower for nonlinear arithmetic
+        solver.push()
+    elif strategy == "solve-eqs":
+        solver = z3.Then("simplify", "solve-eqs", "smt").solver()
+    elif strategy in STRATEGIES:
+        solver = z3.Tactic(strategy).solver()
+    else:
+        raise ValueError(f"Unknown strategy `{strategy}`")
+    return solver
+
+
+def check_smt2(smt2: str, strategy: str = "default", timeout: float = None):
+    """Checks the satisfiability of an SMT-LIB2 script in a fresh solver.
+
+    Args:
+        smt2 (str): The script, as serialized by `to_smt2`.
+        strategy (str): The strategy of the solver (see `make_solver`).
+        timeout (float, optional): The time limit of the check in seconds.
+
+    Returns:
+        tuple: The result ("sat", "unsat" or "unknown") and the model as in `model_items`
+            if the result is "sat", the reason if it is "unknown", otherwise None.
+    """
+    solver = make_solver(strategy)
+    if timeout is not None:
+        solver.set("timeout", max(1, int(timeout * 1000)))
+    solver.from_string(smt2)
+    try:
+        result = solver.check()
+    except z3.Z3Exception as e:
+        # e.g., a tactic that does not apply to the goal
+        return "unknown", str(e)
+    if result == z3.sat:
+        return str(result), model_items(solver.model())
+    elif result == z3.unknown:
+        return str(result), solver.reason_unknown()
+    return str(result), None
+
+
+def _send_check(smt2, strategy, timeout, connection):
+    connection.send(check_smt2(smt2, strategy, timeout))
+    connection.close()
+
+
+def race_portfolio(smt2: str, strategies=STRATEGIES, timeout: float = None):
+    """Checks an SMT-LIB2 script with several strategies in parallel.
+
+    Every strategy runs in its own process, and the first definitive answer ("sat" or
+    "unsat") wins. The other processes are terminated then, or when the wall-clock
+    `timeout` expires, so a strategy that does not terminate never blocks the caller.
+
+    Args:
+        smt2 (str): The script, as serialized by `to_smt2`.
+        strategies (tuple): The names of the strategies (see `make_solver`).
+        timeout (float, optional): The time limit of the race in seconds.
+
+    Returns:
+        tuple: The result, the model or the reason as in `check_smt2`, and the winning
+            strategy, which is None if the result is "unknown".
+    """
+    races = {}
+    for strategy in strategies:
+        receiver, sender = multiprocessing.Pipe(duplex=False)
+        process = multiprocessing.Process(
+            target=_send_check, args=(smt2, strategy, timeout, sender), daemon=True
+        )
+        process.start()
+        sender.close()
+        races[receiver] = (strategy, process)
+    processes = list(races.values())
+    deadline = None if timeout is None else time.monotonic() + timeout
+    reasons = []
+    try:
+        while races:
+            remaining = None
+            if deadline is not None:
+                remaining = max(0, deadline - time.monotonic())
+            ready = multiprocessing.connection.wait(list(races), remaining)
+            if not ready:
+                return "unknown", "timeout", None
+            for receiver in ready:
+                strategy, _ = races.pop(receiver)
+                try:
+                    result, detail = receiver.recv()
+                except EOFError:
+                    result, detail = "unknown", "the solver process exited"
+                receiver.close()
+                if result != "unknown":
+                    return result, detail, strategy
+                reasons.append(f"{strategy}: {detail}")
+        return "unknown", "; ".join(reasons), None
+    finally:
+        for _, process in processes:
+            if process.is_alive():
+                process.terminate()
+            process.join()
+        for receiver in races:
+            receiver.close()
+
+
+def discharge_in_parallel(
+    smt2s: list,
+    workers: int = None,
+    cancel_on_failure: bool = True,
+    timeout: float = None,
+    executor: ProcessPoolExecutor = None,
+):
+    """Checks the satisfiability of independent problems in parallel processes.
+
+    Every process has its own Z3 context, and the problems are passed as SMT-LIB2
+    scripts. Unless `executor` is given, every problem is checked in a process of its
+    own, at most `workers` at a time. The results are returned in the order of `smt2s`
+    regardless of the order in which the processes finish.
+
+    Args:
+        smt2s (list): The SMT-LIB2 scripts, as serialized by `to_smt2`.
+        workers (int, optional): The number of processes running at a time if `executor`
+            is not given. Defaults to the number of CPUs.
+        cancel_on_failure (bool): If true, the problems after the first one that is not
+            unsatisfiable (a counterexample or an unknown result) are cancelled. The
+            problems before it are still checked, so the first such problem in the order
+            of `smt2s` is always found. The processes of the checks that are already
+            running are terminated; in the pool of `executor`, such checks run to the
+            end or to `timeout` instead.
+        timeout (float, optional): The time limit of each check in seconds.
+        executor (ProcessPoolExecutor, optional): A pool kept by the caller, which is
+            reused across calls and never shut down here.
+
+    Returns:
+        list: The results of `check_smt2` for each problem, or None for the cancelled ones.
+    """
+    if executor is None:
+        return _discharge_in_processes(smt2s, workers, cancel_on_failure, timeout)
+    results = [None] * len(smt2s)
+    futures = {executor.submit(check_smt2, s, "default", timeout): i for i, s in enumerate(smt2s)}
+    pending, first_failure = set(futures), len(smt2s)
+    try:
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.cancelled():
+                    continue
+                i = futures[future]
+                results[i] = future.result()
+                if cancel_on_failure and results[i][0] != "unsat" and i < first_failure:
+                    first_failure = i
+                    for f in pending:
+                        if futures[f] > i:
+                            f.cancel()
+            if cancel_on_failure:
+                pending = {f for f in pending if futures[f] < first_failure}
+    finally:
+        # the running checks cannot be stopped without breaking the pool of the caller
+        for future in futures:
+            future.cancel()
+    return results
+
+
+def _discharge_in_processes(smt2s, workers, cancel_on_failure, timeout):
+    # every check runs in a process of its own, which is terminated once the check is
+    # no longer needed, as in `race_portfolio`
+    results = [None] * len(smt2s)
+    workers = workers or os.cpu_count() or 1
+    running = {}
+    next_index, first_failure = 0, len(smt2s)
+    try:
+        while True:
+            while next_index < first_failure and len(running) < workers:
+                receiver, sender = multiprocessing.Pipe(duplex=False)
+                process = multiprocessing.Process(
+                    target=_send_check,
+                    args=(smt2s[next_index], "default", timeout, sender),
+                    daemon=True,
+                )
+                process.start()
+                sender.close()
+                running[receiver] = (next_index, process)
+                next_index += 1
+            if not running:
+                return results
+            for receiver in multiprocessing.connection.wait(list(running)):
+                if receiver not in running:
+                    # terminated after an earlier failure in this round
+                    continue
+                i, process = running.pop(receiver)
+                try:
+                    results[i] = receiver.recv()
+                except EOFError:
+                    results[i] = ("unknown", "the solver process exited")
+                receiver.close()
+                process.join()
+                if cancel_on_failure and results[i][0] != "unsat" and i < first_failure:
+                    first_failure = i
+                    for other, (j, other_process) in list(running.items()):
+                        if j > i:
+                            other_process.terminate()
+                            other_process.join()
+                            other.close()
+                            del running[other]
+    finally:
+        for receiver, (_, process) in running.items():
+            if process.is_alive():
+                process.terminate()
+            process.join()
+            receiver.close()
@@ -1,13 +1,196 @@
 import ast
+import asyncio
+import functools
 import inspect
+import os
+import weakref
 
 import z3
 
-from .claim import BinOpExpr, ClaimParser, Op, UnOpExpr, pretty_repr, CompoundStmt, AssignStmt, LiteralExpr, IntValue, VarExpr
-from .exception import InvalidInvariantError, VerificationFailureError
-from .hoare import derive_weakest_precondition, encode_while_loop
-from .type import check_and_update_varname2type, resolve_expr_type, resolve_stmt_type
-from .visitor import ClaimToZ3, PyToClaim, PyToDPClaim
+from .claim import (
+    AssignStmt,
+    BoolValue,
+    ClaimParser,
+    CompoundStmt,
+    IntValue,
+    LiteralExpr,
+    Op,
+    UnOpExpr,
+    VarExpr,
+    count_nodes,
+    pretty_expr,
+    simplify,
+)
+from .backend import SolverBackend, Z3Backend
+from .cache import ProofCache, ResultCache, function_key
+from .exception import (
+    InvalidInvariantError,
+    VerificationFailureError,
+    VerificationUnknownError,
+)
+from .hoare import (
+    derive_frame,
+    derive_passive_weakest_precondition,
+    derive_obligations,
+    derive_weakest_precondition,
+    guard_conjuncts,
+    unroll_loops,
+)
+from .parallel import (
+    discharge_in_parallel,
+    format_model,
+    race_portfolio,
+    to_smt2,
+)
+from .slicing import count_stmts, slice_stmt
+from .type import (
+    annotate_quantifier_types,
+    annotate_stmt_quantifier_types,
+    check_and_update_varname2type,
+    resolve_expr_type,
+    resolve_stmt_type,
+)
+from .visitor import PyToClaim, PyToDPClaim, make_z3_variable  # noqa: F401
+
+VC_GENERATORS = {
+    "wp": derive_weakest_precondition,
+    "passive": derive_passive_weakest_precondition,
+}
+
+# the definitive outcomes of `prove` that a `ProofCache` replays
+PROOF_ERRORS = {
+    e.__name__: e for e in (InvalidInvariantError, VerificationFailureError)
+}
+
+
+def lookup_varname_type(varname: str, varname2type: dict[str, type]):
+    """Look up the type of a possibly versioned, havoced or forked variable.
+
+    Args:
+        varname (str): A variable name such as `x`, `x!2`, `x@0` or `x#1`.
+        varname2type (dict): A dictionary mapping variable names to their types.
+
+    Returns:
+        type: The type of the variable, or None if it is unknown.
+    """
+    for sep in ("!", "@", "#"):
+        if varname in varname2type:
+            return varname2type[varname]
+        varname = varname.split(sep)[0]
+    return varname2type.get(varname)
+
+
+def _report_result(result, detail, is_expr_to_verify_invariant, label, z3_cond):
+    # `detail` is the counterexample as in `model_items` if the result is "sat", and the
+    # reason if "unknown"
+    if result == "unknown":
+        raise VerificationUnknownError(
+            f"Could not decide a condition ({label}): {z3_cond} - {detail}"
+        )
+    elif result != "sat":
+        return
+    detail = format_model(detail)
+    if is_expr_to_verify_invariant:
+        raise InvalidInvariantError(
+            f"Invalid invariant is specified ({label}): {z3_cond} - {detail}"
+        )
+    else:
+        raise VerificationFailureError(
+            f"Found a violoated condition ({label}): {z3_cond} - {detail}"
+        )
+
+
+SUPPORTED_TYPES = (int, bool, list[int])
+
+
+def resolve_variable(varname: str, varname2type: dict[str, type], dp_mode=False):
+    """Finds the constant that a variable of the verification conditions denotes.
+
+    A forked variable `x#1` or `x#2` of a registered variable `x` has its own constant only
+    in the DP mode, and only for integers and booleans. Otherwise it denotes the constant
+    of `x`. Any other variable, such as a versioned variable of the passive form, has a
+    constant of the type found by `lookup_varname_type`.
+
+    Args:
+        varname (str): The variable name.
+        varname2type (dict): A dictionary mapping variable names to their types.
+        dp_mode (bool): Whether the variables are forked for differential privacy.
+
+    Returns:
+        tuple: The name and the type of the constant, or None if the type is unknown or
+            not supported by `make_z3_variable`.
+    """
+    t = varname2type.get(varname)
+    if t is None:
+        base = varname.split("#")[0]
+        t = varname2type.get(base)
+        if t in SUPPORTED_TYPES:
+            if dp_mode and t != list[int] and varname in (base + "#1", base + "#2"):
+                return varname, t
+            return base, t
+        t = lookup_varname_type(varname, varname2type)
+    return (varname, t) if t in SUPPORTED_TYPES else None
+
+
+def describe_conjunct(kind: str, lineno: int, conjunct) -> str:
+    """Describes a conjunct tracked by `guard_conjuncts`, e.g. in the unused conjuncts."""
+    if kind == "invariant":
+        return f"invariant of the loop at line {lineno}: {pretty_expr(conjunct)}"
+    return f"precondition: {pretty_expr(conjunct)}"
+
+
+# the number of verifications that `verify_async` and `prove_async` run at once by
+# default in each event loop
+MAX_CONCURRENT_VERIFICATIONS = os.cpu_count() or 1
+_default_semaphores = weakref.WeakKeyDictionary()
+
+
+def default_semaphore():
+    """Returns the semaphore that limits the verifications of the running event loop.
+
+    It is created on first use with `MAX_CONCURRENT_VERIFICATIONS` slots, so the limit
+    can be changed by assigning the constant before the first verification.
+
+    Returns:
+        asyncio.Semaphore: The semaphore.
+    """
+    loop = asyncio.get_running_loop()
+    semaphore = _default_semaphores.get(loop)
+    if semaphore is None:
+        semaphore = asyncio.Semaphore(MAX_CONCURRENT_VERIFICATIONS)
+        _default_semaphores[loop] = semaphore
+    return semaphore
+
+
+async def run_interruptibly(call, backend, executor=None, semaphore=None):
+    """Runs a verification in an executor, interrupting its solver on cancellation.
+
+    Args:
+        call (callable): The verification, which checks its conditions in `backend`.
+        backend (SolverBackend): The backend whose check is interrupted.
+        executor (concurrent.futures.Executor, optional): The executor of the event
+            loop if None.
+        semaphore (asyncio.Semaphore, optional): The semaphore acquired while the
+            verification runs. Defaults to `default_semaphore()`.
+
+    Returns:
+        The result of the call.
+
+    Raises:
+        asyncio.CancelledError: If cancelled, once the verification has stopped.
+    """
+    loop = asyncio.get_running_loop()
+    async with semaphore if semaphore is not None else default_semaphore():
+        future = loop.run_in_executor(executor, call)
+        try:
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            backend.interrupt()
+            # the slot is released once the thread has left the solver
+            await asyncio.wait([future])
+            if not future.cancelled():
+                future.exception()
+            raise
 
 
 class MyProver:
@@ -16,6 +199,7 @@ class MyProver:
 
     Attributes:
         sname2var_types (dict): A dictionary mapping scope names to variable types.
+        stats (dict): Statistics of the last call of `verify`.
     """
 
     def __init__(self, dp_mode=False):
@@ -25,36 +209,141 @@ class MyProver:
         self.dp_mode = dp_mode
         self.sname2var_types = {}
         self.varname2numhavoced = {}
+        self.stats = {}
 
     def register(self, scope_name: str, var2types: dict[str, type]) -> None:
         self.sname2var_types[scope_name] = var2types
 
     def verify(
         self,
-        code_str: str,
+        code_str,
         scope_name: str,
         precond_str: str,
         postcond_str: str,
         skip_verification_of_invariant: bool = True,
-        array_length_dict: dict[str, int] = dict()
+        array_length_dict: dict[str, int] = dict(),
+        engine: str = "wp",
+        first_lineno: int = 1,
+        split: bool = True,
+        simplify_vc: bool = True,
+        slice_program: bool = False,
+        incremental: bool = True,
+        workers: int = None,
+        pool=None,
+        timeout: float = None,
+        portfolio: tuple = None,
+        cache: ResultCache = None,
+        backend: SolverBackend = None,
+        track_conjuncts: bool = False,
+        falsify: bool = False,
+        unroll: int = None,
+        unwinding_assertion: bool = True,
+        deepen: bool = False,
     ) -> bool:
         """
         Verifies the correctness of a function based on the given precondition and postcondition strings.
 
         Args:
-            code_str (str): The code string to verify.
+            code_str (str or ast.AST): The code string to verify, or its parsed AST, whose
+                line numbers are kept as they are.
             scope_name (str): The name of the scope, such as a name of a function.
             precond_str (str): The precondition string.
             postcond_str (str): The postcondition string.
-            skip_verification_of_invariant (bool): If true, skip verifying that the invariant preserves within while-loop.
+            skip_verification_of_invariant (bool): If false, a failing initiation or preservation of a
+                while-loop is reported as an invalid invariant.
+            array_length_dict (dict): A dictionary mapping array names to their lengths.
+            engine (str): The VC generator, either "wp" (`derive_weakest_precondition`) or
+                "passive" (`derive_passive_weakest_precondition`). The time of "wp" grows
+                superlinearly with the length of straight-line code (about 8 s at 1000
+                statements and 39 s at 2000), so long straight-line functions, including
+                unrolled ones, need "passive".
+            first_lineno (int): The line number of the first line of code_str in its source file,
+                used to report the location of while-loops.
+            split (bool): If true, every conjunct of the assertions and every path through the
+                if-statements is checked as a separate condition (see `derive_obligations`).
+            simplify_vc (bool): If true, every condition is simplified by `simplify` before it is
+                converted into Z3. The numbers of nodes before and after are recorded in `stats`.
+            slice_program (bool): If true, the statements that cannot affect the postcondition,
+                the invariants or the assertions are removed by `slice_stmt` first. The ratio of
+                the remaining statements is recorded in `stats`.
+            incremental (bool): If true, all conditions are checked in one solver session:
+                the part of the precondition that holds throughout the function (see
+                `derive_frame`) is asserted once, and each condition is enabled by its own
+                activation literal, so what the solver learns is shared among the checks.
+                If false, each condition is checked between a push and a pop on its own.
+            workers (int, optional): If more than one, the conditions are serialized into
+                SMT-LIB2 and checked in a pool of this many processes instead (see
+                `discharge_in_parallel`). The conditions after the first violated one are
+                cancelled, and the violation reported is the same as without workers.
+            pool (concurrent.futures.ProcessPoolExecutor, optional): A pool of processes
+                kept by the caller, in which the conditions are checked as with `workers`
+                instead of a pool created for the verification.
+            timeout (float, optional): The time limit of each condition in seconds. A
+                condition that is neither proved nor refuted within it is reported as
+                unknown.
+            portfolio (tuple, optional): The names of the strategies (see
+                `myprover.parallel.STRATEGIES`) that race for each condition in separate
+                processes, where the first definitive answer wins (see `race_portfolio`).
+                The conditions are checked one after another, and `timeout` is a
+                wall-clock limit on each race. The winning strategy of each condition is
+                recorded in `stats`.
+            cache (ResultCache, optional): A persistent cache of the results. A condition
+                whose alpha-normalized formula is found in it is not passed to Z3, and the
+                results of the others are stored in it. The numbers of hits and misses are
+                recorded in `stats`.
+            backend (SolverBackend, optional): The solver that checks the conditions one
+                after another, such as a `SmtLibBackend` that keeps an external solver
+                process across verifications. Defaults to a `Z3Backend` in this process,
+                which `cache`, `workers` and `portfolio` require. The statistics of the
+                session are recorded in `stats`.
+            track_conjuncts (bool): If true, every conjunct of the precondition and of the
+                loop invariants is guarded by a boolean assumption (see `guard_conjuncts`),
+                and the unsat cores of the checks are collected. Once every condition is
+                proved, the conjuncts that are in no core are recorded in `stats` as
+                "unused_conjuncts". They may be removed together because every condition
+                is proved by a check of its own, whose core suffices for it, and none is
+                answered by a cached result; hence it cannot be combined with `cache`,
+                `workers` and `portfolio`.
+            falsify (bool): If true, a counterexample of each condition is first looked
+                for by evaluating it over a batch of integer and boolean assignments with
+                NumPy (see `myprover.falsify.Falsifier`), and a condition refuted this
+                way is reported without the solver. The conditions with arrays or
+                quantifiers, and those without such an assignment, are passed to the
+                solver. The label of the refuted condition is recorded in `stats`.
+            unroll (int, optional): If given, the function is bounded model checked:
+                every while-loop is unrolled this many times (see `unroll_loops`)
+                instead of being cut at its invariant, and the loop-free command is
+                passed to the VC generator, so no invariant is needed. A violation is
+                then reported only if it happens within the bound.
+            unwinding_assertion (bool): If true, the bounded check is followed by the
+                unwinding assertions, which fail if a loop can iterate more often than
+                the bound, and pass if the bounded result holds for every execution.
+                Whether they passed is recorded in `stats` as "bmc_complete".
+            deepen (bool): If true, the depths from 1 to `unroll` are checked one after
+                another in the same solver session, stopping at the first depth whose
+                unwinding assertions pass. The incremental backend keeps the constants
+                and the lemmas of the shallower depths, and a condition already proved
+                at a shallower depth, such as an execution that leaves the loops early,
+                is not checked again. The unwinding assertions only fail at `unroll`.
 
         Returns:
             bool: True if the function satisfies the precondition and postcondition; otherwise, raises an error.
 
         Raises:
             RuntimeError: If a violated condition is found during verification.
+            VerificationUnknownError: If a condition can be neither proved nor refuted.
+            ValueError: If the engine is unknown, or the backend cannot be combined with
+                the other options.
         """
-        py_ast = ast.parse(code_str)
+        if engine not in VC_GENERATORS:
+            raise ValueError(f"Unknown VC generator `{engine}`")
+        derive_vc = VC_GENERATORS[engine]
+
+        if isinstance(code_str, ast.AST):
+            py_ast = code_str
+        else:
+            py_ast = ast.parse(code_str)
+            ast.increment_lineno(py_ast, first_lineno - 1)
 
         claim_ast = PyToClaim().visit(py_ast)
         if self.dp_mode:
@@ -64,6 +353,12 @@ class MyProver:
         precond_expr = ClaimParser(precond_str).parse_expr()
         postcond_expr = ClaimParser(postcond_str).parse_expr()
 
+        self.stats = {}
+        if slice_program:
+            num_stmts = count_stmts(claim_ast)
+            claim_ast = slice_stmt(claim_ast, postcond_expr)
+            self.stats["slice_ratio"] = count_stmts(claim_ast) / max(num_stmts, 1)
+
         resolve_stmt_type(self.sname2var_types[scope_name], claim_ast)
         actual, _ = resolve_expr_type(self.sname2var_types[scope_name], precond_expr)
         check_and_update_varname2type(
@@ -73,76 +368,471 @@ class MyProver:
         check_and_update_varname2type(
             postcond_expr, actual, bool, self.sname2var_types[scope_name]
         )
+        claim_ast = annotate_stmt_quantifier_types(
+            self.sname2var_types[scope_name], claim_ast
+        )
+        precond_expr = annotate_quantifier_types(
+            self.sname2var_types[scope_name], precond_expr
+        )
+        postcond_expr = annotate_quantifier_types(
+            self.sname2var_types[scope_name], postcond_expr
+        )
+
+        guards = []
+        if track_conjuncts:
+            claim_ast, precond_expr, guards = guard_conjuncts(claim_ast, precond_expr)
+            self.stats["num_tracked_conjuncts"] = len(guards)
 
-        conditions_for_invariants = []
-        if not skip_verification_of_invariant:
-            encoded_claim_ast, invariants = encode_while_loop(
-                claim_ast, self.varname2numhavoced
+        background = (
+            derive_frame(claim_ast, precond_expr)
+            if incremental
+            else LiteralExpr(BoolValue(True))
+        )
+        derive = functools.partial(
+            self._derive_conditions,
+            precond_expr=precond_expr,
+            var2type=self.sname2var_types[scope_name],
+            derive_vc=derive_vc,
+            split=split,
+            simplify_vc=simplify_vc,
+            assume_frame=not incremental,
+            check_invariants=not skip_verification_of_invariant,
+        )
+
+        varname2type = self.sname2var_types[scope_name]
+        in_z3 = (
+            cache is not None
+            or portfolio
+            or pool is not None
+            or (workers is not None and workers > 1)
+        )
+        if backend is None:
+            backend = Z3Backend(incremental)
+        elif in_z3 and not isinstance(backend, Z3Backend):
+            raise ValueError("The cache, the workers and the portfolio need a Z3Backend")
+        if in_z3 and track_conjuncts:
+            raise ValueError(
+                "The conjuncts cannot be tracked with the cache, the workers or the portfolio"
             )
-            inv_expr = list(invariants)[
-                0
-            ]  # TODO: Support multiple while-loops within a function
-            wpi, aci = derive_weakest_precondition(
-                encoded_claim_ast, inv_expr, self.sname2var_types[scope_name]
+        guard_names = {name for name, _, _, _ in guards}
+
+        def resolve(varname):
+            if varname in guard_names:
+                return varname, bool
+            return resolve_variable(varname, varname2type, self.dp_mode)
+
+        falsifier = None
+        if falsify:
+            # NumPy is only needed by this option
+            from .falsify import Falsifier
+
+            # the guards are not resolved, since they are assumed true in every check
+            falsifier = Falsifier(
+                functools.partial(
+                    resolve_variable, varname2type=varname2type, dp_mode=self.dp_mode
+                )
+            )
+
+        def check(conditions_to_be_proved):
+            self._check_conditions(
+                backend,
+                background,
+                [UnOpExpr(Op.Not, cond) for cond, _, _ in conditions_to_be_proved],
+                conditions_to_be_proved,
+                workers,
+                timeout,
+                portfolio,
+                cache,
+                [name for name, _, _, _ in guards],
+                falsifier,
+                pool,
             )
-            conditions_for_invariants = [
-                BinOpExpr(precond_expr, Op.Implies, wpi)
-            ] + list(aci)
-            for c in conditions_for_invariants:
-                c._is_expr_to_verify_invriant = True
-
-        wp, ac = derive_weakest_precondition(
-            claim_ast, postcond_expr, self.sname2var_types[scope_name]
+
+        # the names of the assumptions in the unsat cores of the proofs
+        self.used_guards = set()
+        # the constants, including the versioned variables of the passive form and the
+        # forked variables, are declared when they are first referenced
+        backend.open_session(background, resolve, array_length_dict, timeout)
+        try:
+            if unroll is None:
+                check(derive(claim_ast, postcond_expr))
+            else:
+                self._check_bounded(
+                    claim_ast, postcond_expr, unroll, unwinding_assertion, deepen, derive, check
+                )
+        finally:
+            self.stats.update(backend.close_session())
+        if track_conjuncts:
+            self.stats["unused_conjuncts"] = [
+                describe_conjunct(kind, lineno, conjunct)
+                for name, kind, lineno, conjunct in guards
+                if name not in self.used_guards
+            ]
+        return True
+
+    async def verify_async(
+        self,
+        code_str,
+        scope_name: str,
+        precond_str: str,
+        postcond_str: str,
+        *args,
+        executor=None,
+        semaphore: asyncio.Semaphore = None,
+        **kwargs,
+    ) -> bool:
+        """Verifies a function like `verify` without blocking the event loop.
+
+        The verification runs in `executor`, while at most as many verifications as
+        the slots of `semaphore` run at once. Unless a backend is given, the conditions
+        are checked in a `Z3Backend` with its own Z3 context, so verifications in
+        several threads do not share a solver. If the coroutine is cancelled, the
+        check running in the backend is interrupted, and the cancellation is
+        propagated once the verification has stopped.
+
+        Args:
+            code_str (str or ast.AST): See `verify`.
+            scope_name (str): See `verify`.
+            precond_str (str): See `verify`.
+            postcond_str (str): See `verify`.
+            *args: The other arguments of `verify`.
+            executor (concurrent.futures.Executor, optional): The executor that runs
+                the verification. Defaults to the executor of the event loop.
+            semaphore (asyncio.Semaphore, optional): The semaphore that limits the
+                concurrent verifications. Defaults to `default_semaphore()`.
+            **kwargs: The other keyword arguments of `verify`.
+
+        Returns:
+            bool: True if the function is verified; otherwise, raises an error as `verify`.
+        """
+        if kwargs.get("backend") is None:
+            kwargs["backend"] = Z3Backend(kwargs.get("incremental", True), z3.Context())
+        call = functools.partial(
+            self.verify, code_str, scope_name, precond_str, postcond_str, *args, **kwargs
         )
-        conditions_to_be_proved = (
-            conditions_for_invariants
-            + [BinOpExpr(precond_expr, Op.Implies, wp)]
-            + list(ac)
+        return await run_interruptibly(call, kwargs["backend"], executor, semaphore)
+
+    def _derive_conditions(
+        self,
+        command_stmt,
+        postcond_expr,
+        precond_expr,
+        var2type,
+        derive_vc,
+        split,
+        simplify_vc,
+        assume_frame,
+        check_invariants,
+        kind=None,
+    ):
+        """Derives the conditions to be proved as (cond, is_invariant, label) tuples.
+
+        The numbers of obligations and of nodes are added to `stats`, so they sum up
+        over the unrolled commands of bounded model checking.
+        """
+        obligations = derive_obligations(
+            command_stmt,
+            precond_expr,
+            postcond_expr,
+            var2type,
+            derive_vc,
+            split,
+            assume_frame=assume_frame,
         )
+        if kind is not None:
+            for o in obligations:
+                o.kind = kind
 
-        z3_env_varname2type = {}
-        for n, t in self.sname2var_types[scope_name].items():
-            if t == int:
-                z3_env_varname2type[n] = z3.Int(n)
-                if self.dp_mode:
-                    z3_env_varname2type[n + "#1"] = z3.Int(n + "#1")
-                    z3_env_varname2type[n + "#2"] = z3.Int(n + "#2")
-            elif t == bool:
-                z3_env_varname2type[n] = z3.Bool(n)
-                if self.dp_mode:
-                    z3_env_varname2type[n + "#1"] = z3.Bool(n + "#1")
-                    z3_env_varname2type[n + "#2"] = z3.Bool(n + "#2")
-            elif t == list[int]:
-                z3_env_varname2type[n] = z3.Array(n, z3.IntSort(), z3.IntSort())
-
-        solver = z3.Solver()
-        converter = ClaimToZ3(z3_env_varname2type, array_length_dict)
-
-        for cond in conditions_to_be_proved:
-            solver.push()
-            z3_cond = converter.visit(UnOpExpr(Op.Not, cond))
-            solver.add(z3_cond)
-            result = solver.check()
-            if str(result) == "sat":
-                model = solver.model()
-                if cond._is_expr_to_verify_invriant:
-                    raise InvalidInvariantError(
-                        f"Invalid invariant is specified: {z3_cond} - {model}"
-                    )
+        def add_stat(key, value):
+            self.stats[key] = self.stats.get(key, 0) + value
+
+        add_stat("num_obligations", len(obligations))
+        if simplify_vc:
+            # the memo is keyed by ids, so it must not outlive the obligations
+            memo = {}
+            num_nodes = sum(count_nodes(o.cond) for o in obligations)
+            for o in obligations:
+                o.cond = simplify(o.cond, memo)
+            add_stat("num_vc_nodes", num_nodes)
+            add_stat(
+                "num_removed_vc_nodes",
+                num_nodes - sum(count_nodes(o.cond) for o in obligations),
+            )
+            # literals are hash-consed, so trivially valid conditions are found by identity
+            true = LiteralExpr(BoolValue(True))
+            obligations = [o for o in obligations if o.cond is not true]
+        # structurally equal conditions are proved once, keeping the first label
+        unique = {}
+        for o in obligations:
+            unique.setdefault((o.cond, o.is_invariant), o)
+        obligations = list(unique.values())
+        add_stat("num_unique_obligations", len(obligations))
+
+        # expressions are hash-consed and may be shared among the obligations, so the
+        # invariant flag is kept next to each condition.
+        return [
+            (o.cond, o.is_invariant and check_invariants, o.label) for o in obligations
+        ]
+
+    def _check_bounded(
+        self, command_stmt, postcond_expr, unroll, unwinding_assertion, deepen, derive, check
+    ):
+        """Checks the command with its loops unrolled (see `MyProver.verify`)."""
+        proved = set()
+        self.stats["num_bmc_reused_conditions"] = 0
+        self.stats["bmc_complete"] = False
+        for depth in range(1, unroll + 1) if deepen else [unroll]:
+            self.stats["bmc_depth"] = depth
+            conditions = []
+            for c in derive(unroll_loops(command_stmt, depth), postcond_expr):
+                if c[0] in proved:
+                    self.stats["num_bmc_reused_conditions"] += 1
                 else:
-                    raise VerificationFailureError(
-                        f"Found a violoated condition: {z3_cond} - {model}"
+                    conditions.append(c)
+            check(conditions)
+            proved.update(cond for cond, _, _ in conditions)
+            if not unwinding_assertion:
+                continue
+            unwinding = derive(
+                unroll_loops(command_stmt, depth, unwinding_assertion=True),
+                LiteralExpr(BoolValue(True)),
+                kind="unwinding",
+            )
+            try:
+                check(unwinding)
+            except VerificationFailureError:
+                # a loop may iterate more often, which the next depth covers
+                if depth == unroll:
+                    raise
+            else:
+                self.stats["bmc_complete"] = True
+                return
+
+    def _check_conditions(
+        self,
+        backend,
+        background,
+        negated_conds,
+        conditions_to_be_proved,
+        workers,
+        timeout,
+        portfolio,
+        cache,
+        assumptions=(),
+        falsifier=None,
+        pool=None,
+    ):
+        # the results found in the cache, and the keys to store the others
+        cached = [None] * len(negated_conds)
+        if cache is not None:
+            z3_background = backend.to_z3(background)
+            keys = [
+                cache.key(
+                    backend.to_z3(cond)
+                    if z3.is_true(z3_background)
+                    else z3.And(z3_background, backend.to_z3(cond))
+                )
+                for cond in negated_conds
+            ]
+            cached = [cache.lookup(key) for key in keys]
+            self.stats["cache_hits"] = sum(r is not None for r in cached)
+            self.stats["cache_misses"] = len(cached) - self.stats["cache_hits"]
+        # the counterexample found without the solver; the conditions after the first
+        # refuted one are never checked, so the search stops there
+        falsified = [None] * len(negated_conds)
+        if falsifier is not None:
+            self.stats["falsified"] = None
+            for index, cond in enumerate(negated_conds):
+                if cached[index] is not None:
+                    continue
+                model = falsifier.search(background, cond)
+                if model is not None:
+                    falsified[index] = ("sat", model)
+                    self.stats["falsified"] = conditions_to_be_proved[index][2]
+                    break
+            self.stats["num_falsify_searches"] = falsifier.num_searches
+
+        def report(index, result, detail, store=True):
+            if store and cache is not None:
+                cache.store(keys[index], result, detail if result == "sat" else None)
+            if result == "unsat":
+                # the condition is only rendered into the message of a failure
+                return
+            _, is_expr_to_verify_invariant, label = conditions_to_be_proved[index]
+            _report_result(
+                result,
+                detail,
+                is_expr_to_verify_invariant,
+                label,
+                backend.render(negated_conds[index]),
+            )
+
+        if portfolio or pool is not None or (workers is not None and workers > 1):
+            unsolved = [
+                i
+                for i in range(len(negated_conds))
+                if cached[i] is None and falsified[i] is None
+            ]
+            z3_background = backend.to_z3(background)
+            smt2s = {
+                i: to_smt2(backend.to_z3(negated_conds[i]), z3_background)
+                for i in unsolved
+            }
+            if portfolio:
+                self.stats["strategies"] = [None] * len(negated_conds)
+            else:
+                results = discharge_in_parallel(
+                    [smt2s[i] for i in unsolved], workers, timeout=timeout, executor=pool
+                )
+                solved = dict(zip(unsolved, results))
+            for index in range(len(negated_conds)):
+                if cached[index] is not None:
+                    report(index, *cached[index], store=False)
+                elif falsified[index] is not None:
+                    report(index, *falsified[index])
+                elif portfolio:
+                    result, detail, strategy = race_portfolio(
+                        smt2s[index], portfolio, timeout
                     )
-            solver.pop()
+                    self.stats["strategies"][index] = strategy
+                    report(index, result, detail)
+                elif solved[index] is not None:
+                    # None if cancelled after an earlier condition has failed
+                    report(index, *solved[index])
+            return
 
-        return True
+        for index, cond in enumerate(negated_conds):
+            if cached[index] is not None:
+                report(index, *cached[index], store=False)
+            elif falsified[index] is not None:
+                report(index, *falsified[index])
+            elif assumptions:
+                result, detail = backend.check(cond, assumptions)
+                if result == "unsat":
+                    self.used_guards.update(backend.unsat_core())
+                report(index, result, detail)
+            else:
+                report(index, *backend.check(cond))
 
 
-def prove(func, varname2types=None, skip_inv=False):
+def prove(
+    func,
+    varname2types=None,
+    skip_inv=False,
+    engine="wp",
+    workers=None,
+    timeout=None,
+    portfolio=None,
+    proof_cache: ProofCache = None,
+    backend: SolverBackend = None,
+    track_conjuncts: bool = False,
+    falsify: bool = False,
+    unroll: int = None,
+    unwinding_assertion: bool = True,
+    deepen: bool = False,
+):
+    """Verifies a function decorated with `precondition` and `postcondition`.
+
+    Args:
+        func (callable): The function to verify.
+        varname2types (dict): A dictionary mapping the variable names to their types.
+        skip_inv (bool): See `skip_verification_of_invariant` of `MyProver.verify`.
+        engine (str): See `MyProver.verify`. Use "passive" for long straight-line code.
+        workers (int, optional): See `MyProver.verify`.
+        timeout (float, optional): See `MyProver.verify`.
+        portfolio (tuple, optional): See `MyProver.verify`.
+        proof_cache (ProofCache, optional): A cache of the outcomes keyed by the source,
+            the contracts and the types of the function (see `function_key`). On a hit,
+            the function is not verified again, and the outcome is returned or raised
+            with an empty prover whose `stats` records the hit.
+        backend (SolverBackend, optional): See `MyProver.verify`.
+        track_conjuncts (bool): See `MyProver.verify`.
+        falsify (bool): See `MyProver.verify`.
+        unroll (int, optional): See `MyProver.verify`.
+        unwinding_assertion (bool): See `MyProver.verify`.
+        deepen (bool): See `MyProver.verify`.
+
+    Returns:
+        tuple: True and the prover used.
+    """
     precond = getattr(func, "_precondition", "True")
     postcond = getattr(func, "_postcondition", "True")
-    code = inspect.getsource(func)
-    code = ("\n".join(code.split("\n")[2:])).lstrip()
+    lines, lineno = inspect.getsourcelines(func)
+    code = "".join(lines[2:]).lstrip()
+    if proof_cache is not None:
+        # the type map is extended by the type inference, so the key is taken first
+        key = function_key(
+            "".join(lines),
+            precond,
+            postcond,
+            varname2types,
+            skip_inv,
+            engine,
+            None if unroll is None else (unroll, unwinding_assertion),
+        )
+        outcome = proof_cache.lookup(key)
+        if outcome is not None:
+            prover = MyProver()
+            prover.register(func.__name__, varname2types)
+            prover.stats = {"proof_cache_hit": True}
+            status, message = outcome
+            if status == "verified":
+                return True, prover
+            raise PROOF_ERRORS[status](message)
     prover = MyProver()
     prover.register(func.__name__, varname2types)
-    return prover.verify(code, func.__name__, precond, postcond, skip_inv), prover
+    try:
+        verified = prover.verify(
+            code,
+            func.__name__,
+            precond,
+            postcond,
+            skip_inv,
+            engine=engine,
+            first_lineno=lineno + 2,
+            workers=workers,
+            timeout=timeout,
+            portfolio=portfolio,
+            backend=backend,
+            track_conjuncts=track_conjuncts,
+            falsify=falsify,
+            unroll=unroll,
+            unwinding_assertion=unwinding_assertion,
+            deepen=deepen,
+        )
+    except (InvalidInvariantError, VerificationFailureError) as e:
+        if proof_cache is not None:
+            proof_cache.store(key, type(e).__name__, str(e))
+        raise
+    if proof_cache is not None:
+        proof_cache.store(key, "verified")
+    return verified, prover
+
+
+async def prove_async(
+    func,
+    varname2types=None,
+    executor=None,
+    semaphore: asyncio.Semaphore = None,
+    **options,
+):
+    """Verifies a function like `prove` without blocking the event loop.
+
+    See `MyProver.verify_async` for the executor, the concurrency and the cancellation.
+
+    Args:
+        func (callable): The function to verify.
+        varname2types (dict): A dictionary mapping the variable names to their types.
+        executor (concurrent.futures.Executor, optional): The executor that runs the
+            verification. Defaults to the executor of the event loop.
+        semaphore (asyncio.Semaphore, optional): The semaphore that limits the
+            concurrent verifications. Defaults to `default_semaphore()`.
+        **options: The other keyword arguments of `prove`.
+
+    Returns:
+        tuple: True and the prover used.
+    """
+    if options.get("backend") is None:
+        options["backend"] = Z3Backend(True, z3.Context())
+    call = functools.partial(prove, func, varname2types, **options)
+    return await run_interruptibly(call, options["backend"], executor, semaphore)
@@ -0,0 +1,234 @@
+import functools
+import inspect
+import random
+import sys
+import threading
+
+from . import decorator
+from .claim import (
+    BinOpExpr,
+    ClaimParser,
+    LiteralExpr,
+    Op,
+    QuantificationExpr,
+    SliceExpr,
+    StoreExpr,
+    SubscriptExpr,
+    UnOpExpr,
+    VarExpr,
+)
+from .exception import ContractViolationError
+
+PYTHON_OPS = {
+    Op.Add: "+",
+    Op.Minus: "-",
+    Op.Mult: "*",
+    Op.Eq: "==",
+    Op.NEq: "!=",
+    Op.Lt: "<",
+    Op.Le: "<=",
+    Op.Gt: ">",
+    Op.Ge: ">=",
+    Op.And: "and",
+    Op.Or: "or",
+}
+
+
+def _div(a, b):
+    # the integer division of SMT-LIB, whose remainder is never negative
+    q = a // b if b > 0 else -(a // -b)
+    return q if a - b * q >= 0 else q + (1 if b < 0 else -1)
+
+
+def _mod(a, b):
+    return a - b * _div(a, b)
+
+
+def _store(a, i, v):
+    a = list(a)
+    a[i] = v
+    return a
+
+
+# the helpers that the generated code calls
+RUNTIME_GLOBALS = {
+    "__builtins__": {"abs": abs, "bool": bool},
+    "_div": _div,
+    "_mod": _mod,
+    "_store": _store,
+}
+
+
+def claim_to_python(expr):
+    """Generates the Python expression of a Claim expression.
+
+    The integer division and the remainder follow Z3, and every operation is
+    parenthesized, so comparisons are never chained.
+
+    Args:
+        expr (Expr): The expression.
+
+    Returns:
+        str: The source of the Python expression, which reads the variables of the
+            contract as free names and the helpers of `RUNTIME_GLOBALS`.
+
+    Raises:
+        NotImplementedError: If the expression has a quantifier or another operation
+            that cannot be evaluated at run time.
+    """
+    if isinstance(expr, LiteralExpr):
+        return repr(expr.value.v)
+    elif isinstance(expr, VarExpr):
+        return expr.name
+    elif isinstance(expr, SubscriptExpr):
+        return f"{claim_to_python(expr.var)}[{claim_to_python(expr.subscript)}]"
+    elif isinstance(expr, SliceExpr):
+        lower = "" if expr.lower is None else claim_to_python(expr.lower)
+        upper = "" if expr.upper is None else claim_to_python(expr.upper)
+        return f"{lower}:{upper}"
+    elif isinstance(expr, StoreExpr):
+        args = ", ".join(claim_to_python(e) for e in (expr.var, expr.index, expr.value))
+        return f"_store({args})"
+    elif isinstance(expr, UnOpExpr):
+        e = claim_to_python(expr.e)
+        if expr.op == Op.Not:
+            return f"(not {e})"
+        elif expr.op == Op.Minus:
+            return f"(-{e})"
+        elif expr.op == Op.Abs:
+            return f"abs({e})"
+    elif isinstance(expr, BinOpExpr):
+        e1, e2 = claim_to_python(expr.e1), claim_to_python(expr.e2)
+        if expr.op in PYTHON_OPS:
+            return f"({e1} {PYTHON_OPS[expr.op]} {e2})"
+        elif expr.op == Op.Div:
+            return f"_div({e1}, {e2})"
+        elif expr.op == Op.Mod:
+            return f"_mod({e1}, {e2})"
+        elif expr.op == Op.Implies:
+            return f"((not {e1}) or {e2})"
+        elif expr.op == Op.Iff:
+            return f"(bool({e1}) == bool({e2}))"
+    elif isinstance(expr, QuantificationExpr):
+        raise NotImplementedError("Quantifiers cannot be checked at run time")
+    raise NotImplementedError(f"`{expr}` cannot be checked at run time")
+
+
+@functools.lru_cache(maxsize=None)
+def compile_contract(contract: str):
+    """Compiles a contract into a code object, once per distinct text.
+
+    Args:
+        contract (str): The contract in the syntax of `ClaimParser`.
+
+    Returns:
+        code: The code object of the Python expression (see `claim_to_python`), to be
+            evaluated with `RUNTIME_GLOBALS` and the variables as locals.
+    """
+    source = claim_to_python(ClaimParser(contract).parse_expr())
+    return compile(source, f"<contract {contract}>", "eval")
+
+
+def check_contract(contract: str, variables, kind: str, name: str):
+    """Evaluates a contract and raises if it does not hold.
+
+    Raises:
+        ContractViolationError: If the contract evaluates to false.
+    """
+    if not eval(compile_contract(contract), RUNTIME_GLOBALS, variables):
+        names = sorted(n for n in compile_contract(contract).co_names if n in variables)
+        values = ", ".join(f"{n} = {variables[n]!r}" for n in names)
+        raise ContractViolationError(
+            f"The {kind} `{contract}` of `{name}` is violated: [{values}]"
+        )
+
+
+# the frames of the sampled calls running in each thread, by their ids
+_state = threading.local()
+
+
+def _active_frames():
+    if not hasattr(_state, "frames"):
+        _state.frames = {}
+    return _state.frames
+
+
+def _check_invariant(cond):
+    # the frame of the function that called `invariant`
+    frame = sys._getframe(2)
+    entry = _active_frames().get(id(frame))
+    if entry is not None and entry[0] is frame:
+        kind = f"invariant at line {frame.f_lineno}"
+        check_contract(cond, frame.f_locals, kind, entry[1])
+
+
+def checked(func=None, *, sample_rate: float = 1.0, seed=None):
+    """Checks the contracts of a function whenever it is called, opting in to run time.
+
+    It must be the outermost decorator, above `precondition` and `postcondition`. The
+    contracts are compiled into code objects once, when the function is decorated
+    (see `compile_contract`). A sampled call evaluates the precondition on the
+    arguments at entry, each `invariant` at the head of its loop, that is, where it
+    is called, and the postcondition on the local variables when the function
+    returns. The other calls run the function as it is. While a sampled call runs,
+    it uses `sys.setprofile` of its thread to read the local variables at the exit.
+
+    Args:
+        func (callable, optional): The function, if used without arguments.
+        sample_rate (float): The fraction of the calls that are checked.
+        seed (optional): The seed of the random choice of the sampled calls.
+
+    Returns:
+        callable: The function that checks the contracts.
+
+    Raises:
+        ContractViolationError: If a contract does not hold in a sampled call.
+    """
+    if func is None:
+        return functools.partial(checked, sample_rate=sample_rate, seed=seed)
+    precond = getattr(func, "_precondition", "True")
+    postcond = getattr(func, "_postcondition", "True")
+    # the contracts are compiled now, so that an unsupported one fails here
+    compile_contract(precond)
+    compile_contract(postcond)
+    decorator._invariant_hook = _check_invariant
+    signature = inspect.signature(func)
+    code = func.__code__
+    name = func.__qualname__
+    rng = random.Random(seed)
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if sample_rate < 1 and rng.random() >= sample_rate:
+            return func(*args, **kwargs)
+        wrapper.num_checked_calls += 1
+        arguments = signature.bind(*args, **kwargs)
+        arguments.apply_defaults()
+        check_contract(precond, arguments.arguments, "precondition", name)
+
+        frames = _active_frames()
+        captured = {}
+
+        def profile(frame, event, arg):
+            # the first frame of the function is this call, and the others are
+            # recursive calls through other references of the function
+            if event == "call" and frame.f_code is code and "frame" not in captured:
+                captured["frame"] = frame
+                frames[id(frame)] = (frame, name)
+            elif event == "return" and frame is captured.get("frame"):
+                captured["locals"] = dict(frame.f_locals)
+                del frames[id(frame)]
+
+        previous = sys.getprofile()
+        sys.setprofile(profile)
+        try:
+            result = func(*args, **kwargs)
+        finally:
+            sys.setprofile(previous)
+            if "frame" in captured:
+                frames.pop(id(captured["frame"]), None)
+        check_contract(postcond, captured["locals"], "postcondition", name)
+        return result
+
+    wrapper.num_checked_calls = 0
+    return wrapper
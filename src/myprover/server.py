@@ -0,0 +1,296 @@
+import ast
+import json
+import os
+import socket
+import socketserver
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from .batch import (
+    FunctionTarget,
+    VerificationReport,
+    annotation_types,
+    collect_files,
+    collect_functions,
+    parse_types,
+    verify_targets,
+)
+from .cache import ProofCache
+
+# the options of `verify_target` that a job may set
+JOB_OPTIONS = (
+    "skip_inv",
+    "engine",
+    "split",
+    "simplify_vc",
+    "slice_program",
+    "timeout",
+    "function_timeout",
+)
+
+
+def default_socket_path():
+    """Returns the path of the socket of the daemon of the current user.
+
+    Returns:
+        str: `$MYPROVER_SOCKET` if set, otherwise a file in the temporary directory.
+    """
+    path = os.environ.get("MYPROVER_SOCKET")
+    if path:
+        return path
+    return os.path.join(tempfile.gettempdir(), f"myprover-{os.getuid()}.sock")
+
+
+def _warm_up():
+    # the solver and the prover are imported when the worker starts, not by the first job
+    import myprover.prover  # noqa: F401
+
+
+def job_targets(job: dict):
+    """Finds the functions to verify in a job.
+
+    A job either carries a module as `source`, whose decorated functions are verified
+    with the side table of types `types` (see `collect_functions`), or one function
+    whose contracts are given as `precondition` and `postcondition`, and whose types
+    are given as `types` mapping its variable names to type names.
+
+    Args:
+        job (dict): The job as decoded from JSON.
+
+    Returns:
+        list: The `FunctionTarget` of each function.
+
+    Raises:
+        ValueError: If the job has no function or an unknown type.
+    """
+    source = job["source"]
+    filename = job.get("filename", "<unknown>")
+    if "precondition" not in job and "postcondition" not in job:
+        return collect_functions(source, filename, parse_types(job.get("types", {})))
+    tree = ast.parse(source, filename)
+    nodes = [node for node in tree.body if isinstance(node, ast.FunctionDef)]
+    if not nodes:
+        raise ValueError("The source of the job defines no function")
+    node = nodes[0]
+    varname2types = annotation_types(node)
+    varname2types.update(parse_types({node.name: job.get("types", {})})[node.name])
+    return [
+        FunctionTarget(
+            node.name,
+            filename,
+            node,
+            job.get("precondition", "True"),
+            job.get("postcondition", "True"),
+            varname2types,
+            source,
+        )
+    ]
+
+
+class VerificationHandler(socketserver.StreamRequestHandler):
+    """Answers the JSON lines of one connection with one JSON line each."""
+
+    def handle(self):
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            request = {}
+            try:
+                decoded = json.loads(line)
+                if not isinstance(decoded, dict):
+                    raise ValueError("A request must be a JSON object")
+                request = decoded
+                response = self.server.dispatch(request)
+            except Exception as e:
+                response = {"error": f"{type(e).__name__}: {e}"}
+            if "id" in request:
+                response["id"] = request["id"]
+            self.wfile.write((json.dumps(response) + "\n").encode())
+            self.wfile.flush()
+            if request.get("command") == "shutdown":
+                # `shutdown` waits for `serve_forever`, which runs in another thread
+                threading.Thread(target=self.server.shutdown).start()
+                return
+
+
+class VerificationServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """A daemon that verifies jobs sent over a Unix socket as JSON lines.
+
+    The pool of worker processes, which have imported the prover and Z3 already, and
+    the proof cache are kept across jobs and connections, so a job pays neither the
+    startup of Python nor the import of the solver. Each line of a connection is a
+    request, answered by one line:
+
+    - a job (see `job_targets`), with optional `options` among `JOB_OPTIONS`, answered
+      by the `VerificationReport.to_dict` of its functions;
+    - `{"command": "stats"}`, answered by the counters of the daemon;
+    - `{"command": "shutdown"}`, which stops the daemon once it has answered.
+
+    A request may carry an `id`, which is copied to its answer. An answer to a request
+    that could not be handled has an `error` instead.
+
+    Args:
+        path (str): The path of the socket, which is removed first if it exists.
+        workers (int, optional): The number of worker processes. Defaults to the number
+            of CPUs.
+        proof_cache (ProofCache, optional): The cache of the outcomes of the functions.
+            Defaults to an in-memory `ProofCache`.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, path: str, workers: int = None, proof_cache: ProofCache = None):
+        if os.path.exists(path):
+            os.unlink(path)
+        super().__init__(path, VerificationHandler)
+        self.path = path
+        self.proof_cache = proof_cache if proof_cache is not None else ProofCache()
+        workers = workers or os.cpu_count() or 1
+        self.executor = ProcessPoolExecutor(max_workers=workers, initializer=_warm_up)
+        # the workers are started now rather than by the first job
+        for future in [self.executor.submit(time.sleep, 0) for _ in range(workers)]:
+            future.result()
+        self.started = time.time()
+        self.num_jobs = 0
+        self.num_functions = 0
+        self.lock = threading.Lock()
+
+    def dispatch(self, request: dict):
+        command = request.get("command", "verify")
+        if command == "verify":
+            return self.verify(request)
+        elif command == "stats":
+            return self.stats()
+        elif command == "shutdown":
+            return {"stopping": True}
+        raise ValueError(f"Unknown command `{command}`")
+
+    def verify(self, job: dict):
+        targets = job_targets(job)
+        options = job.get("options", {})
+        unknown = set(options) - set(JOB_OPTIONS)
+        if unknown:
+            raise ValueError(f"Unknown options {sorted(unknown)}")
+        report = verify_targets(
+            targets, proof_cache=self.proof_cache, executor=self.executor, **options
+        )
+        with self.lock:
+            self.num_jobs += 1
+            self.num_functions += len(targets)
+        return report.to_dict()
+
+    def stats(self):
+        return {
+            "pid": os.getpid(),
+            "uptime": time.time() - self.started,
+            "num_jobs": self.num_jobs,
+            "num_functions": self.num_functions,
+            "proof_cache_hits": self.proof_cache.hits,
+            "proof_cache_misses": self.proof_cache.misses,
+        }
+
+    def server_close(self):
+        super().server_close()
+        self.executor.shutdown(cancel_futures=True)
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+
+def serve(path: str = None, workers: int = None, cache_directory: str = None):
+    """Runs a `VerificationServer` until it is shut down.
+
+    Args:
+        path (str, optional): The path of the socket. Defaults to
+            `default_socket_path()`.
+        workers (int, optional): The number of worker processes.
+        cache_directory (str, optional): The directory of a persistent proof cache.
+    """
+    proof_cache = ProofCache(directory=cache_directory)
+    server = VerificationServer(path or default_socket_path(), workers, proof_cache)
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+
+
+class VerificationClient:
+    """A connection to a `VerificationServer`.
+
+    Args:
+        path (str, optional): The path of the socket. Defaults to
+            `default_socket_path()`.
+        timeout (float, optional): The time limit of each answer in seconds.
+    """
+
+    def __init__(self, path: str = None, timeout: float = None):
+        self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.socket.settimeout(timeout)
+        self.socket.connect(path or default_socket_path())
+        self.file = self.socket.makefile("rwb")
+        self.num_requests = 0
+
+    def request(self, request: dict):
+        """Sends a request and waits for its answer.
+
+        Args:
+            request (dict): The request, such as a job or a command.
+
+        Returns:
+            dict: The answer.
+
+        Raises:
+            RuntimeError: If the daemon could not handle the request.
+        """
+        self.num_requests += 1
+        request = dict(request, id=self.num_requests)
+        self.file.write((json.dumps(request) + "\n").encode())
+        self.file.flush()
+        line = self.file.readline()
+        if not line:
+            raise RuntimeError("The daemon closed the connection")
+        response = json.loads(line)
+        if "error" in response:
+            raise RuntimeError(response["error"])
+        return response
+
+    def verify_files(self, paths: list, types: dict = None, **options):
+        """Sends the Python files of files and directories as jobs, one per file.
+
+        Args:
+            paths (list): The paths of the files and the directories (see
+                `collect_files`).
+            types (dict, optional): The side table of types with type names, as
+                `parse_types` takes it.
+            **options: The options of the jobs among `JOB_OPTIONS`.
+
+        Returns:
+            VerificationReport: The outcomes of all files.
+        """
+        start = time.perf_counter()
+        results = []
+        for filename in collect_files(paths):
+            with open(filename, encoding="utf-8") as f:
+                source = f.read()
+            job = {"source": source, "filename": filename, "types": types or {}}
+            if options:
+                job["options"] = options
+            results.extend(VerificationReport.from_dict(self.request(job)).results)
+        return VerificationReport(results, time.perf_counter() - start)
+
+    def stats(self):
+        return self.request({"command": "stats"})
+
+    def shutdown(self):
+        return self.request({"command": "shutdown"})
+
+    def close(self):
+        self.file.close()
+        self.socket.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,142 @@
+from .claim import (
+    AssertStmt,
+    AssignStmt,
+    AssumeStmt,
+    CompoundStmt,
+    Expr,
+    HavocStmt,
+    IfElseStmt,
+    SkipStmt,
+    Stmt,
+    VarExpr,
+    WhileStmt,
+    collect_all_varnames,
+    flatten_seq,
+)
+
+
+def count_stmts(stmt: Stmt):
+    """Count the basic statements, if-statements and while-loops of a statement.
+
+    Args:
+        stmt (Stmt): The statement to count.
+
+    Returns:
+        int: The number of statements, not counting sequences and skips.
+    """
+    count, stack = 0, [stmt]
+    while stack:
+        s = stack.pop()
+        if isinstance(s, CompoundStmt):
+            stack.extend((s.s1, s.s2))
+        elif isinstance(s, IfElseStmt):
+            count += 1
+            stack.extend((s.then_branch, s.else_branch))
+        elif isinstance(s, WhileStmt):
+            count += 1
+            stack.append(s.body)
+        elif not isinstance(s, SkipStmt):
+            count += 1
+    return count
+
+
+def collect_observed_varnames(stmt: Stmt):
+    """Collect the variables that the obligations of a statement observe directly.
+
+    These are the variables of the loop conditions and invariants and of the
+    assert and assume statements.
+
+    Args:
+        stmt (Stmt): The statement to traverse.
+
+    Returns:
+        set: A set of variable names.
+    """
+    exprs, stack = [], [stmt]
+    while stack:
+        s = stack.pop()
+        if isinstance(s, CompoundStmt):
+            stack.extend((s.s1, s.s2))
+        elif isinstance(s, IfElseStmt):
+            stack.extend((s.then_branch, s.else_branch))
+        elif isinstance(s, WhileStmt):
+            exprs.append(s.cond)
+            if s.invariant is not None:
+                exprs.append(s.invariant)
+            stack.append(s.body)
+        elif isinstance(s, AssertStmt) or isinstance(s, AssumeStmt):
+            exprs.append(s.e)
+    return collect_all_varnames(exprs)
+
+
+def _slice(stmt: Stmt, relevant: set):
+    """Slices `stmt` backwards with respect to the variables `relevant` after it.
+
+    Returns:
+        tuple: The sliced statement and the relevant variables before it.
+    """
+    if isinstance(stmt, AssignStmt):
+        if isinstance(stmt.var, VarExpr):
+            if stmt.var.name not in relevant:
+                return SkipStmt(), relevant
+            return stmt, (relevant - {stmt.var.name}) | collect_all_varnames(
+                [stmt.expr]
+            )
+        # an element of an array is updated, so the array itself stays relevant
+        if not collect_all_varnames([stmt.var.var]) & relevant:
+            return SkipStmt(), relevant
+        return stmt, relevant | collect_all_varnames([stmt.var, stmt.expr])
+    elif isinstance(stmt, HavocStmt):
+        if stmt.var_name not in relevant:
+            return SkipStmt(), relevant
+        return stmt, relevant - {stmt.var_name}
+    elif isinstance(stmt, AssertStmt) or isinstance(stmt, AssumeStmt):
+        return stmt, relevant | collect_all_varnames([stmt.e])
+    elif isinstance(stmt, CompoundStmt):
+        sliced = SkipStmt()
+        for s in reversed(flatten_seq(stmt)):
+            s, relevant = _slice(s, relevant)
+            if isinstance(sliced, SkipStmt):
+                sliced = s
+            elif not isinstance(s, SkipStmt):
+                sliced = CompoundStmt(s, sliced)
+        return sliced, relevant
+    elif isinstance(stmt, IfElseStmt):
+        st, rt = _slice(stmt.then_branch, relevant)
+        se, re = _slice(stmt.else_branch, relevant)
+        if isinstance(st, SkipStmt) and isinstance(se, SkipStmt):
+            return SkipStmt(), relevant
+        return (
+            IfElseStmt(stmt.cond, st, se, stmt.lineno),
+            rt | re | collect_all_varnames([stmt.cond]),
+        )
+    elif isinstance(stmt, WhileStmt):
+        # the variables relevant at the loop head are a fixpoint over the body
+        relevant = relevant | collect_observed_varnames(stmt)
+        while True:
+            body, relevant_body = _slice(stmt.body, relevant)
+            if relevant_body <= relevant:
+                break
+            relevant = relevant | relevant_body
+        return WhileStmt(stmt.invariant, stmt.cond, body, stmt.lineno), relevant
+    return SkipStmt(), relevant
+
+
+def slice_stmt(stmt: Stmt, post_condition: Expr):
+    """Removes the statements that cannot affect the verification of a command.
+
+    The slice is the backward cone of influence of the variables of the post_condition
+    and of `collect_observed_varnames`: an assignment is kept only if its target may be
+    read later by a kept statement, a branch condition of a kept statement, or one of
+    these expressions. Every obligation of the sliced command is therefore the same as
+    that of the original command up to the removed assignments to unobserved variables.
+
+    Args:
+        stmt (Stmt): The command to be sliced.
+        post_condition (Expr): The post-condition of the command.
+
+    Returns:
+        Stmt: The sliced command.
+    """
+    relevant = collect_all_varnames([post_condition]) | collect_observed_varnames(stmt)
+    return _slice(stmt, relevant)[0]
@@ -22,6 +22,8 @@ from .claim import (
     VarExpr,
     WhileStmt,
     SubscriptExpr,
+    flatten_seq,
+    map_seq,
 )
 
 
@@ -42,7 +44,7 @@ def check_and_update_varname2type(
     Raises:
         TypeError: If there is a type mismatch between actual and expected types.
     """
-    if actual == None and isinstance(expr.e, VarExpr):
+    if actual == None and isinstance(expr, VarExpr):
         env_varname2type[expr.name] = expected
         return expected, True
     elif actual == expected:
@@ -87,7 +89,8 @@ def resolve_expr_type(
         else:
             raise NotImplementedError(f"{type(expr.value)} is not supported")
     elif isinstance(expr, SubscriptExpr):
-        return typing.get_args(env_varname2type[expr.var.name])[0], False
+        array_type, _ = resolve_expr_type(env_varname2type, expr.var)
+        return typing.get_args(array_type)[0], False
     elif isinstance(expr, VarExpr):
         if env_varname2type is not None and expr.name in env_varname2type:
             return env_varname2type[expr.name], False
@@ -198,7 +201,8 @@ def resolve_expr_type(
             raise TypeError(
                 f"Type of the variable `{expr.var.name}` cannot be inffered"
             )
-        expr.var_type = env_varname2type[expr.var.name]
+        # the node is shared by every equal quantifier, so the inferred type is only
+        # filled in by `annotate_quantifier_types`, which rebuilds the node
         env_varname2type.pop(expr.var.name)
         return bool, True
 
@@ -222,12 +226,20 @@ def resolve_stmt_type(env_varname2type: dict[str, type], stmt: Stmt) -> bool:
     if isinstance(stmt, SkipStmt):
         return False
     elif isinstance(stmt, CompoundStmt):
-        isupdated_s1 = resolve_stmt_type(env_varname2type, stmt.s1)
-        isupdated_s2 = resolve_stmt_type(env_varname2type, stmt.s2)
-        return isupdated_s1 or isupdated_s2
+        isupdated = False
+        for s in flatten_seq(stmt):
+            isupdated = resolve_stmt_type(env_varname2type, s) or isupdated
+        return isupdated
     elif isinstance(stmt, AssignStmt):
         type_of_expr, isupdated = resolve_expr_type(env_varname2type, stmt.expr)
         var_name = stmt.var.name if isinstance(stmt.var, VarExpr) else stmt.var.var.name
+        if (
+            isinstance(stmt.var, SubscriptExpr)
+            and var_name not in env_varname2type
+            and var_name.split("#")[0] in env_varname2type
+        ):
+            # forked arrays share the type of the original array
+            var_name = var_name.split("#")[0]
         if var_name not in env_varname2type:
             env_varname2type[var_name] = type_of_expr
             return True
@@ -284,3 +296,98 @@ def resolve_stmt_type(env_varname2type: dict[str, type], stmt: Stmt) -> bool:
     elif isinstance(stmt, HavocStmt):
         return False
     raise NotImplementedError(f"{type(stmt)} is not supported")
+
+
+def annotate_quantifier_types(env_varname2type: dict[str, type], expr: Expr) -> Expr:
+    """Fill in the types of the quantified variables of an expression.
+
+    Expressions are hash-consed, so a quantifier is one node shared by every place
+    where it occurs, possibly in other scopes. The inferred type is therefore never
+    assigned to the node; the quantifier is rebuilt with it instead, and the nodes
+    without quantifiers below them are returned as they are.
+
+    Args:
+        env_varname2type (dict): The type environment dictionary, which is not updated.
+        expr (Expr): The expression, whose free variables are already resolved.
+
+    Returns:
+        Expr: The expression with the types of all its quantified variables.
+
+    Raises:
+        TypeError: If the type of a quantified variable cannot be inferred.
+    """
+    memo = {}
+    stack = [expr]
+    while stack:
+        e = stack[-1]
+        if id(e) in memo:
+            stack.pop()
+            continue
+        if isinstance(e, QuantificationExpr):
+            stack.pop()
+            env = dict(env_varname2type)
+            env[e.var.name] = e.var_type
+            actual, _ = resolve_expr_type(env, e.expr)
+            check_and_update_varname2type(e.expr, actual, bool, env)
+            if env[e.var.name] is None:
+                raise TypeError(f"Type of the variable `{e.var.name}` cannot be inffered")
+            memo[id(e)] = QuantificationExpr(
+                e.quantifier,
+                e.var,
+                annotate_quantifier_types(env, e.expr),
+                env[e.var.name],
+                e.bounded,
+            )
+            continue
+        operands = e._operands()
+        pending = [c for c in operands if id(c) not in memo]
+        if pending:
+            stack.extend(pending)
+            continue
+        stack.pop()
+        new_operands = [memo[id(c)] for c in operands]
+        if all(n is o for n, o in zip(new_operands, operands)):
+            memo[id(e)] = e
+        else:
+            memo[id(e)] = e._rebuild(new_operands)
+    return memo[id(expr)]
+
+
+def annotate_stmt_quantifier_types(env_varname2type: dict[str, type], stmt: Stmt) -> Stmt:
+    """Fill in the types of the quantified variables of every expression of a statement.
+
+    See `annotate_quantifier_types`.
+
+    Args:
+        env_varname2type (dict): The type environment dictionary, which is not updated.
+        stmt (Stmt): The statement, whose variables are already resolved.
+
+    Returns:
+        Stmt: The statement with the types of all its quantified variables.
+    """
+
+    def annotate(e):
+        return e if e is None else annotate_quantifier_types(env_varname2type, e)
+
+    def rewrite(s):
+        # the statements without quantifiers are kept as they are
+        if isinstance(s, (AssertStmt, AssumeStmt)):
+            e = annotate(s.e)
+            return s if e is s.e else type(s)(e)
+        elif isinstance(s, IfElseStmt):
+            return IfElseStmt(
+                annotate(s.cond),
+                map_seq(s.then_branch, rewrite),
+                map_seq(s.else_branch, rewrite),
+                s.lineno,
+            )
+        elif isinstance(s, WhileStmt):
+            return WhileStmt(
+                annotate(s.invariant),
+                annotate(s.cond),
+                map_seq(s.body, rewrite),
+                s.lineno,
+            )
+        return s
+
+    return map_seq(stmt, rewrite)
@@ -18,6 +18,7 @@ from .claim import (
     QuantificationExpr,
     SkipStmt,
     SliceExpr,
+    StoreExpr,
     SubscriptExpr,
     UnOpExpr,
     VarExpr,
@@ -156,7 +157,7 @@ class PyToClaim(ast.NodeVisitor):
         cond = self.visit(node.test)
         then_branch = self.walk_seq(node.body)
         rb = self.walk_seq(node.orelse)
-        return IfElseStmt(cond, then_branch, rb)
+        return IfElseStmt(cond, then_branch, rb, node.lineno)
 
     def visit_While(self, node):
         cond = self.visit(node.test)
@@ -182,7 +183,7 @@ class PyToClaim(ast.NodeVisitor):
             )
         )
 
-        return WhileStmt(reduced_invariant, cond, body)
+        return WhileStmt(reduced_invariant, cond, body, node.lineno)
 
     def visit_Assert(self, node):
         return AssertStmt(self.visit(node.test))
@@ -209,6 +210,14 @@ class PyToDPClaim(PyToClaim):
     def __init__(self, forked_vanames=set()):
         super().__init__()
         self.forked_varnames = forked_vanames
+        self.fork_mapping_1 = {VarExpr(vn): VarExpr(vn + "#1") for vn in forked_vanames}
+        self.fork_mapping_2 = {VarExpr(vn): VarExpr(vn + "#2") for vn in forked_vanames}
+
+    def fork(self, e):
+        return (
+            e.substitute(self.fork_mapping_1),
+            e.substitute(self.fork_mapping_2),
+        )
 
     def visit_Call(self, node):
         if node.func.id == "assume":
@@ -217,11 +226,7 @@ class PyToDPClaim(PyToClaim):
             return ClaimParser(node.args[0].s).parse_expr()
         elif node.func.id == "laplace":
             e = self.visit(node.args[0])
-            e_1 = e.clone()
-            e_2 = e.clone()
-            for vn in self.forked_varnames:
-                e_1 = e_1.assign_variable(VarExpr(vn), VarExpr(vn + "#1"))
-                e_2 = e_2.assign_variable(VarExpr(vn), VarExpr(vn + "#2"))
+            e_1, e_2 = self.fork(e)
             return DPAssignStmt(
                 VarExpr("v_eps#"),
                 BinOpExpr(
@@ -238,27 +243,19 @@ class PyToDPClaim(PyToClaim):
     def visit_If(self, node):
         cond = self.visit(node.test)
 
-        cond_1 = cond.clone()
-        cond_2 = cond.clone()
-        for vn in self.forked_varnames:
-            cond_1 = cond_1.assign_variable(VarExpr(vn), VarExpr(vn + "#1"))
-            cond_2 = cond_2.assign_variable(VarExpr(vn), VarExpr(vn + "#2"))
+        cond_1, cond_2 = self.fork(cond)
 
         then_branch = self.walk_seq(node.body)
         rb = self.walk_seq(node.orelse)
         return CompoundStmt(
             AssertStmt(BinOpExpr(cond_1, Op.Iff, cond_2)),
-            IfElseStmt(cond_1, then_branch, rb),
+            IfElseStmt(cond_1, then_branch, rb, node.lineno),
         )
 
     def visit_While(self, node):
         cond = self.visit(node.test)
 
-        cond_1 = cond.clone()
-        cond_2 = cond.clone()
-        for vn in self.forked_varnames:
-            cond_1 = cond_1.assign_variable(VarExpr(vn), VarExpr(vn + "#1"))
-            cond_2 = cond_2.assign_variable(VarExpr(vn), VarExpr(vn + "#2"))
+        cond_1, cond_2 = self.fork(cond)
 
         invariants = [self.visit_Call(x.value) for x in filter(is_invariant, node.body)]
         reduced_invariant = (
@@ -284,7 +281,7 @@ class PyToDPClaim(PyToClaim):
 
         return CompoundStmt(
             AssertStmt(BinOpExpr(cond_1, Op.Iff, cond_2)),
-            WhileStmt(reduced_invariant, cond_1, body),
+            WhileStmt(reduced_invariant, cond_1, body, node.lineno),
         )
 
     def visit_Assert(self, node):
@@ -298,22 +295,10 @@ class PyToDPClaim(PyToClaim):
             left_varname = node.targets[0].id
 
         right_expr = self.visit(node.value)
-        right_expr_1 = right_expr.clone()
-        right_expr_2 = right_expr.clone()
-        for vn in self.forked_varnames:
-            right_expr_1 = right_expr_1.assign_variable(VarExpr(vn), VarExpr(vn + "#1"))
-            right_expr_2 = right_expr_2.assign_variable(VarExpr(vn), VarExpr(vn + "#2"))
+        right_expr_1, right_expr_2 = self.fork(right_expr)
 
         if isinstance(node.targets[0], ast.Subscript):
-            left_expr_1 = left_expr.clone()
-            left_expr_2 = left_expr.clone()
-            for vn in self.forked_varnames:
-                left_expr_1 = left_expr_1.assign_variable(
-                    VarExpr(vn), VarExpr(vn + "#1")
-                )
-                left_expr_2 = left_expr_2.assign_variable(
-                    VarExpr(vn), VarExpr(vn + "#2")
-                )
+            left_expr_1, left_expr_2 = self.fork(left_expr)
 
             if isinstance(right_expr, DPAssignStmt):
                 return CompoundStmt(
@@ -343,12 +328,116 @@ class PyToDPClaim(PyToClaim):
                 )
 
 
+def make_z3_variable(varname: str, t: type, ctx=None):
+    if t == int:
+        return z3.Int(varname, ctx)
+    elif t == bool:
+        return z3.Bool(varname, ctx)
+    elif t == list[int]:
+        return z3.Array(varname, z3.IntSort(ctx), z3.IntSort(ctx))
+    return None
+
+
+def claim_operands(expr):
+    if isinstance(expr, BinOpExpr):
+        return (expr.e1, expr.e2)
+    elif isinstance(expr, UnOpExpr):
+        return (expr.e,)
+    elif isinstance(expr, QuantificationExpr):
+        return (expr.expr,)
+    elif isinstance(expr, SubscriptExpr):
+        return (expr.var, expr.subscript)
+    elif isinstance(expr, StoreExpr):
+        return (expr.var, expr.index, expr.value)
+    return ()
+
+
 class ClaimToZ3:
-    def __init__(self, name_dict, array_length_dict=dict()):
+    """Converts Claim expressions into Z3 expressions.
+
+    Args:
+        name_dict (dict): A dictionary mapping variable names to Z3 constants. The
+            constants created by `declare` and the quantified variables are added.
+        array_length_dict (dict): A dictionary mapping array names to their lengths.
+        declare (callable, optional): A function that returns the Z3 constant of a
+            variable missing from `name_dict` when it is first referenced, or None
+            if it is unknown.
+        memoize (bool): If true, the Z3 expressions of all converted nodes are kept
+            across calls of `visit`, keyed by the structural equality of expressions,
+            so subterms shared among the conditions of one verification are converted
+            once.
+        ctx (z3.Context, optional): The context of the Z3 expressions. Defaults to the
+            main context.
+
+    Attributes:
+        hits (int): The number of nodes found in the memo.
+        misses (int): The number of nodes converted and stored in the memo.
+    """
+
+    def __init__(
+        self, name_dict, array_length_dict=dict(), declare=None, memoize=False, ctx=None
+    ):
         self.name_dict = name_dict
         self.array_length_dict = array_length_dict
+        self.declare = declare
+        self.memo = {} if memoize else None
+        self.ctx = ctx if ctx is not None else z3.main_ctx()
+        self.hits = 0
+        self.misses = 0
+        self.converted = None
 
     def visit(self, expr):
+        """Convert a Claim expression into a Z3 expression.
+
+        The expression is walked bottom-up with an explicit stack, and the converted
+        operands are kept for the duration of the outermost call, so the `visit_*`
+        methods find the Z3 expressions of their operands without recursing.
+
+        Args:
+            expr (Expr): The expression to convert.
+
+        Returns:
+            The Z3 expression.
+        """
+        outermost = self.converted is None
+        if outermost:
+            self.converted = {}
+        try:
+            stack = [expr]
+            while stack:
+                e = stack[-1]
+                if id(e) in self.converted:
+                    stack.pop()
+                    continue
+                # variables are looked up in `name_dict` instead, which the quantifiers
+                # update
+                memoized = self.memo is not None and not isinstance(e, VarExpr)
+                if memoized and e in self.memo:
+                    self.hits += 1
+                    stack.pop()
+                    self.converted[id(e)] = self.memo[e]
+                    continue
+                pending = [c for c in self.operands(e) if id(c) not in self.converted]
+                if pending:
+                    if isinstance(e, QuantificationExpr):
+                        # the bound variable must be known before its body is converted
+                        self.declare_quantified_var(e)
+                    stack.extend(pending)
+                    continue
+                stack.pop()
+                self.converted[id(e)] = self.visit_node(e)
+                if memoized:
+                    self.misses += 1
+                    self.memo[e] = self.converted[id(e)]
+            return self.converted[id(expr)]
+        finally:
+            if outermost:
+                self.converted = None
+
+    def operands(self, expr):
+        return claim_operands(expr)
+
+    def visit_node(self, expr):
         if isinstance(expr, LiteralExpr):
             return self.visit_Literal(expr)
         elif isinstance(expr, VarExpr):
@@ -361,27 +450,37 @@ class ClaimToZ3:
             return self.visit_Quantification(expr)
         elif isinstance(expr, SubscriptExpr):
             return self.visit_Subscript(expr)
+        elif isinstance(expr, StoreExpr):
+            return self.visit_Store(expr)
         else:
             raise NotImplementedError(f"`{type(expr)} is not supported")
 
     def visit_Literal(self, node):
         return node.value.v
 
+    def lookup_var(self, varname):
+        if varname not in self.name_dict and self.declare is not None:
+            z3_var = self.declare(varname)
+            if z3_var is not None:
+                self.name_dict[varname] = z3_var
+        return self.name_dict.get(varname)
+
     def visit_Var(self, node):
-        if node.name in self.name_dict:
-            return self.name_dict[node.name]
-        elif node.name.split("#")[0] in self.name_dict:
-            return self.name_dict[node.name.split("#")[0]]
-        else:
+        z3_var = self.lookup_var(node.name)
+        if z3_var is None:
+            z3_var = self.lookup_var(node.name.split("#")[0])
+        if z3_var is None:
             raise KeyError(f"{node.name} is unkonwn in name_dict when converting Claim to Z3")
+        return z3_var
         # return self.name_dict[node.name]
 
     def visit_Subscript(self, node):
-        if str(node.subscript) not in node.assign:
-            return z3.Select(self.name_dict[node.var.name], self.visit(node.subscript))
-        else:
-            print(11111111111111)
-            return self.visit(node.assign[str(node.subscript)])
+        return z3.Select(self.visit(node.var), self.visit(node.subscript))
+
+    def visit_Store(self, node):
+        return z3.Store(
+            self.visit(node.var), self.visit(node.index), self.visit(node.value)
+        )
 
     def visit_BinOp(self, node):
         c1 = self.visit(node.e1)
@@ -398,17 +497,19 @@ class ClaimToZ3:
         elif node.op == Op.Mod:
             return c1 % c2
         elif node.op == Op.And:
-            return z3.And(c1, c2)
+            return z3.And(c1, c2, self.ctx)
         elif node.op == Op.Or:
-            return z3.Or(c1, c2)
+            return z3.Or(c1, c2, self.ctx)
         elif node.op == Op.Implies:
-            return z3.Implies(c1, c2)
+            return z3.Implies(c1, c2, self.ctx)
         elif node.op == Op.Iff:
-            return z3.And(z3.Implies(c1, c2), z3.Implies(c2, c1))
+            return z3.And(
+                z3.Implies(c1, c2, self.ctx), z3.Implies(c2, c1, self.ctx), self.ctx
+            )
         elif node.op == Op.Eq:
             return c1 == c2
         elif node.op == Op.NEq:
-            return z3.Not(c1 == c2)
+            return z3.Not(c1 == c2, self.ctx)
         elif node.op == Op.Gt:
             return c1 > c2
         elif node.op == Op.Ge:
@@ -420,7 +521,7 @@ class ClaimToZ3:
         elif node.op == Op.Adj:
             length = self.array_length_dict[str(c1)]
             conds = []
-            indices = [z3.Int(f'@i_{i}') for i in range(length)]
+            indices = [z3.Int(f'@i_{i}', self.ctx) for i in range(length)]
             for i in indices:
                 conds.append(z3.And(0 <= i, i < length))
             difference_count = z3.Sum([z3.If(c1[i] != c2[i], 1, 0) for i in indices])
@@ -437,20 +538,188 @@ class ClaimToZ3:
         if node.op == Op.Minus:
             return -c
         elif node.op == Op.Not:
-            return z3.Not(c)
+            return z3.Not(c, self.ctx)
         elif node.op == Op.Abs:
             return z3.If(c > 0, c, -c)
         else:
             raise NotImplementedError(f"{node.op} is not supported")
 
-    def visit_Quantification(self, node):
-        if node.var_type == int:
-            z3_var = z3.Int(node.var.name)
-        elif node.var_type == bool:
-            z3_var = z3.Bool(node.var.name)
-        elif node.var_type == list[int]:
-            z3_var = z3.Array(node.var.name, z3.IntSort(), z3.IntSort())
-        else:
+    def declare_quantified_var(self, node):
+        z3_var = make_z3_variable(node.var.name, node.var_type, self.ctx)
+        if z3_var is None:
             raise NotImplementedError(f"{node.var_type} is not supported")
         self.name_dict[node.var.name] = z3_var
+        return z3_var
+
+    def visit_Quantification(self, node):
+        z3_var = self.declare_quantified_var(node)
         return z3.ForAll(z3_var, self.visit(node.expr))
+
+
+SMT2_SORTS = {int: "Int", bool: "Bool", list[int]: "(Array Int Int)"}
+
+SMT2_OPS = {
+    Op.Add: "+",
+    Op.Minus: "-",
+    Op.Mult: "*",
+    Op.Div: "div",
+    Op.Mod: "mod",
+    Op.And: "and",
+    Op.Or: "or",
+    Op.Implies: "=>",
+    Op.Iff: "=",
+    Op.Eq: "=",
+    Op.Gt: ">",
+    Op.Ge: ">=",
+    Op.Lt: "<",
+    Op.Le: "<=",
+}
+
+
+def smt2_symbol(name: str):
+    """Quotes a name as an SMT-LIB2 symbol, since names such as `x#1` are not simple."""
+    return f"|{name}|"
+
+
+class ClaimToSmt2:
+    """Renders Claim expressions as SMT-LIB2 terms, following the semantics of `ClaimToZ3`.
+
+    Every node shared by several parents of one term is bound once by `let`, so the
+    text stays linear in the size of the DAG. The constants referenced are declared on
+    their first use, and the declarations not yet sent to the solver are handed out by
+    `take_declarations`.
+
+    Args:
+        resolve (callable): A function mapping a variable name to the name and the type
+            of the constant it denotes, or None if it is unknown (see `resolve_variable`).
+        array_length_dict (dict): A dictionary mapping array names to their lengths.
+
+    Attributes:
+        declared (dict): A dictionary mapping the names of the constants declared so far
+            to their sorts.
+    """
+
+    def __init__(self, resolve, array_length_dict=dict()):
+        self.resolve = resolve
+        self.array_length_dict = array_length_dict
+        self.declared = {}
+        self.pending = []
+        self.num_lets = 0
+
+    def declare(self, name: str, sort: str):
+        if name not in self.declared:
+            self.declared[name] = sort
+            self.pending.append(f"(declare-const {smt2_symbol(name)} {sort})")
+        return smt2_symbol(name)
+
+    def take_declarations(self):
+        """Returns the declarations of the constants added since the last call."""
+        pending, self.pending = self.pending, []
+        return pending
+
+    def operands(self, expr):
+        if isinstance(expr, QuantificationExpr):
+            # the body is rendered in a scope of its own, so that no `let` captures the
+            # bound variable
+            return ()
+        return claim_operands(expr)
+
+    def render(self, expr, bound=frozenset()):
+        """Render a Claim expression as an SMT-LIB2 term.
+
+        Args:
+            expr (Expr): The expression to render.
+            bound (frozenset): The names of the variables bound by enclosing quantifiers.
+
+        Returns:
+            str: The term.
+        """
+        # count the parents of every node, visiting shared nodes once
+        parents, stack = {id(expr): 0}, [expr]
+        while stack:
+            for c in self.operands(stack.pop()):
+                if id(c) not in parents:
+                    parents[id(c)] = 0
+                    stack.append(c)
+                parents[id(c)] += 1
+
+        terms, bindings, stack = {}, [], [expr]
+        while stack:
+            e = stack[-1]
+            if id(e) in terms:
+                stack.pop()
+                continue
+            pending = [c for c in self.operands(e) if id(c) not in terms]
+            if pending:
+                stack.extend(pending)
+                continue
+            stack.pop()
+            term = self.render_node(e, [terms[id(c)] for c in self.operands(e)], bound)
+            if parents[id(e)] > 1 and self.operands(e):
+                self.num_lets += 1
+                bindings.append((f"?s{self.num_lets}", term))
+                term = bindings[-1][0]
+            terms[id(e)] = term
+
+        term = terms[id(expr)]
+        for name, value in reversed(bindings):
+            term = f"(let (({name} {value})) {term})"
+        return term
+
+    def render_node(self, expr, operands, bound):
+        if isinstance(expr, LiteralExpr):
+            v = expr.value.v
+            if isinstance(v, bool):
+                return "true" if v else "false"
+            return str(v) if v >= 0 else f"(- {-v})"
+        elif isinstance(expr, VarExpr):
+            return self.render_Var(expr, bound)
+        elif isinstance(expr, BinOpExpr):
+            return self.render_BinOp(expr, *operands)
+        elif isinstance(expr, UnOpExpr):
+            (c,) = operands
+            if expr.op == Op.Minus:
+                return f"(- {c})"
+            elif expr.op == Op.Not:
+                return f"(not {c})"
+            elif expr.op == Op.Abs:
+                return f"(ite (> {c} 0) {c} (- {c}))"
+            raise NotImplementedError(f"{expr.op} is not supported")
+        elif isinstance(expr, QuantificationExpr):
+            if expr.var_type not in SMT2_SORTS:
+                raise NotImplementedError(f"{expr.var_type} is not supported")
+            var = smt2_symbol(expr.var.name)
+            body = self.render(expr.expr, bound | {expr.var.name})
+            return f"(forall (({var} {SMT2_SORTS[expr.var_type]})) {body})"
+        elif isinstance(expr, SubscriptExpr):
+            return "(select {} {})".format(*operands)
+        elif isinstance(expr, StoreExpr):
+            return "(store {} {} {})".format(*operands)
+        raise NotImplementedError(f"`{type(expr)} is not supported")
+
+    def render_Var(self, node, bound):
+        if node.name in bound:
+            return smt2_symbol(node.name)
+        found = self.resolve(node.name)
+        if found is None:
+            raise KeyError(f"{node.name} is unkonwn when converting Claim to SMT-LIB2")
+        name, t = found
+        return self.declare(name, SMT2_SORTS[t])
+
+    def render_BinOp(self, node, c1, c2):
+        if node.op in SMT2_OPS:
+            return f"({SMT2_OPS[node.op]} {c1} {c2})"
+        elif node.op == Op.NEq:
+            return f"(not (= {c1} {c2}))"
+        elif node.op == Op.Adj:
+            # the free indices of `ClaimToZ3.visit_BinOp`
+            array = self.resolve(node.e1.name)[0] if isinstance(node.e1, VarExpr) else c1
+            length = self.array_length_dict[array]
+            indices = [self.declare(f"@i_{i}", "Int") for i in range(length)]
+            conds = [f"(and (<= 0 {i}) (< {i} {length}))" for i in indices]
+            count = " ".join(
+                f"(ite (not (= (select {c1} {i}) (select {c2} {i}))) 1 0)" for i in indices
+            )
+            conds.append(f"(= (+ 0 {count}) 1)")
+            return f"(and {' '.join(conds)})"
+        raise NotImplementedError(f"{node.op} is not supported")
@@ -0,0 +1,144 @@
+import inspect
+import os
+import shutil
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../src")))
+
+import myprover as mp
+from myprover import invariant, postcondition, precondition, prove
+from myprover.backend import parse_sexpr
+from myprover.visitor import ClaimToSmt2
+
+requires_z3_binary = pytest.mark.skipif(
+    shutil.which("z3") is None, reason="the z3 binary is not installed"
+)
+
+
+def test_claim_to_smt2():
+    resolve = {"x": ("x", int), "x#1": ("x", int), "a": ("a", list[int])}.get
+    renderer = ClaimToSmt2(resolve)
+    expr = mp.ClaimParser("x * x > a[0] and x * x < x#1 + 3").parse_expr()
+    assert renderer.render(expr) == (
+        "(let ((?s1 (* |x| |x|))) "
+        "(and (> ?s1 (select |a| 0)) (< ?s1 (+ |x| 3))))"
+    )
+    assert renderer.take_declarations() == [
+        "(declare-const |x| Int)",
+        "(declare-const |a| (Array Int Int))",
+    ]
+    assert renderer.take_declarations() == []
+
+    # nothing is shared across the scope of a quantifier
+    body = mp.ClaimParser("y * y >= 0 and y * y + -1 < y * y").parse_expr()
+    expr = mp.claim.QuantificationExpr("FORALL", mp.claim.VarExpr("y"), body, int)
+    term = renderer.render(expr)
+    assert term.startswith("(forall ((|y") and "(let ((?s2 (* |y" in term
+    assert "(- 1)" in term
+    with pytest.raises(KeyError):
+        renderer.render(mp.ClaimParser("z > 0").parse_expr())
+
+
+def test_parse_sexpr():
+    assert parse_sexpr('((|x#1| (- 2)) (a ((as const (Array Int Int)) 0)))') == [
+        ["x#1", ["-", "2"]],
+        ["a", [["as", "const", ["Array", "Int", "Int"]], "0"]],
+    ]
+    assert parse_sexpr("sat") == "sat"
+
+
+@precondition("n >= 0")
+@postcondition("r == n * (n + 1) / 2")
+def cumsum(n):
+    i = 1
+    r = 0
+    while i <= n:
+        invariant("i <= n + 1")
+        invariant("r == (i - 1) * i / 2")
+        r = r + i
+        i = i + 1
+
+
+@precondition("n >= 0")
+@postcondition("r == n * n")
+def wrong_square(n):
+    i = 0
+    r = 0
+    while i < n:
+        invariant("i <= n and r == i * n")
+        r = r + i
+        i = i + 1
+
+
+@requires_z3_binary
+@pytest.mark.parametrize("incremental", [True, False])
+def test_smtlib_backend(incremental):
+    with mp.SmtLibBackend(incremental=incremental) as backend:
+        verified, prover = prove(cumsum, {"n": int}, backend=backend)
+        assert verified and prover.stats["solver_restarts"] == 0
+        pid = backend.process.pid
+
+        with pytest.raises(mp.InvalidInvariantError, match=r"\bn = "):
+            prove(wrong_square, {"n": int}, backend=backend)
+        # the same solver process serves every verification
+        assert backend.process.pid == pid
+
+        with pytest.raises(ValueError):
+            prove(cumsum, {"n": int}, workers=2, backend=backend)
+    assert backend.process is None
+
+
+@requires_z3_binary
+def test_smtlib_backend_restarts():
+    def fermat(x, y, z):
+        r = x * x * x + y * y * y - z * z * z
+        return r
+
+    code = inspect.getsource(fermat).lstrip()
+    prover = mp.MyProver()
+    with mp.SmtLibBackend(max_memory=1, grace=0.5) as backend:
+        prover.register("fermat", {"x": int, "y": int, "z": int, "r": int})
+        with pytest.raises(mp.VerificationUnknownError, match="postcondition"):
+            prover.verify(
+                code,
+                "fermat",
+                "x > 0 and y > 0 and z > 0",
+                "r != 0",
+                timeout=1,
+                backend=backend,
+            )
+        # the next session starts in a fresh solver, since the memory exceeds the limit
+        pid = backend.process.pid
+        postcond = "r == 1 + y * y * y - z * z * z"
+        assert prover.verify(code, "fermat", "x == 1", postcond, backend=backend)
+        assert backend.restarts == 1 and backend.process.pid != pid
+
+
+@precondition("n >= 0 and n < 100")
+@postcondition("r == n * (n + 1) / 2")
+def cumsum_with_bounds(n):
+    i = 1
+    r = 0
+    while i <= n:
+        invariant("i <= n + 1 and i >= 1")
+        invariant("r == (i - 1) * i / 2")
+        r = r + i
+        i = i + 1
+
+
+@requires_z3_binary
+def test_smtlib_backend_tracks_conjuncts():
+    with mp.SmtLibBackend() as backend:
+        verified, prover = prove(
+            cumsum_with_bounds, {"n": int}, backend=backend, track_conjuncts=True
+        )
+    assert verified and prover.stats["num_tracked_conjuncts"] == 5
+    lineno = inspect.getsourcelines(cumsum_with_bounds)[1] + 5
+    assert prover.stats["unused_conjuncts"] == [
+        "precondition: n < 100",
+        f"invariant of the loop at line {lineno}: i >= 1",
+    ]
+    _, expected = prove(cumsum_with_bounds, {"n": int}, track_conjuncts=True)
+    assert prover.stats["unused_conjuncts"] == expected.stats["unused_conjuncts"]
@@ -0,0 +1,112 @@
+import os
+import sys
+import textwrap
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../src")))
+
+from myprover import verify_module, verify_package
+from myprover.batch import collect_functions
+from myprover.cache import ProofCache
+
+MODULE = textwrap.dedent(
+    """\
+    import myprover as mp
+    from myprover import invariant, postcondition, precondition
+
+
+    @precondition("n >= 0")
+    @postcondition("r == n * (n + 1) / 2")
+    def cumsum(n: int):
+        i = 1
+        r = 0
+        while i <= n:
+            invariant("i <= n + 1")
+            invariant("r == (i - 1) * i / 2")
+            r = r + i
+            i = i + 1
+
+
+    def helper(x):
+        return x
+
+
+    class Math:
+        @mp.precondition("x >= 0")
+        @mp.postcondition("r > x")
+        def wrong_succ(x):
+            r = x
+            return r
+
+
+    @postcondition("r == x + y")
+    def add(x, y):
+        r = x + y
+        return r
+    """
+)
+
+
+def test_collect_functions():
+    targets = collect_functions(MODULE, "m.py", {"add": {"x": int, "y": int}})
+    assert [t.name for t in targets] == ["cumsum", "Math.wrong_succ", "add"]
+    cumsum, wrong_succ, add = targets
+    assert (cumsum.precondition, cumsum.varname2types) == ("n >= 0", {"n": int})
+    assert cumsum.source.startswith('@precondition("n >= 0")')
+    assert wrong_succ.postcondition == "r > x" and wrong_succ.varname2types == {}
+    assert (add.precondition, add.varname2types) == ("True", {"x": int, "y": int})
+
+
+@pytest.mark.parametrize("workers", [None, 2])
+def test_verify_package(tmp_path, workers):
+    package = tmp_path / "pkg"
+    (package / "sub").mkdir(parents=True)
+    (package / "__init__.py").write_text("")
+    (package / "sub" / "m.py").write_text(MODULE)
+    types = {"Math.wrong_succ": {"x": int}, "add": {"x": int, "y": int}}
+
+    report = verify_package(str(package), types, workers=workers)
+    assert [r.name for r in report] == ["cumsum", "Math.wrong_succ", "add"]
+    assert not report.verified
+    assert [r.name for r in report.failures] == ["Math.wrong_succ"]
+    assert report["Math.wrong_succ"].status == "VerificationFailureError"
+    assert report["Math.wrong_succ"].lineno == 24
+    assert report["cumsum"].time > 0
+    assert report["cumsum"].stats["num_obligations"] > 0
+    assert report.to_dict()["results"][0]["status"] == "verified"
+
+
+def test_verify_module_with_proof_cache(tmp_path):
+    path = tmp_path / "m.py"
+    path.write_text(MODULE)
+    proof_cache = ProofCache()
+    types = {"Math.wrong_succ": {"x": int}}
+    # the types of `x` and `y` of `add` are unknown
+    report = verify_module(str(path), types, proof_cache=proof_cache)
+    assert report["add"].status == "NotImplementedError"
+    report = verify_module(str(path), types, proof_cache=proof_cache)
+    assert report["cumsum"].stats == {"proof_cache_hit": True}
+    assert report["Math.wrong_succ"].stats == {"proof_cache_hit": True}
+    assert report["Math.wrong_succ"].status == "VerificationFailureError"
+    # errors other than the definitive outcomes are not cached
+    assert report["add"].stats != {"proof_cache_hit": True}
+
+
+def test_verify_module_with_proof_cache_bounded(tmp_path):
+    path = tmp_path / "m.py"
+    path.write_text(MODULE)
+    proof_cache = ProofCache()
+    # `n` is unbounded, so the unwinding assertion of one iteration fails
+    report = verify_module(str(path), {}, proof_cache=proof_cache, unroll=1)
+    assert report["cumsum"].status == "VerificationFailureError"
+    # the bounded outcome never answers an unbounded verification, or another bound
+    report = verify_module(str(path), {}, proof_cache=proof_cache)
+    assert report["cumsum"].verified and report["cumsum"].stats != {"proof_cache_hit": True}
+    report = verify_module(
+        str(path), {}, proof_cache=proof_cache, unroll=1, unwinding_assertion=False
+    )
+    assert report["cumsum"].verified and report["cumsum"].stats != {"proof_cache_hit": True}
+    report = verify_module(str(path), {}, proof_cache=proof_cache, unroll=1)
+    assert report["cumsum"].status == "VerificationFailureError"
+    assert report["cumsum"].stats == {"proof_cache_hit": True}
@@ -0,0 +1,172 @@
+import inspect
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../src")))
+
+import z3
+
+import myprover as mp
+from myprover import invariant, postcondition, precondition, prove
+from myprover.cache import ProofCache, ResultCache, canonicalize
+
+
+def test_canonicalize():
+    x, y, a = z3.Int("x@0"), z3.Int("y#1"), z3.Array("A", z3.IntSort(), z3.IntSort())
+    u, v, b = z3.Int("x!2"), z3.Int("y"), z3.Array("B#2", z3.IntSort(), z3.IntSort())
+    key = canonicalize(z3.And(x > y, a[x] == y))
+    assert key.digest == canonicalize(z3.And(u > v, b[u] == v)).digest
+    assert key.names == ["x@0", "y#1", "A"]
+    # the renaming must be consistent and preserve the sorts
+    assert key.digest != canonicalize(z3.And(x > y, a[y] == y)).digest
+    assert key.digest != canonicalize(z3.And(x > y, z3.Bool("p"))).digest
+    assert key.digest != canonicalize(z3.And(x > y, a[x] == y), "other").digest
+
+    i, j = z3.Int("i$$0"), z3.Int("j$$0")
+    assert (
+        canonicalize(z3.ForAll(i, a[i] >= x)).digest
+        == canonicalize(z3.ForAll(j, b[j] >= u)).digest
+    )
+
+
+def test_result_cache(tmp_path):
+    cache = ResultCache(str(tmp_path), max_entries=2)
+    x, y = z3.Int("x"), z3.Int("y")
+    key = cache.key(x > y)
+    assert cache.lookup(key) is None
+    cache.store(key, "sat", [("x", "1"), ("y", "0"), ("@activate0", "True")])
+    assert cache.lookup(cache.key(z3.Int("u") > z3.Int("v"))) == (
+        "sat",
+        [("u", "1"), ("v", "0")],
+    )
+    cache.store(cache.key(x == y), "unknown")
+    assert len(cache) == 1
+    cache.store(cache.key(x < y), "unsat")
+    cache.store(cache.key(x != y), "unsat")
+    assert len(cache) == 2
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    # the results persist across instances
+    assert ResultCache(str(tmp_path)).lookup(cache.key(x != y)) == ("unsat", None)
+
+
+def test_result_cache_eviction(tmp_path):
+    cache = ResultCache(str(tmp_path), max_entries=10)
+    keys = [cache.key(z3.Int("x") > i) for i in range(11)]
+    for key in keys[:10]:
+        cache.store(key, "unsat")
+    assert cache.lookup(keys[0]) == ("unsat", None)
+    # the least recently used results are evicted down to 90% at once
+    cache.store(keys[10], "unsat")
+    assert len(cache) == 9
+    assert [cache.lookup(key) is not None for key in keys[:4]] == [True, False, False, True]
+
+
+def test_verify_with_cache(tmp_path):
+    def func(x, n):
+        r = x
+        i = 0
+        while i < n:
+            invariant("i <= n and r == x + i")
+            r = r + 1
+            i = i + 1
+        return r
+
+    code = inspect.getsource(func).lstrip()
+    prover = mp.MyProver()
+    prover.register("func", {"x": int, "n": int, "r": int, "i": int})
+    cache = ResultCache(str(tmp_path))
+    assert prover.verify(code, "func", "n >= 0", "r == x + n", cache=cache)
+    assert prover.stats["cache_hits"] == 0
+    num_conditions = prover.stats["cache_misses"]
+    assert prover.verify(code, "func", "n >= 0", "r == x + n", cache=cache)
+    assert prover.stats["cache_hits"] == num_conditions
+
+    # a renamed function hits the results of the original one
+    def renamed_func(y, n):
+        s = y
+        i = 0
+        while i < n:
+            invariant("i <= n and s == y + i")
+            s = s + 1
+            i = i + 1
+        return s
+
+    renamed = inspect.getsource(renamed_func).lstrip()
+    prover.register("func", {"y": int, "n": int, "s": int, "i": int})
+    assert prover.verify(renamed, "func", "n >= 0", "s == y + n", cache=cache)
+    assert prover.stats["cache_hits"] == num_conditions
+
+    # the cached counterexample is reported in the names of the function
+    messages = []
+    for _ in range(2):
+        with pytest.raises(mp.VerificationFailureError, match=r"\bn = ") as e:
+            prover.verify(renamed, "func", "True", "s == y + n", cache=cache)
+        messages.append(str(e.value))
+    assert messages[0] == messages[1]
+    assert prover.stats["cache_hits"] > 0
+
+
+@precondition("n >= 0")
+@postcondition("r == n * (n + 1) / 2")
+def cumsum(n):
+    i = 1
+    r = 0
+    while i <= n:
+        invariant("i <= n + 1")
+        invariant("r == (i - 1) * i / 2")
+        r = r + i
+        i = i + 1
+
+
+@precondition("n >= 0")
+@postcondition("r == n * n")
+def wrong_square(n):
+    i = 0
+    r = 0
+    while i < n:
+        invariant("i <= n and r == i * n")
+        r = r + i
+        i = i + 1
+
+
+def test_prove_with_proof_cache(tmp_path):
+    proof_cache = ProofCache(maxsize=1, directory=str(tmp_path))
+    verified, prover = prove(cumsum, {"n": int}, proof_cache=proof_cache)
+    assert verified and "proof_cache_hit" not in prover.stats
+    verified, prover = prove(cumsum, {"n": int}, proof_cache=proof_cache)
+    assert verified and prover.stats == {"proof_cache_hit": True}
+
+    messages = []
+    for _ in range(2):
+        with pytest.raises(mp.InvalidInvariantError) as e:
+            prove(wrong_square, {"n": int}, proof_cache=proof_cache)
+        messages.append(str(e.value))
+    assert messages[0] == messages[1]
+    assert (proof_cache.hits, proof_cache.misses) == (2, 2)
+    assert len(proof_cache.entries) == 1
+
+    # the flags and the types are part of the key
+    with pytest.raises(mp.VerificationFailureError):
+        prove(wrong_square, {"n": int}, True, proof_cache=proof_cache)
+    prove(cumsum, {"n": int, "r": int}, proof_cache=proof_cache)
+    assert proof_cache.misses == 4
+
+    # the outcomes persist on disk
+    proof_cache = ProofCache(directory=str(tmp_path))
+    assert prove(cumsum, {"n": int}, proof_cache=proof_cache)[1].stats == {
+        "proof_cache_hit": True
+    }
+
+
+def test_function_key_depends_on_sources(monkeypatch):
+    from myprover import cache
+
+    key = cache.function_key("def f(): pass", "True", "True", {"x": int}, False)
+    assert key == cache.function_key("def f(): pass", "True", "True", {"x": int}, False)
+    assert len(cache.source_digest()) == 64
+    # a change to the prover invalidates the outcomes even in a source tree
+    monkeypatch.setattr(cache, "source_digest", lambda: "changed")
+    assert key != cache.function_key("def f(): pass", "True", "True", {"x": int}, False)
@@ -0,0 +1,81 @@
+import json
+import os
+import sys
+import textwrap
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../src")))
+
+from myprover.cli import main
+
+MODULE = textwrap.dedent(
+    """\
+    from myprover import postcondition, precondition
+
+
+    @precondition("x >= 0")
+    @postcondition("r > x")
+    def succ(x: int):
+        r = x + 1
+        return r
+
+
+    @precondition("x > 0 and y > 0 and z > 0")
+    @postcondition("r != 0")
+    def fermat(x, y, z):
+        r = x * x * x + y * y * y - z * z * z
+        return r
+    """
+)
+
+
+@pytest.mark.parametrize("jobs", [None, 2])
+def test_cli(tmp_path, capsys, jobs):
+    (tmp_path / "pkg").mkdir()
+    path = tmp_path / "pkg" / "m.py"
+    path.write_text(MODULE)
+    types = tmp_path / "types.json"
+    types.write_text(json.dumps({"fermat": {"x": "int", "y": "int", "z": "int"}}))
+    report = tmp_path / "report.json"
+
+    args = [str(tmp_path / "pkg"), "--types", str(types), "--report", str(report)]
+    if jobs is not None:
+        args += ["-j", str(jobs)]
+    assert main(args + ["--timeout", "1"]) == 1
+    out = capsys.readouterr().out
+    assert f"{path}:13: fermat: TimeoutError" in out
+    assert "1 verified, 1 failed" in out
+    results = json.loads(report.read_text())["results"]
+    assert [(r["name"], r["status"]) for r in results] == [
+        ("succ", "verified"),
+        ("fermat", "TimeoutError"),
+    ]
+    assert results[1]["time"] < 5
+
+    path.write_text(MODULE.split("\n\n\n@")[0])
+    assert main(["verify"] + args) == 0
+
+
+def test_cli_invalid_types(tmp_path, capsys):
+    path = tmp_path / "m.py"
+    path.write_text(MODULE)
+    types = tmp_path / "types.json"
+    types.write_text(json.dumps({"fermat": {"x": "float"}}))
+    assert main([str(path), "--types", str(types)]) == 2
+    assert "Unknown type `float`" in capsys.readouterr().err
+
+
+def test_cli_invalid_files(tmp_path, capsys):
+    missing = tmp_path / "missing.py"
+    assert main(["verify", str(missing)]) == 2
+    assert f"myprover: {missing}: " in capsys.readouterr().err
+
+    (tmp_path / "m.py").write_text(MODULE)
+    broken = tmp_path / "broken.py"
+    broken.write_text("def f(:\n    pass\n")
+    # the other files are still read, and nothing is verified
+    assert main([str(tmp_path)]) == 2
+    out, err = capsys.readouterr()
+    assert err.startswith(f"myprover: {broken}: ") and "line 1" in err
+    assert out == ""
@@ -0,0 +1,98 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../src")))
+
+import myprover as mp
+from myprover import invariant, postcondition, precondition, prove
+from myprover.falsify import Falsifier, compile_numpy, evaluate
+from myprover.runtime import _div, _mod
+
+
+def resolve(varname):
+    return {"x": ("x", int), "y": ("y", int), "b": ("b", bool)}.get(varname)
+
+
+def test_compile_numpy():
+    expr = mp.ClaimParser("x / y == 2 and x % y == 1").parse_expr()
+    code, names = compile_numpy(expr, resolve)
+    assert sorted(names) == ["x", "y"]
+    xs, ys = np.meshgrid(np.arange(-20, 21), np.arange(-5, 6))
+    columns = {names["x"][0]: xs.ravel(), names["y"][0]: ys.ravel()}
+    holds = evaluate(code, columns, xs.size)
+    # the division of Z3, and no row with a zero divisor
+    expected = [
+        y != 0 and _div(x, y) == 2 and _mod(x, y) == 1
+        for x, y in zip(xs.ravel().tolist(), ys.ravel().tolist())
+    ]
+    assert holds.tolist() == expected
+    assert compile_numpy(mp.ClaimParser("a[x] == 0").parse_expr(), resolve) is None
+    assert compile_numpy(mp.ClaimParser("forall i :: i > x").parse_expr(), resolve) is None
+
+
+def test_falsifier_search():
+    falsifier = Falsifier(resolve)
+    true = mp.ClaimParser("True").parse_expr()
+    cond = mp.ClaimParser("x * y == 1000000 * 1000000 + 1 and b").parse_expr()
+    # the 64-bit products of the batch overflow, and no exact row is confirmed
+    model = falsifier.search(true, mp.ClaimParser("x * x == 1 and (not b)").parse_expr())
+    assert model in ([("b", "False"), ("x", "1")], [("b", "False"), ("x", "-1")])
+    assert falsifier.search(true, cond) is None
+    assert falsifier.search(true, mp.ClaimParser("x > x").parse_expr()) is None
+    assert (falsifier.num_searches, falsifier.num_found) == (3, 1)
+
+
+class RecordingBackend(mp.Z3Backend):
+    def __init__(self):
+        super().__init__()
+        self.checked = []
+
+    def check(self, cond, assumptions=()):
+        self.checked.append(cond)
+        return super().check(cond, assumptions)
+
+
+@pytest.mark.parametrize("engine", ["wp", "passive"])
+def test_verify_falsifies_without_solver(engine):
+    @precondition("n >= 0")
+    @postcondition("r == n * (n + 1) / 2")
+    def cumsum(n):
+        i = 1
+        r = 0
+        while i <= n:
+            invariant("i <= n + 1")
+            invariant("r == i * (i + 1) / 2")
+            r = r + i
+            i = i + 1
+
+    backend = RecordingBackend()
+    with pytest.raises(mp.InvalidInvariantError, match="initiation") as e:
+        prove(cumsum, {"n": int}, engine=engine, falsify=True, backend=backend)
+    # the conditions before the refuted one are proved by the solver
+    assert len(backend.checked) == 1
+    with pytest.raises(mp.InvalidInvariantError) as expected:
+        prove(cumsum, {"n": int}, engine=engine)
+    assert str(e.value).split(" - ")[0] == str(expected.value).split(" - ")[0]
+
+
+def test_verify_falsify(prover_with_types):
+    prover = prover_with_types
+    code = "y = x * x - 3 * x\n"
+    with pytest.raises(mp.VerificationFailureError, match=r"\[x = (1|2)"):
+        prover.verify(code, "func", "x > 0", "y > 0", falsify=True)
+    assert prover.stats["falsified"] == "postcondition: `y > 0`"
+    # the conditions that hold, or have arrays, are left to the solver
+    assert prover.verify(code, "func", "x > 3", "y > 0", falsify=True)
+    assert prover.stats["falsified"] is None
+    assert prover.verify("a[0] = x\n", "func", "x > 3", "a[0] > 0", falsify=True)
+    assert prover.stats["num_falsify_searches"] == 1
+
+
+@pytest.fixture
+def prover_with_types():
+    p = mp.MyProver()
+    p.register("func", {"x": int, "y": int, "a": list[int]})
+    return p
@@ -86,3 +86,318 @@ def test_derive_weakest_precondition_simple():
         "(BinOp (BinOp (BinOp (Var x) Op.Ge (Literal 0)) Op.And (UnOp Op.Not (BinOp (Var x) Op.Le (Literal 10)))) Op.Implies (BinOp (Var x) Op.Eq (Literal 55)))"
         in ac_strs
     )
+
+
+def test_hash_consing():
+    import myprover as mp
+
+    x = mp.claim.VarExpr("x")
+    assert x is mp.claim.VarExpr("x")
+    assert mp.claim.LiteralExpr(mp.claim.IntValue(1)) is mp.claim.LiteralExpr(
+        mp.claim.IntValue(1)
+    )
+    assert mp.claim.LiteralExpr(mp.claim.IntValue(1)) is not mp.claim.LiteralExpr(
+        mp.claim.BoolValue(True)
+    )
+    e = mp.ClaimParser("x + 1 >= y").parse_expr()
+    assert e is mp.ClaimParser("x + 1 >= y").parse_expr()
+    assert e.assign_variable(mp.claim.VarExpr("z"), mp.claim.VarExpr("w")) is e
+    assert e.assign_variable(x, mp.claim.VarExpr("y")).e2 is e.e2
+
+
+def test_structural_equality():
+    import ast
+
+    import myprover as mp
+
+    text = "forall i :: i >= 0 ==> A[i] == x"
+    e = mp.ClaimParser(text).parse_expr()
+    # expressions are interned, so equal statements built separately share them
+    a = mp.claim.AssertStmt(e)
+    b = mp.claim.AssertStmt(mp.ClaimParser(text).parse_expr())
+    assert a is not b
+    assert a == b and hash(a) == hash(b)
+    assert a != mp.claim.AssertStmt(mp.ClaimParser(text.replace("x", "y")).parse_expr())
+    assert a != mp.claim.AssumeStmt(e)
+    # the type of the bound variable is part of the key of a quantifier
+    typed = mp.claim.QuantificationExpr(e.quantifier, e.var, e.expr, int, e.bounded)
+    assert typed != e and e.var_type is None
+    assert mp.claim.AssertStmt(typed) != a
+    assert len({a, b, mp.claim.AssertStmt(typed)}) == 2
+
+    source = "while i < n:\n    i = i + 1\nif i > 0:\n    r = A[i]"
+    s1 = mp.PyToClaim().visit(ast.parse(source))
+    s2 = mp.PyToClaim().visit(ast.parse("\n\n" + source))
+    assert s1 is not s2 and s1.s1.lineno != s2.s1.lineno
+    assert s1 == s2 and hash(s1) == hash(s2)
+    assert s1 != mp.PyToClaim().visit(ast.parse(source.replace("+ 1", "+ 2")))
+
+    # a long sequence is hashed and compared without recursion
+    long_source = "\n".join(f"x{i} = x{i} + 1" for i in range(3000))
+    s3 = mp.PyToClaim().visit(ast.parse(long_source))
+    assert s3 == mp.PyToClaim().visit(ast.parse(long_source))
+
+
+def test_derive_weakest_precondition_array():
+    import ast
+
+    import myprover as mp
+
+    stmt = mp.PyToClaim().visit(ast.parse("A[i] = x"))
+    post = mp.ClaimParser("A[j] >= 0").parse_expr()
+    wp, _ = mp.derive_weakest_precondition(stmt, post, {})
+    A, i, x = (mp.claim.VarExpr(n) for n in "Aix")
+    assert wp.e1 == mp.claim.SubscriptExpr(
+        mp.claim.StoreExpr(A, i, x), mp.claim.VarExpr("j")
+    )
+
+
+def test_derive_weakest_precondition_sharing():
+    import ast
+
+    import myprover as mp
+
+    def wp_size(k):
+        source = "\n".join(f"if x > {i}:\n    r = 0" for i in range(k))
+        stmt = mp.PyToClaim().visit(ast.parse(source))
+        post = mp.ClaimParser("r >= 0").parse_expr()
+        wp, _ = mp.derive_weakest_precondition(stmt, post, {"x": int, "r": int})
+        return mp.claim.count_nodes(wp), mp.claim.tree_size(wp)
+
+    (d8, t8), (d16, t16), (d32, t32) = wp_size(8), wp_size(16), wp_size(32)
+    assert d32 - d16 == 2 * (d16 - d8)
+    assert t8 < t16 < t32 and t32 > 2**32
+
+
+def test_derive_passive_weakest_precondition():
+    import ast
+
+    import myprover as mp
+
+    stmt = mp.PyToClaim().visit(ast.parse("y = x + 1\nx = y"))
+    passive_stmt, versions = mp.to_passive_form(stmt)
+    assert (
+        str(passive_stmt)
+        == "(Seq (Assume (BinOp (Var y!1) Op.Eq (BinOp (Var x) Op.Add (Literal IntValue 1)))) (Assume (BinOp (Var x!1) Op.Eq (Var y!1))))"
+    )
+    assert versions == {"x": "x!1", "y": "y!1"}
+
+    def vc_size(k):
+        source = "\n".join(
+            f"if x > {i}:\n    r = r + 1\nelse:\n    r = r - 1" for i in range(k)
+        )
+        stmt = mp.PyToClaim().visit(ast.parse(source))
+        post = mp.ClaimParser("r >= 0").parse_expr()
+        wp, ac = mp.derive_passive_weakest_precondition(stmt, post, {})
+        assert len(ac) == 0
+        return mp.claim.tree_size(wp)
+
+    s8, s16, s32 = vc_size(8), vc_size(16), vc_size(32)
+    assert s32 - s16 == 2 * (s16 - s8)
+
+    # the renaming walks the expressions without recursion
+    x, one = mp.claim.VarExpr("x"), mp.claim.LiteralExpr(1)
+    deep = x
+    for _ in range(3 * sys.getrecursionlimit()):
+        deep = mp.claim.BinOpExpr(deep, mp.claim.Op.Add, one)
+    stmt = mp.claim.CompoundStmt(
+        mp.claim.AssignStmt(x, one),
+        mp.claim.AssertStmt(mp.claim.BinOpExpr(deep, mp.claim.Op.Gt, x)),
+    )
+    passive_stmt, versions = mp.to_passive_form(stmt)
+    renamed = passive_stmt.s2.e.e1
+    while isinstance(renamed, mp.claim.BinOpExpr):
+        renamed = renamed.e1
+    assert renamed == mp.claim.VarExpr("x!1") and passive_stmt.s2.e.e2 == renamed
+
+
+def test_substitute():
+    import myprover as mp
+
+    x, y, z = mp.claim.VarExpr("x"), mp.claim.VarExpr("y"), mp.claim.VarExpr("z")
+    e = mp.ClaimParser("x + y * x >= z").parse_expr()
+    mapping = {x: mp.claim.VarExpr("x#1"), y: mp.claim.VarExpr("y#1")}
+    expected = e
+    for old_var, new_var in mapping.items():
+        expected = expected.assign_variable(old_var, new_var)
+    assert e.substitute(mapping) is expected
+    assert e.substitute({}) is e
+
+    # the substitution is simultaneous
+    assert str(e.substitute({x: y, y: x})) == str(
+        mp.ClaimParser("y + x * y >= z").parse_expr()
+    )
+
+    stmt = mp.claim.CompoundStmt(
+        mp.claim.AssignStmt(x, e), mp.claim.AssertStmt(mp.claim.BinOpExpr(y, mp.claim.Op.Eq, z))
+    )
+    assert (
+        str(stmt.substitute({y: z}))
+        == "(Seq (Assign (Var x) (BinOp (BinOp (Var x) Op.Add (BinOp (Var z) Op.Mult (Var x))) Op.Ge (Var z))) (Assert (BinOp (Var z) Op.Eq (Var z))))"
+    )
+
+
+def test_derive_obligations():
+    import ast
+
+    import myprover as mp
+
+    code = """def f(n):
+    i = 0
+    while i < n:
+        invariant("0 <= i and i <= n")
+        j = 0
+        while j < i:
+            invariant("0 <= i and i < n and j <= i")
+            j = j + 1
+        i = i + 1
+    k = 0
+    while k < n:
+        invariant("k <= n")
+        k = k + 1
+"""
+    stmt = mp.PyToClaim().visit(ast.parse(code))
+    var2type = {"n": int, "i": int, "j": int, "k": int}
+    obligations = mp.derive_obligations(
+        stmt,
+        mp.ClaimParser("n >= 0").parse_expr(),
+        mp.ClaimParser("k == n").parse_expr(),
+        var2type,
+    )
+    assert [o.label for o in obligations] == [
+        "initiation of the loop at line 3",
+        "preservation of the loop at line 3",
+        "exit of the loop at line 3",
+        "initiation of the loop at line 6",
+        "preservation of the loop at line 6",
+        "exit of the loop at line 6 into the loop at line 3",
+        "initiation of the loop at line 11",
+        "preservation of the loop at line 11",
+        "exit of the loop at line 11",
+        "postcondition",
+    ]
+    assert [o.is_invariant for o in obligations] == [
+        True, True, False, True, True, True, True, True, False, False
+    ]
+
+    # every obligation is self-contained and valid
+    for engine in [mp.derive_weakest_precondition, mp.derive_passive_weakest_precondition]:
+        for o in mp.derive_obligations(
+            stmt,
+            mp.ClaimParser("n >= 0").parse_expr(),
+            mp.ClaimParser("k == n").parse_expr(),
+            var2type,
+            engine,
+        ):
+            names = {
+                v: mp.prover.make_z3_variable(v, int)
+                for v in mp.claim.collect_all_varnames([o.cond])
+            }
+            solver = mp.prover.z3.Solver()
+            solver.add(mp.ClaimToZ3(names).visit(mp.claim.UnOpExpr(mp.Op.Not, o.cond)))
+            assert str(solver.check()) == "unsat", o.label
+
+    # the frame can be left to the caller, which assumes it once for all obligations
+    pre = mp.ClaimParser("n >= 0").parse_expr()
+    assert mp.derive_frame(stmt, pre) is pre
+    obligations = mp.derive_obligations(
+        stmt, pre, mp.ClaimParser("k == n").parse_expr(), var2type, assume_frame=False
+    )
+    assert len(obligations) == 10
+    for o in obligations:
+        names = {
+            v: mp.prover.make_z3_variable(v, int)
+            for v in mp.claim.collect_all_varnames([o.cond]) | {"n"}
+        }
+        solver = mp.prover.z3.Solver()
+        solver.add(mp.ClaimToZ3(names).visit(pre))
+        solver.add(mp.ClaimToZ3(names).visit(mp.claim.UnOpExpr(mp.Op.Not, o.cond)))
+        assert str(solver.check()) == "unsat", o.label
+
+
+def test_split_vc():
+    import myprover as mp
+
+    goals = mp.split_vc(
+        mp.ClaimParser("x > 0 ==> (y > 0 and (z > 0 ==> (y > z and z < 5)))").parse_expr()
+    )
+    assert [mp.claim.pretty_expr(g) for g in goals] == [
+        "(x > 0) ==> (y > 0)",
+        "(x > 0) ==> ((z > 0) ==> (y > z))",
+        "(x > 0) ==> ((z > 0) ==> (z < 5))",
+    ]
+
+    quant = mp.ClaimParser("forall i :: i > 0 and i < 5").parse_expr()
+    i = quant.var.name
+    assert [mp.claim.pretty_expr(g) for g in mp.split_vc(quant)] == [
+        f"forall {i} :: {i} > 0",
+        f"forall {i} :: {i} < 5",
+    ]
+
+    conj = mp.ClaimParser("a and b and c and d").parse_expr()
+    assert len(mp.split_vc(conj)) == 4
+    assert len(mp.split_vc(conj, max_goals=2)) == 2
+
+
+def test_slice_stmt():
+    import ast
+
+    import myprover as mp
+
+    code = """def f(x, A):
+    a = x + 1
+    b = a * 2
+    A[0] = b
+    c = x
+    if c > 0:
+        d = 1
+    assert a > 0
+"""
+    stmt = mp.PyToClaim().visit(ast.parse(code))
+    sliced = mp.slice_stmt(stmt, mp.ClaimParser("A[0] > 0").parse_expr())
+    expected = """def f(x, A):
+    a = x + 1
+    b = a * 2
+    A[0] = b
+    assert a > 0
+"""
+    assert mp.claim.pretty_repr(sliced) == mp.claim.pretty_repr(
+        mp.PyToClaim().visit(ast.parse(expected))
+    )
+
+
+def test_unroll_loops():
+    import ast
+
+    import myprover as mp
+
+    code = """def f(x):
+    while x > 0:
+        assert x != 5
+        x = x - 1
+"""
+    stmt = mp.PyToClaim().visit(ast.parse(code))
+    expected = """def f(x):
+    if x > 0:
+        assert x != 5
+        x = x - 1
+        if x > 0:
+            assert x != 5
+            x = x - 1
+            assume("not (x > 0)")
+"""
+    unrolled = mp.unroll_loops(stmt, 2)
+    assert mp.claim.pretty_repr(unrolled) == mp.claim.pretty_repr(
+        mp.PyToClaim().visit(ast.parse(expected))
+    )
+    # the unwinding assertion is the only goal
+    unwinding = mp.unroll_loops(stmt, 1, unwinding_assertion=True)
+    expected = """def f(x):
+    if x > 0:
+        assume("x != 5")
+        x = x - 1
+        assert not (x > 0)
+"""
+    assert mp.claim.pretty_repr(unwinding) == mp.claim.pretty_repr(
+        mp.PyToClaim().visit(ast.parse(expected))
+    )
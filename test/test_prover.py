@@ -1,6 +1,11 @@
+import asyncio
 import inspect
+import multiprocessing
 import os
+import subprocess
 import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
 
 import pytest
 
@@ -29,10 +34,10 @@ def simple_func(x, y):
     return result
 
 
-def verify_func(prover, func, precond, postcond, skip_inv=True):
+def verify_func(prover, func, precond, postcond, skip_inv=True, engine="wp"):
     code = inspect.getsource(func)
     code = code.lstrip()
-    return prover.verify(code, func.__name__, precond, postcond, skip_inv)
+    return prover.verify(code, func.__name__, precond, postcond, skip_inv, engine=engine)
 
 
 def test_verify_simple_func_valid(prover):
@@ -309,3 +314,502 @@ def test_while_dp():
         },
     )
     assert prover.verify(code, "smartsum", precond, postcond, False, {"db":10})
+
+
+def test_passive_engine(prover):
+    precond = "x >= 0 and y >= 0 and (z and True)"
+    assert verify_func(prover, complex_func, precond, "result <= x", engine="passive")
+    with pytest.raises(mp.VerificationFailureError):
+        verify_func(prover, complex_func, precond, "result < 0", engine="passive")
+
+    def swap(A, X, Y):
+        R = A[X]
+        A[X] = A[Y]
+        A[Y] = R
+
+    prover.register("swap", {"A":list[int], "X":int, "Y":int, "R":int, "x":int, "y":int})
+    precond = "A[X] == x and A[Y] == y"
+    postcond = "A[X] == y and A[Y] == x"
+    assert verify_func(prover, swap, precond, postcond, engine="passive")
+
+    with pytest.raises(ValueError):
+        verify_func(prover, simple_func, "True", "True", engine="sp")
+
+
+def test_passive_engine_while():
+    @precondition("n >= 0")
+    @postcondition("r == n * (n + 1) / 2")
+    def cumsum(n):
+        i = 1
+        r = 0
+        while i <= n:
+            invariant("i <= n + 1")
+            invariant("r == (i - 1) * i / 2")
+            r = r + i
+            i = i + 1
+
+    assert prove(cumsum, {"n": int}, False, engine="passive")[0]
+
+    @precondition("N > 0 and M >= 0")
+    @postcondition("M == res * N + m")
+    def func(M, N):
+        res = 0
+        m = M
+        while m >= N:
+            invariant("M == res * N + m + 1")
+            m = m - N
+            res = res + 1
+
+    with pytest.raises(mp.InvalidInvariantError):
+        prove(func, {"M": int, "N": int, "res": int}, False, engine="passive")
+
+
+def test_verify_long_function(prover):
+    n = 3000
+    lines = ["def chain(x):", "    y0 = x"]
+    lines += [f"    y{i} = y{i - 1} + 1" for i in range(1, n)]
+    code = "\n".join(lines)
+
+    prover.register("chain", {"x": int})
+    assert prover.verify(code, "chain", "x >= 0", f"y{n - 1} >= {n - 1}", engine="passive")
+    with pytest.raises(mp.VerificationFailureError):
+        prover.verify(code, "chain", "x >= 0", f"y{n - 1} >= {n}", engine="passive")
+
+
+@pytest.mark.parametrize("engine", ["wp", "passive"])
+def test_while_with_multiple_loops(engine):
+    @precondition("n >= 0")
+    @postcondition("r == n * (n + 1) / 2 + n and j == n")
+    def cumsum_twice(n):
+        i = 1
+        r = 0
+        while i <= n:
+            invariant("i <= n + 1")
+            invariant("r == (i - 1) * i / 2")
+            r = r + i
+            i = i + 1
+        j = 0
+        while j < n:
+            invariant("j <= n and i == n + 1")
+            invariant("r == n * (n + 1) / 2 + j")
+            r = r + 1
+            j = j + 1
+
+    assert prove(cumsum_twice, {"n": int}, False, engine=engine)[0]
+
+    @precondition("n >= 0")
+    @postcondition("r == n * n")
+    def square(n):
+        i = 0
+        r = 0
+        while i < n:
+            invariant("i <= n and r == i * n")
+            j = 0
+            while j < n:
+                invariant("i < n and j <= n and r == i * n + j")
+                r = r + 1
+                j = j + 1
+            i = i + 1
+
+    assert prove(square, {"n": int}, False, engine=engine)[0]
+
+    @precondition("n >= 0")
+    @postcondition("r == n * n")
+    def wrong_square(n):
+        i = 0
+        r = 0
+        while i < n:
+            invariant("i <= n and r == i * n")
+            j = 0
+            while j < n:
+                invariant("i < n and j <= n and r == i * n + j")
+                r = r + 1
+                j = j + 1
+            i = i + 2
+
+    lineno = inspect.getsourcelines(wrong_square)[1]
+    with pytest.raises(
+        mp.InvalidInvariantError,
+        match=f"exit of the loop at line {lineno + 8} into the loop at line {lineno + 5}",
+    ):
+        prove(wrong_square, {"n": int}, False, engine=engine)
+
+
+def test_verify_with_split_goals(prover):
+    def func(x):
+        if x > 0:
+            r = x
+            s = 1
+        else:
+            r = 0 - x
+            s = 0
+        return r
+
+    prover.register("func", {"x": int, "r": int, "s": int})
+    assert verify_func(prover, func, "True", "r >= 0 and s >= 0")
+    with pytest.raises(
+        mp.VerificationFailureError,
+        match="postcondition: `s == 1`, else branch of the if at line 2",
+    ):
+        verify_func(prover, func, "True", "r >= 0 and s == 1")
+    with pytest.raises(mp.VerificationFailureError, match=r"Found a violoated condition \(postcondition\)"):
+        prover.verify(
+            inspect.getsource(func).lstrip(),
+            "func",
+            "True",
+            "r >= 0 and s == 1",
+            split=False,
+        )
+
+
+@pytest.mark.parametrize("incremental", [True, False])
+def test_verify_incremental(prover, incremental):
+    def func(a, b):
+        r = 0
+        while r < a:
+            invariant("r <= a")
+            r = r + 1
+        s = r * b
+        return s
+
+    prover.register("func", {"a": int, "b": int, "r": int, "s": int})
+    code = inspect.getsource(func).lstrip()
+    precond = "a >= 0 and b > 0"
+    assert prover.verify(code, "func", precond, "s >= a", incremental=incremental)
+    with pytest.raises(mp.VerificationFailureError, match=r"\(exit of the loop"):
+        prover.verify(code, "func", precond, "s > a", incremental=incremental)
+
+
+def test_verify_parallel(prover):
+    def func(x):
+        if x > 0:
+            r = x * x
+            s = 1
+        else:
+            r = 0 - x
+            s = 0
+        return r
+
+    prover.register("func", {"x": int, "r": int, "s": int})
+    code = inspect.getsource(func).lstrip()
+    assert prover.verify(code, "func", "True", "r >= 0 and s >= 0", workers=2)
+    with pytest.raises(
+        mp.VerificationFailureError,
+        match="postcondition: `s == 1`, else branch of the if at line 2",
+    ):
+        prover.verify(code, "func", "True", "r >= 0 and s == 1 and r > 0", workers=2)
+    # a pool kept by the caller is reused across verifications
+    with ProcessPoolExecutor(max_workers=2) as pool:
+        for _ in range(2):
+            assert prover.verify(code, "func", "True", "r >= 0 and s >= 0", pool=pool)
+        with pytest.raises(mp.VerificationFailureError, match="`s == 1`"):
+            prover.verify(code, "func", "True", "s == 1", pool=pool)
+
+
+def test_discharge_in_parallel_stops_running_checks():
+    import z3
+
+    x, y, z = z3.Ints("x y z")
+    fermat = mp.parallel.to_smt2(
+        z3.And(x > 0, y > 0, z > 0, x * x * x + y * y * y == z * z * z)
+    )
+    start = time.monotonic()
+    # the checks of `fermat` do not terminate, and are running when `x > 0` fails
+    results = mp.parallel.discharge_in_parallel(
+        [mp.parallel.to_smt2(x > 0), fermat, fermat], 3
+    )
+    assert results[0][0] == "sat" and results[1:] == [None, None]
+    assert time.monotonic() - start < 10
+    assert not multiprocessing.active_children()
+
+
+def test_verify_portfolio(prover):
+    @precondition("n >= 0")
+    @postcondition("r == n * (n + 1) / 2")
+    def cumsum(n):
+        i = 1
+        r = 0
+        while i <= n:
+            invariant("i <= n + 1")
+            invariant("r == (i - 1) * i / 2")
+            r = r + i
+            i = i + 1
+
+    portfolio = mp.parallel.STRATEGIES
+    verified, prover = prove(cumsum, {"n": int}, portfolio=portfolio, timeout=10)
+    assert verified
+    assert len(prover.stats["strategies"]) == prover.stats["num_unique_obligations"]
+    assert set(prover.stats["strategies"]) <= set(portfolio)
+
+
+@pytest.mark.parametrize("engine", ["wp", "passive"])
+def test_verify_reports_long_straight_line_code(engine):
+    # the printer of z3py exceeds the recursion limit on the condition of wp
+    n = 1000
+    code = "\n".join(f"y{i} = y{i - 1} + 1" for i in range(1, n)) + "\n"
+    prover = mp.MyProver()
+    prover.register("func", {f"y{i}": int for i in range(n)})
+    with pytest.raises(mp.VerificationFailureError, match=f"postcondition: `y{n - 1} >= {n}`"):
+        prover.verify(code, "func", "y0 >= 0", f"y{n - 1} >= {n}", engine=engine)
+
+
+@pytest.mark.parametrize(
+    "options",
+    [{}, {"portfolio": ("default", "qfnia")}, {"workers": 2}],
+    ids=["sequential", "portfolio", "workers"],
+)
+def test_verify_timeout(prover, options):
+    def fermat(x, y, z):
+        r = x * x * x + y * y * y - z * z * z
+        return r
+
+    prover.register("fermat", {"x": int, "y": int, "z": int, "r": int})
+    code = inspect.getsource(fermat).lstrip()
+    with pytest.raises(mp.VerificationUnknownError, match="postcondition: `r != 0`"):
+        prover.verify(
+            code, "fermat", "x > 0 and y > 0 and z > 0", "r != 0", timeout=1, **options
+        )
+
+
+def test_verify_simplifies_conditions(prover):
+    def func(x):
+        y = 0 + 1
+        z = x * 1 + y
+        return z
+
+    prover.register("func", {"x": int, "y": int, "z": int})
+    assert verify_func(prover, func, "x >= 0", "z > 0")
+    assert prover.stats["num_removed_vc_nodes"] > 0
+    assert verify_func(prover, func, "x >= 0", "True")
+    assert prover.stats["num_vc_nodes"] == prover.stats["num_removed_vc_nodes"] + 1
+
+
+@pytest.mark.parametrize("engine", ["wp", "passive"])
+def test_verify_with_slicing(prover, engine):
+    def func(x, n):
+        a = x * x
+        b = a + 1
+        r = x
+        i = 0
+        while i < n:
+            invariant("i <= n and r == x + i")
+            c = b * i
+            r = r + 1
+            i = i + 1
+        if a > 0:
+            b = 0
+        return r
+
+    prover.register("func", {v: int for v in ["x", "n", "a", "b", "c", "r", "i"]})
+    code = inspect.getsource(func).lstrip()
+    assert prover.verify(
+        code, "func", "n >= 0", "r == x + n", engine=engine, slice_program=True
+    )
+    assert prover.stats["slice_ratio"] == 5 / 10
+    with pytest.raises(mp.VerificationFailureError):
+        prover.verify(
+            code, "func", "n >= 0", "r == x + n + 1", engine=engine, slice_program=True
+        )
+
+
+def test_verify_reports_z3_cache(prover):
+    def func(x, y):
+        if x > y:
+            r = x * x + y * y
+        else:
+            r = x * x + y * y + 1
+        return r
+
+    prover.register("func", {"x": int, "y": int, "unused": int})
+    code = inspect.getsource(func).lstrip()
+    assert prover.verify(code, "func", "x >= 0 and y >= 0", "r >= 0 and r >= x * x")
+    assert prover.stats["z3_cache_hits"] > 0
+    assert 0 < prover.stats["z3_cache_hit_rate"] < 1
+    # `r` is substituted away and `unused` is never referenced
+    assert prover.stats["num_z3_constants"] == 2
+
+
+@pytest.mark.parametrize("engine", ["wp", "passive"])
+def test_verify_tracks_conjuncts(prover, engine):
+    def func(x, n):
+        i = 0
+        r = x
+        while i < n:
+            invariant("i <= n and r == x + i and x == x")
+            invariant("r >= i + x - 1")
+            r = r + 1
+            i = i + 1
+        return r
+
+    prover.register("func", {"x": int, "n": int, "r": int, "i": int})
+    code = inspect.getsource(func).lstrip()
+    precond = "n >= 0 and x > 0"
+    assert prover.verify(
+        code, "func", precond, "r == x + n", engine=engine, track_conjuncts=True
+    )
+    assert prover.stats["num_tracked_conjuncts"] == 6
+    # `r >= i + x - 1` is only needed to preserve itself
+    assert prover.stats["unused_conjuncts"] == [
+        "precondition: x > 0",
+        "invariant of the loop at line 4: x == x",
+        "invariant of the loop at line 4: r >= ((i + x) - 1)",
+    ]
+    # the guards are left out of the counterexamples
+    with pytest.raises(mp.VerificationFailureError) as e:
+        prover.verify(code, "func", "n >= 0", "r == n", track_conjuncts=True)
+    assert "@track" not in str(e.value).split(" - ")[-1]
+    with pytest.raises(ValueError):
+        prover.verify(code, "func", "n >= 0", "r == x + n", workers=2, track_conjuncts=True)
+
+
+@precondition("x >= 0")
+@postcondition("r == x * x")
+def square(x):
+    r = x * x
+    return r
+
+
+@precondition("x >= 0")
+@postcondition("r > x")
+def wrong_succ(x):
+    r = x
+    return r
+
+
+@precondition("x > 0 and y > 0 and z > 0")
+@postcondition("r != 0")
+def fermat(x, y, z):
+    r = x * x * x + y * y * y - z * z * z
+    return r
+
+
+def test_prove_async():
+    async def main():
+        semaphore = asyncio.Semaphore(2)
+        results = await asyncio.gather(
+            *[mp.prove_async(square, {"x": int}, semaphore=semaphore) for _ in range(4)],
+            mp.prove_async(wrong_succ, {"x": int}, semaphore=semaphore),
+            return_exceptions=True,
+        )
+        assert all(verified for verified, _ in results[:4])
+        assert isinstance(results[4], mp.VerificationFailureError)
+
+        # the check that never ends by itself is interrupted
+        task = asyncio.create_task(mp.prove_async(fermat, {"x": int, "y": int, "z": int}))
+        await asyncio.sleep(0.5)
+        start = time.monotonic()
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        assert time.monotonic() - start < 5
+
+        prover = mp.MyProver()
+        prover.register("square", {"x": int})
+        code = inspect.getsource(square).split("\n", 2)[2]
+        assert await prover.verify_async(code, "square", "x >= 0", "r >= x")
+
+    asyncio.run(main())
+
+
+def test_import_is_lazy():
+    code = (
+        "import sys; import myprover as mp; from myprover import invariant; "
+        "assert 'z3' not in sys.modules and 'myprover.claim' not in sys.modules; "
+        "mp.MyProver; assert 'z3' in sys.modules"
+    )
+    src = os.path.abspath(os.path.join(os.path.dirname(__file__), "../src"))
+    subprocess.run(
+        [sys.executable, "-c", code], env=dict(os.environ, PYTHONPATH=src), check=True
+    )
+    assert mp.hoare.invariant is invariant
+    with pytest.raises(AttributeError):
+        mp.unknown_name
+
+    namespace = {}
+    exec("from myprover import *", namespace)
+    for name in ("MyProver", "prove", "verify_module", "invariant", "ClaimParser"):
+        assert namespace[name] is getattr(mp, name)
+    assert "hoare" not in namespace and "importlib" not in namespace
+
+
+@pytest.mark.parametrize("engine", ["wp", "passive"])
+def test_verify_bounded(engine):
+    @precondition("n >= 0 and n <= 5")
+    @postcondition("r == n * (n + 1) / 2")
+    def cumsum(n):
+        i = 1
+        r = 0
+        while i <= n:
+            r = r + i
+            i = i + 1
+
+    # no invariant is needed, and the bound covers every execution
+    _, prover = prove(cumsum, {"n": int}, engine=engine, unroll=5)
+    assert prover.stats["bmc_complete"]
+    with pytest.raises(mp.VerificationFailureError, match="unwinding"):
+        prove(cumsum, {"n": int}, engine=engine, unroll=4)
+    _, prover = prove(cumsum, {"n": int}, engine=engine, unroll=4, unwinding_assertion=False)
+    assert not prover.stats["bmc_complete"]
+
+    # the deepening stops at the first depth whose unwinding assertions pass
+    _, prover = prove(cumsum, {"n": int}, engine=engine, unroll=8, deepen=True)
+    assert prover.stats["bmc_depth"] == 5 and prover.stats["bmc_complete"]
+    assert prover.stats["num_bmc_reused_conditions"] > 0
+
+    @precondition("True")
+    @postcondition("r == 44")
+    def wrong_sum():
+        i = 0
+        r = 0
+        while i < 10:
+            r = r + i
+            i = i + 1
+
+    with pytest.raises(mp.VerificationFailureError, match="postcondition"):
+        prove(wrong_sum, {}, engine=engine, unroll=10, deepen=True)
+
+
+def test_while_dp_bounded():
+    def smartsum(db, q, out):
+        net = 0
+        n = 0
+        c = 0
+        i = 0
+        while i < 10:
+            if 10 % q == 0:
+                x = laplace(c + db[i])
+                n = x + n
+                net = n
+                c = 0
+                out[i] = net
+            else:
+                x = laplace(db[i])
+                net = net + x
+                c = c + db[i]
+                out[i] = net
+            i = i + 1
+        return out
+
+    code = inspect.getsource(smartsum).lstrip()
+    prover = mp.MyProver(dp_mode=True)
+    prover.register(
+        "smartsum",
+        {
+            "net": int,
+            "n": int,
+            "c": int,
+            "i": int,
+            "q": int,
+            "x": int,
+            "out": list[int],
+            "db": list[int],
+            "v_eps#": int,
+            "eps#": int,
+        },
+    )
+    precond = "db#1 ~ db#2 and eps# >= 0"
+    postcond = "v_eps# <= 2 * eps#"
+    assert prover.verify(
+        code, "smartsum", precond, postcond, False, {"db": 10}, engine="passive", unroll=10
+    )
+    assert prover.stats["bmc_complete"]
@@ -0,0 +1,70 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../src")))
+
+import myprover as mp
+from myprover import invariant, postcondition, precondition
+from myprover.runtime import checked, claim_to_python, compile_contract
+
+
+def test_claim_to_python():
+    expr = mp.ClaimParser("x / 2 >= y % 3 ==> a[i] != 0").parse_expr()
+    assert claim_to_python(expr) == "((not (_div(x, 2) >= _mod(y, 3))) or (a[i] != 0))"
+    code = compile_contract("x / -2 == 4 and x % -2 == 1")
+    assert compile_contract("x / -2 == 4 and x % -2 == 1") is code
+    # the division of Z3, unlike `//` of Python
+    assert eval(code, mp.runtime.RUNTIME_GLOBALS, {"x": -7})
+    with pytest.raises(NotImplementedError):
+        compile_contract("forall i :: i >= 0")
+
+
+@checked
+@precondition("n >= 0")
+@postcondition("r == n * (n + 1) / 2")
+def cumsum(n, wrong=False):
+    i = 1
+    r = 0
+    while i <= n:
+        invariant("i <= n + 1")
+        invariant("r == (i - 1) * i / 2")
+        r = r + i
+        if wrong and i == 3:
+            r = r + 1
+        i = i + 1
+    if wrong and n == 0:
+        r = 1
+    return r
+
+
+def test_checked():
+    assert cumsum(10) == 55
+    with pytest.raises(mp.ContractViolationError, match=r"precondition .* \[n = -1\]"):
+        cumsum(-1)
+    with pytest.raises(mp.ContractViolationError, match="postcondition"):
+        cumsum(0, wrong=True)
+    # the loop is left at the head of the iteration after the wrong one
+    with pytest.raises(mp.ContractViolationError, match="invariant at line"):
+        cumsum(5, wrong=True)
+    # the invariants of a function called outside of a sampled call are not checked
+    assert cumsum.__wrapped__(5, wrong=True) == 16
+    assert cumsum.num_checked_calls == 4
+
+
+def test_checked_with_sampling():
+    @checked(sample_rate=0.25, seed=0)
+    @postcondition("r > x")
+    def wrong_succ(x):
+        r = x
+        return r
+
+    violations = 0
+    for x in range(400):
+        try:
+            assert wrong_succ(x) == x
+        except mp.ContractViolationError:
+            violations += 1
+    assert violations == wrong_succ.num_checked_calls
+    assert 50 < violations < 150
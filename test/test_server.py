@@ -0,0 +1,94 @@
+import json
+import os
+import sys
+import textwrap
+import threading
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../src")))
+
+from myprover.cli import main
+from myprover.server import VerificationClient, VerificationServer
+
+MODULE = textwrap.dedent(
+    """\
+    from myprover import postcondition, precondition
+
+
+    @precondition("x >= 0")
+    @postcondition("r > x")
+    def succ(x: int):
+        r = x + 1
+        return r
+
+
+    @precondition("x >= 0")
+    @postcondition("r > x")
+    def wrong_succ(x):
+        r = x
+        return r
+    """
+)
+
+
+@pytest.fixture
+def server(tmp_path):
+    server = VerificationServer(str(tmp_path / "myprover.sock"), workers=2)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+    yield server
+    server.shutdown()
+    thread.join()
+    server.server_close()
+
+
+def test_server(server, tmp_path):
+    path = tmp_path / "m.py"
+    path.write_text(MODULE)
+    with VerificationClient(server.path) as client:
+        report = client.verify_files([str(path)], {"wrong_succ": {"x": "int"}})
+        assert [(r.name, r.status) for r in report] == [
+            ("succ", "verified"),
+            ("wrong_succ", "VerificationFailureError"),
+        ]
+        assert report["wrong_succ"].lineno == 13
+        # the second job is answered from the proof cache of the daemon
+        report = client.verify_files([str(path)], {"wrong_succ": {"x": "int"}})
+        assert report["succ"].stats == {"proof_cache_hit": True}
+
+        # one function with its contracts given in the job
+        job = {
+            "source": "def double(x):\n    r = x + x\n    return r\n",
+            "precondition": "x >= 0",
+            "postcondition": "r == 2 * x",
+            "types": {"x": "int"},
+            "options": {"timeout": 10},
+        }
+        answer = client.request(job)
+        assert answer["verified"] and answer["results"][0]["name"] == "double"
+        with pytest.raises(RuntimeError, match="Unknown type `float`"):
+            client.request(dict(job, types={"x": "float"}))
+
+        stats = client.stats()
+        assert stats["pid"] == os.getpid()
+        assert stats["num_jobs"] == 3 and stats["num_functions"] == 5
+        assert stats["proof_cache_hits"] == 2
+
+
+def test_cli_submit(server, tmp_path, capsys):
+    path = tmp_path / "m.py"
+    path.write_text(MODULE)
+    types = tmp_path / "types.json"
+    types.write_text(json.dumps({"wrong_succ": {"x": "int"}}))
+    report = tmp_path / "report.json"
+
+    args = ["submit", "--socket", server.path, "--types", str(types)]
+    assert main(args + ["--report", str(report), str(tmp_path)]) == 1
+    out = capsys.readouterr().out
+    assert f"{path}:13: wrong_succ: VerificationFailureError" in out
+    assert "1 verified, 1 failed" in out
+    assert not json.loads(report.read_text())["verified"]
+
+    path.write_text(MODULE.split("\n\n\n@")[0])
+    assert main(args + [str(path)]) == 0
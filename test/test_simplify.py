@@ -0,0 +1,53 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../src")))
+
+
+def simplified(text):
+    import myprover as mp
+
+    return mp.claim.pretty_expr(mp.claim.simplify(mp.ClaimParser(text).parse_expr()))
+
+
+def test_simplify_boolean_identities():
+    assert simplified("True ==> x > 0") == "x > 0"
+    assert simplified("False ==> x > 0") == "True"
+    assert simplified("x > 0 ==> True") == "True"
+    assert simplified("x > 0 ==> False") == "not (x > 0)"
+    assert simplified("x > 0 and True") == "x > 0"
+    assert simplified("x > 0 and False") == "False"
+    assert simplified("x > 0 or True") == "True"
+    assert simplified("False or x > 0") == "x > 0"
+    assert simplified("x > 0 and x > 0") == "x > 0"
+    assert simplified("x > 0 ==> x > 0") == "True"
+    assert simplified("True <==> x > 0") == "x > 0"
+
+
+def test_simplify_double_negation():
+    import myprover as mp
+
+    e = mp.ClaimParser("x > 0").parse_expr()
+    not_not = mp.claim.UnOpExpr(mp.Op.Not, mp.claim.UnOpExpr(mp.Op.Not, e))
+    assert mp.claim.simplify(not_not) is e
+    assert simplified("not True") == "False"
+
+
+def test_simplify_literal_arithmetic():
+    assert simplified("x == 0 + 1") == "x == 1"
+    assert simplified("x == (2 + 3) * 4 - 1") == "x == 19"
+    assert simplified("x + 0 == x * 1") == "True"
+    assert simplified("x * 0 == 0") == "True"
+    assert simplified("7 / 2 == 3 and 7 % 2 == 1") == "True"
+    assert simplified("1 < 2 and 2 <= 2 and 3 != 4") == "True"
+    assert simplified("x == 0 - 7 / 2") == "x == -3"
+    assert simplified("y == (0 - 7) / 2") == "y == (-7 / 2)"
+
+
+def test_simplify_is_iterative():
+    import myprover as mp
+
+    e = mp.claim.VarExpr("x")
+    for _ in range(10000):
+        e = mp.claim.BinOpExpr(e, mp.Op.Add, mp.claim.LiteralExpr(mp.claim.IntValue(0)))
+    assert mp.claim.simplify(e) is mp.claim.VarExpr("x")
@@ -205,3 +205,24 @@ def test_resolve_stmt_type():
     )
     assert len(env_varname2type) == 1
     assert env_varname2type["x"] == int
+
+
+def test_annotate_quantifier_types():
+    import myprover as mp
+
+    text = "forall i :: i"
+    quant = mp.ClaimParser(text).parse_expr()
+    # the shared node is rebuilt with the inferred type, and is never updated
+    annotated = mp.annotate_quantifier_types({"x": int}, quant)
+    assert (annotated.var_type, quant.var_type) == (bool, None)
+    assert annotated != quant and mp.ClaimParser(text).parse_expr() is quant
+    assert mp.annotate_quantifier_types({"x": int}, annotated) is annotated
+
+    stmt = mp.claim.CompoundStmt(
+        mp.claim.AssertStmt(mp.ClaimParser(f"x > 0 ==> ({text})").parse_expr()),
+        mp.claim.AssumeStmt(mp.ClaimParser("x > 0").parse_expr()),
+    )
+    rebuilt = mp.annotate_stmt_quantifier_types({"x": int}, stmt)
+    assert rebuilt.s1.e.e2 is annotated and rebuilt.s2 is stmt.s2
+    with pytest.raises(TypeError):
+        mp.annotate_quantifier_types({}, mp.ClaimParser("forall i :: True").parse_expr())
@@ -132,3 +132,25 @@ def test_claim2z3_quantification(claim_to_z3, name_dict):
     )
     claim_to_z3.visit(expr)
     assert isinstance(name_dict["z"], z3.BoolRef)
+
+
+def test_claim2z3_memoize_and_declare():
+    import myprover as mp
+
+    declared = []
+
+    def declare(varname):
+        declared.append(varname)
+        return z3.Int(varname) if varname != "x#1" else None
+
+    converter = mp.ClaimToZ3({}, declare=declare, memoize=True)
+    shared = mp.ClaimParser("x * x + y").parse_expr()
+    e1 = converter.visit(mp.claim.BinOpExpr(shared, mp.claim.Op.Gt, mp.claim.VarExpr("x#1")))
+    assert converter.hits == 0
+    e2 = converter.visit(mp.claim.BinOpExpr(shared, mp.claim.Op.Lt, mp.claim.VarExpr("z")))
+    # `x * x + y` is converted once, and `x#1` falls back to `x`
+    assert converter.hits == 1
+    assert e1.arg(0).eq(e2.arg(0))
+    assert e1.arg(1).eq(z3.Int("x"))
+    assert sorted(declared) == ["x", "x#1", "y", "z"]
+    assert set(converter.name_dict) == {"x", "y", "z"}